@@ -2,424 +2,761 @@
 ##########  EMAAR Properties : Analysis and insights ##########
 ###############################################################
 
-## By Maria Elena Lasiu 
+## By Maria Elena Lasiu
 
+import argparse
+import functools
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 
-# Load the datasets
-df_income_long = pd.read_csv("cleaned_income_statement_v2.csv")
-df_balance_long = pd.read_csv("cleaned_balance_sheet_v2.csv")
-df_cashflow_long = pd.read_csv("cleaned_cash_flow_v2.csv")
+from Python_build_cache import BuildCache, file_hash, make_key
+from Python_cleaning_v2 import (STATEMENTS, annual_statement, parse_values, read_columnar, report_memory,
+                                write_columnar)
+from Python_kpi_engine import KPIEngine
+import Python_kpi_engine as kpi_engine
+from Python_profiling import enable as enable_profiling, stage
+from Python_store import STORE_NAME, read_store
+import Python_taxonomy as taxonomy
+
+# Label used when the cleaned files hold a single company without a Company column
+DEFAULT_COMPANY = "emaar"
 
-# Convert value with floats
-df_income_long["Value"] = df_income_long["Value"].astype(str).str.replace(",", "").astype(float)
-df_balance_long["Value"] = df_balance_long["Value"].astype(str).str.replace(",", "").astype(float)
-df_cashflow_long["Value"] = df_cashflow_long["Value"].astype(str).str.replace(",", "").astype(float)
-df_cashflow_long["Metric"] = df_cashflow_long["Metric"].str.lower().str.strip()
+
+# Load the datasets
+# Picks up whichever cleaned format is present: columnar (.npy + schema.json), parquet or csv
+# Cleaned CSVs are read straight into the compact dtypes the cleaning script produces
+CSV_DTYPES = {"Company": "category", "Metric": "category", "Category": "category", "Year": np.int16, "Quarter": np.int8}
+
+
+def load_cleaned(input_dir="."):
+    store_path = os.path.join(input_dir, STORE_NAME)
+    if os.path.exists(store_path):
+        with stage("load sqlite"):
+            return read_store(store_path, STATEMENTS)
+
+    def load(statement):
+        path = os.path.join(input_dir, f"cleaned_{statement}_v2")
+        with stage(f"load {statement}") as timing:
+            if os.path.exists(os.path.join(path, "schema.json")):
+                df_long = read_columnar(path)
+            elif os.path.exists(f"{path}.parquet"):
+                df_long = pd.read_parquet(f"{path}.parquet")
+            else:
+                df_long = pd.read_csv(f"{path}.csv", dtype=CSV_DTYPES)
+                # Cleaned files from older runs still hold comma-formatted strings
+                if df_long["Value"].dtype != np.float64:
+                    df_long["Value"] = parse_values(df_long["Value"])[0]
+            timing.rows = len(df_long)
+        return df_long
+
+    # The statements are read at the same time; the parsers release the GIL while waiting on I/O
+    with ThreadPoolExecutor(max_workers=len(STATEMENTS)) as pool:
+        return dict(zip(STATEMENTS, pool.map(load, STATEMENTS)))
+
+
+# Modification time and size of the cleaned files load_cleaned would read, to tell
+# whether anything derived from them is stale
+def cleaned_files_signature(input_dir="."):
+    names = [STORE_NAME]
+    for statement in STATEMENTS:
+        name = f"cleaned_{statement}_v2"
+        names += [f"{name}.csv", f"{name}.parquet", os.path.join(name, "schema.json")]
+
+    signature = []
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(input_dir, name))
+        except FileNotFoundError:
+            continue
+        signature.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+# pd.factorize for name columns through their dictionary encoding: string work is done
+# once per distinct name. Codes follow first appearance unless sort; missing names get -1.
+def factorize_names(values, sort=False, normalise=None):
+    values = values.astype("category")
+    labels = values.cat.categories.astype(str)
+    if normalise is not None:
+        labels = normalise(labels)
+    row_codes = values.cat.codes.to_numpy()
+    if sort:
+        uniques = pd.Index(labels).unique().sort_values()
+    else:
+        uniques = pd.Index(labels[pd.unique(row_codes[row_codes >= 0])]).unique()
+    codes = uniques.get_indexer(labels)
+    return np.where(row_codes >= 0, codes[row_codes], -1), uniques
+
+
+# Sums over the rows of a long table grouped by company, year and a third code
+# (-1 rows are left out), as a dense array plus where any row was found
+def _grouped_sums(company_codes, year_codes, codes, values, shape):
+    keep = codes >= 0
+    flat = np.ravel_multi_index((company_codes[keep], year_codes[keep], codes[keep]), shape)
+    size = int(np.prod(shape))
+    sums = np.bincount(flat, weights=values[keep], minlength=size).reshape(shape)
+    present = np.bincount(flat, minlength=size).reshape(shape) > 0
+    return sums, present
+
+
+# Per company and year sums of every canonical line item and every category of a
+# statement. This is all the ratio code and the KPI engine read, so it is built in
+# one grouped reduction over the long table and stored next to the cleaned files,
+# rather than filtering and summing the rows again for every ratio.
+class ItemAggregates:
+    def __init__(self, companies, years, items, categories, item_values, item_present, category_values, category_present):
+        self.companies = pd.Index(companies)
+        self.years = pd.Index(years, name="Year")
+        self.items = pd.Index(items, dtype=object)
+        self.categories = pd.Index(categories, dtype=object)
+        self.item_values, self.item_present = item_values, item_present
+        self.category_values, self.category_present = category_values, category_present
+        self.company = {company: i for i, company in enumerate(self.companies)}
+        self._columns = {}
+
+    @classmethod
+    def from_long(cls, df_long, statement=None):
+        if "Company" in df_long:
+            company_codes, companies = factorize_names(df_long["Company"], sort=True)
+        else:
+            company_codes, companies = np.zeros(len(df_long), dtype=np.intp), pd.Index([DEFAULT_COMPANY])
+        year_codes, years = pd.factorize(df_long["Year"].astype(int), sort=True)
+        if statement in taxonomy.TAXONOMY:
+            items = taxonomy.get_mapper(statement).map_column(df_long["Metric"])
+            item_codes, item_names = items.codes.astype(np.intp), items.categories
+        else:
+            item_codes, item_names = np.full(len(df_long), -1), pd.Index([])
+        if "Category" in df_long:
+            category_codes, categories = factorize_names(df_long["Category"], sort=True)
+        else:
+            category_codes, categories = np.full(len(df_long), -1), pd.Index([])
+
+        values = np.nan_to_num(df_long["Value"].to_numpy(dtype=float))
+        item_values, item_present = _grouped_sums(company_codes, year_codes, item_codes, values,
+                                                  (len(companies), len(years), len(item_names)))
+        category_values, category_present = _grouped_sums(company_codes, year_codes, category_codes, values,
+                                                          (len(companies), len(years), len(categories)))
+        return cls(companies, years, item_names, categories, item_values, item_present, category_values, category_present)
+
+    # Long table of the sums: Company, Kind ("item" or "category"), Name, Year, Value
+    def frame(self):
+        frames = []
+        for kind, names, values, present in [("item", self.items, self.item_values, self.item_present),
+                                             ("category", self.categories, self.category_values, self.category_present)]:
+            company, year, name = np.nonzero(present)
+            frames.append(pd.DataFrame({"Company": self.companies[company], "Kind": kind, "Name": names[name],
+                                        "Year": self.years[year].astype(np.int16), "Value": values[company, year, name]}))
+        return pd.concat(frames, ignore_index=True)
+
+    @classmethod
+    def from_frame(cls, df_aggregates):
+        # Names of other statements stay in the categories of a shared table
+        company = df_aggregates["Company"].astype("category").cat.remove_unused_categories()
+        company_codes, companies = factorize_names(company, sort=True)
+        year_codes, years = pd.factorize(df_aggregates["Year"].astype(int), sort=True)
+        values = df_aggregates["Value"].to_numpy(dtype=float)
+        kind = df_aggregates["Kind"].astype(str).to_numpy()
+
+        arrays = {}
+        for name in ["item", "category"]:
+            rows = kind == name
+            codes, names = factorize_names(df_aggregates["Name"][rows].astype("category").cat.remove_unused_categories(), sort=True)
+            sums = np.zeros((len(companies), len(years), len(names)))
+            present = np.zeros(sums.shape, dtype=bool)
+            sums[company_codes[rows], year_codes[rows], codes] = values[rows]
+            present[company_codes[rows], year_codes[rows], codes] = True
+            arrays[name] = (names, sums, present)
+        (items, item_values, item_present), (categories, category_values, category_present) = arrays["item"], arrays["category"]
+        return cls(companies, years, items, categories, item_values, item_present, category_values, category_present)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.item_values, self.item_present, self.category_values, self.category_present))
+
+    # Positions of the canonical item, or of a list of items, looked up once per list
+    def item_columns(self, items):
+        items = (items,) if isinstance(items, str) else tuple(items)
+        if items not in self._columns:
+            positions = self.items.get_indexer(list(items))
+            self._columns[items] = positions[positions >= 0]
+        return self._columns[items]
+
+    # Sum of the selected items per company and year, NaN where none of them was reported.
+    # rows optionally restricts the result to some company positions.
+    def total(self, columns, rows=None):
+        values = self.item_values if rows is None else self.item_values[rows]
+        present = self.item_present if rows is None else self.item_present[rows]
+        return np.where(present[:, :, columns].any(axis=-1), values[:, :, columns].sum(axis=-1), np.nan)
+
+    def category_total(self, category, rows=None):
+        values = self.category_values if rows is None else self.category_values[rows]
+        if category not in self.categories:
+            return np.full(values.shape[:2], np.nan)
+        present = self.category_present if rows is None else self.category_present[rows]
+        column = self.categories.get_loc(category)
+        return np.where(present[:, :, column], values[:, :, column], np.nan)
+
+    # Per-year series for one company, matching df[...].groupby("Year")["Value"].sum()
+    def series(self, totals, company=None):
+        row = totals[self.company[company] if company is not None else 0]
+        keep = ~np.isnan(row)
+        return pd.Series(row[keep], index=self.years[keep], name="Value")
+
+    def by_item(self, items, company=None):
+        return self.series(self.total(self.item_columns(items)), company)
+
+    def by_category(self, category, company=None):
+        return self.series(self.category_total(category), company)
+
+    # Content hash of one company's sums, used to key cached KPI tables
+    def fingerprint(self, company=None):
+        c = self.company[company] if company is not None else 0
+        digest = hashlib.sha256()
+        for names, values, present in [(self.items, self.item_values, self.item_present),
+                                       (self.categories, self.category_values, self.category_present)]:
+            reported = present[c].any(axis=0)
+            digest.update("\x1f".join(map(str, names[reported])).encode("utf-8"))
+            for part in (self.years.to_numpy(), values[c][:, reported], present[c][:, reported]):
+                digest.update(np.ascontiguousarray(part).tobytes())
+        return digest.hexdigest()
+
+
+# Quarterly statements are aggregated by year, through their annual view
+def build_indexes(frames):
+    indexes = {}
+    for statement, df_long in frames.items():
+        with stage(f"aggregate {statement}", rows=len(df_long)):
+            indexes[statement] = ItemAggregates.from_long(annual_statement(df_long, statement), statement)
+    return indexes
+
+
+# The aggregates of every statement, kept in input_dir as a columnar table with
+# the signature of the cleaned files and the rules it was built from
+AGGREGATES_NAME = "cleaned_aggregates_v2"
+
+
+def save_aggregates(indexes, output_dir="."):
+    path = os.path.join(output_dir, AGGREGATES_NAME)
+    df_aggregates = pd.concat([index.frame().assign(Statement=statement) for statement, index in indexes.items()],
+                              ignore_index=True)
+    with stage("save aggregates", rows=len(df_aggregates)):
+        write_columnar(df_aggregates, path)
+        with open(os.path.join(path, "sources.json"), "w", encoding="utf-8") as f:
+            json.dump({"rules": analysis_rules_hash(), "sources": cleaned_files_signature(output_dir)}, f, indent=1)
+
+
+# Aggregates of the cleaned statements in input_dir: read back when they are newer
+# than the cleaned files and built by the same rules, otherwise built (from frames
+# when given) and saved for the next run
+def load_indexes(input_dir=".", frames=None):
+    path = os.path.join(input_dir, AGGREGATES_NAME)
+    try:
+        with open(os.path.join(path, "sources.json"), encoding="utf-8") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        saved = None
+    current = {"rules": analysis_rules_hash(), "sources": [list(stamp) for stamp in cleaned_files_signature(input_dir)]}
+    if saved == current:
+        with stage("load aggregates"):
+            df_aggregates = read_columnar(path)
+            statements = df_aggregates["Statement"].astype(str).to_numpy()
+            return {statement: ItemAggregates.from_frame(df_aggregates[statements == statement]) for statement in STATEMENTS}
+
+    indexes = build_indexes(load_cleaned(input_dir) if frames is None else frames)
+    try:
+        save_aggregates(indexes, input_dir)
+    except OSError:
+        pass
+    return indexes
+
+
+# KPIs of one company from the registry, one column per KPI indexed by Year
+def company_kpis(indexes, names, company=None):
+    engine = KPIEngine(indexes, companies=None if company is None else [company])
+    values = engine.compute(names, engine.companies[:1])
+    return pd.DataFrame({name: values[name][0] for name in names}, index=engine.years)
+
+
+# Table with the given columns, each read from a KPI of the registry
+def kpi_columns(df_kpis, columns):
+    return pd.DataFrame({column: df_kpis[name] for column, name in columns.items()})
 
 
 # Is Emaar growing?
+GROWTH_COLUMNS = {
+    "Revenue": "revenue",
+    "Net Income": "net_income",
+    "Operating Expenses": "operating_expenses_reported",
+    "Cost of Revenue": "cost_of_revenue",
+    "Finance Costs": "finance_costs",
+}
+
+# Is Emaar profitable? Total Operating Expenses (should be negative) replace the reported ones
+PROFITABILITY_COLUMNS = {
+    "Gross Profit": "gross_profit",
+    "Gross Margin (%)": "gross_margin",
+    "Operating Expenses": "operating_expenses",
+    "Operating Profit": "operating_profit",
+    "Operating Margin (%)": "operating_margin",
+    "Net Margin (%)": "net_margin",
+    "EBITDA": "ebitda",
+    "EBITDA Margin (%)": "ebitda_margin",
+}
+
+# Is Emaar overleveraged?
+LEVERAGE_COLUMNS = {
+    "Net Income": "net_income",
+    "Total Assets": "total_assets",
+    "Shareholders' Equity": "total_equity",
+    "Debt": "debt",
+    "ROA (%)": "roa",
+    "ROE (%)": "roe",
+    "Debt to Equity": "debt_to_equity",
+    "Current Ratio": "current_ratio",
+}
+
+# How efficient is Emaar?
+EFFICIENCY_COLUMNS = {
+    "Revenue": "revenue",
+    "Operating Profit (EBIT)": "operating_profit",
+    "Total Assets": "total_assets",
+    "Interest Expense": "interest_expense",
+    "Asset Turnover": "asset_turnover",
+    "Interest Coverage": "interest_coverage",
+}
 
-# Calculate key metrics
-revenue = df_income_long[df_income_long["Category"] == "Revenue"]
-net_income = df_income_long[df_income_long["Metric"].str.contains("Profit For The Year", case=False, na=False)]
-op_expenses = df_income_long[df_income_long["Category"] == "Operating Expenses"]
-cost_of_revenue = df_income_long[df_income_long["Metric"].str.contains("Cost of Revenue", case=False, na=False)]
-finance_costs = df_income_long[df_income_long["Metric"].str.contains("Finance Costs", case=False, na=False)]
-
-# Aggregate by year
-rev = revenue.groupby("Year")["Value"].sum()
-ni = net_income.groupby("Year")["Value"].sum()
-opexp = op_expenses.groupby("Year")["Value"].sum()
-costs = cost_of_revenue.groupby("Year")["Value"].sum()
-fin_costs = finance_costs.groupby("Year")["Value"].sum()
-
-# Create summary table with key metrics
-df_summary = pd.DataFrame({
-    "Revenue": rev,
-    "Net Income": ni,
-    "Operating Expenses": opexp,
-    "Cost of Revenue": costs,
-    "Finance Costs": fin_costs
-}).fillna(0)
-
-# Sort by year
-df_summary = df_summary.sort_index()
+# Does Emaar generate enough cash?
+FCF_COLUMNS = {
+    "Operating Cash Flow": "operating_cash_flow",
+    "CapEx": "capex",
+    "Free Cash Flow": "free_cash_flow",
+}
 
-# Calculate YoY % change
-df_changes = df_summary.pct_change().dropna() * 100
-df_changes = df_changes.round(2)
 
-# Print the result
-print("Year-over-Year % Change in Financial Metrics:")
-print(df_changes)
+# Calculate YoY % change
+# Missing years are put back first, so a change is never taken across a gap
+def yoy_changes(df_summary):
+    years = range(df_summary.index.min(), df_summary.index.max() + 1)
+    df_changes = df_summary.reindex(pd.Index(years, name=df_summary.index.name)).pct_change().dropna() * 100
+    return df_changes.round(2)
 
-## In 2022 and 2023, net income increased despite flat or declining revenue due to significant cost reductions. In 2024, revenue grew strongly, but higher production and operating costs reduced profit growth, leading to margin compression. 
 
 #  Calculate CAGR
 def calculate_cagr(start_value, end_value, periods):
     return ((end_value / start_value) ** (1 / periods)) - 1
 
-# Define start and end years
-start_year = df_summary.index.min()
-end_year = df_summary.index.max()
-num_years = end_year - start_year
-
-# Calculate Revenue CAGR and Net Income CAGR
-rev_start = df_summary.loc[start_year, "Revenue"]
-rev_end = df_summary.loc[end_year, "Revenue"]
-
-ni_start = df_summary.loc[start_year, "Net Income"]
-ni_end = df_summary.loc[end_year, "Net Income"]
-
-# Calculate CAGR
-cagr_revenue = calculate_cagr(rev_start, rev_end, num_years)
-cagr_net_income = calculate_cagr(ni_start, ni_end, num_years)
-
-# Print results
-print(f"\n📈 Revenue CAGR ({start_year}–{end_year}): {cagr_revenue * 100:.2f}%")
-print(f"📈 Net Income CAGR ({start_year}–{end_year}): {cagr_net_income * 100:.2f}%")
-
-
-
-# Is Emaar profitable?
-
-# Calculate Gross Margin %
-df_summary["Gross Profit"] = df_summary["Revenue"] + df_summary["Cost of Revenue"]
-df_summary["Gross Margin (%)"] = (df_summary["Gross Profit"] / df_summary["Revenue"]) * 100
-
-# Calculate Operating Margin %
-sga = df_income_long[df_income_long["Metric"].str.contains("Selling, General And Administrative Expenses", case=False, na=False)]
-other_op_exp = df_income_long[df_income_long["Metric"].str.contains("Other Operating Expenses", case=False, na=False)]
-dep_ppe = df_income_long[df_income_long["Metric"].str.contains("Depreciation Of Property, Plant And Equipment", case=False, na=False)]
-dep_inv = df_income_long[df_income_long["Metric"].str.contains("Depreciation Of Investment Properties", case=False, na=False)]
-
-# Group each by year
-sga_year = sga.groupby("Year")["Value"].sum()
-other_op_year = other_op_exp.groupby("Year")["Value"].sum()
-dep_ppe_year = dep_ppe.groupby("Year")["Value"].sum()
-dep_inv_year = dep_inv.groupby("Year")["Value"].sum()
-
-# Total Operating Expenses (should be negative)
-opexp = sga_year + other_op_year + dep_ppe_year + dep_inv_year
-
-# Calculate the metric
-df_summary["Operating Expenses"] = opexp
-df_summary["Operating Profit"] = df_summary["Gross Profit"] + df_summary["Operating Expenses"]
-df_summary["Operating Margin (%)"] = (df_summary["Operating Profit"] / df_summary["Revenue"]) * 100
-
-# Calculate Net Margin %
-df_summary["Net Margin (%)"] = (df_summary["Net Income"] / df_summary["Revenue"]) * 100
-
-
-# Round for readability
-df_summary_rounded = df_summary[[
-    "Revenue", "Net Income", "Gross Margin (%)", "Operating Margin (%)", "Net Margin (%)"
-]].round(2)
-
-# Display
-print("\n📊 Profitability Summary Table:")
-print(df_summary_rounded)
-
-
-## Strong cost control and margin improvement across 2021–2024 show increasing operational efficiency and healthy profitability. Even with a slight dip in margin in 2024, the income-to-revenue ratio remains excellent.
-
-# Calculate EBITDA
-
-# Key metrics
-gross_profit = df_income_long[df_income_long["Metric"].str.contains("Gross Profit", case=False, na=False)]
-other_op_income = df_income_long[df_income_long["Metric"].str.contains("Other Operating Income", case=False, na=False)]
-other_op_expenses = df_income_long[df_income_long["Metric"].str.contains("Other Operating Expenses", case=False, na=False)]
-sga_expenses = df_income_long[df_income_long["Metric"].str.contains("Selling, General and Administrative Expenses", case=False, na=False)]
-dep_pp_e = df_income_long[df_income_long["Metric"].str.contains("Depreciation of property, plant and equipment", case=False, na=False)]
-dep_investment_props = df_income_long[df_income_long["Metric"].str.contains("Depreciation of investment properties", case=False, na=False)]
 
-# Aggregate each item by year
-gp = gross_profit.groupby("Year")["Value"].sum()
-op_inc = other_op_income.groupby("Year")["Value"].sum()
-op_exp = other_op_expenses.groupby("Year")["Value"].sum()
-sga = sga_expenses.groupby("Year")["Value"].sum()
-dep_ppe = dep_pp_e.groupby("Year")["Value"].sum()
-dep_inv = dep_investment_props.groupby("Year")["Value"].sum()
+def cagr_summary(df_summary):
+    # Define start and end years
+    start_year = df_summary.index.min()
+    end_year = df_summary.index.max()
+    num_years = end_year - start_year
+
+    # Calculate Revenue CAGR and Net Income CAGR
+    rev_start = df_summary.loc[start_year, "Revenue"]
+    rev_end = df_summary.loc[end_year, "Revenue"]
+
+    ni_start = df_summary.loc[start_year, "Net Income"]
+    ni_end = df_summary.loc[end_year, "Net Income"]
+
+    cagr_revenue = calculate_cagr(rev_start, rev_end, num_years)
+    cagr_net_income = calculate_cagr(ni_start, ni_end, num_years)
+    return start_year, end_year, cagr_revenue, cagr_net_income
+
+
+# KPI tables, the columns each one shows and the statements it is computed from
+KPI_TABLES = {
+    "df_changes": ([GROWTH_COLUMNS], ["income_statement"]),
+    "cagr": ([GROWTH_COLUMNS], ["income_statement"]),
+    "df_summary": ([GROWTH_COLUMNS, PROFITABILITY_COLUMNS], ["income_statement"]),
+    "df_ratios": ([LEVERAGE_COLUMNS], ["income_statement", "balance_sheet"]),
+    "df_efficiency": ([EFFICIENCY_COLUMNS], ["income_statement", "balance_sheet"]),
+    "df_fcf": ([FCF_COLUMNS], ["cash_flow"]),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def analysis_rules_hash():
+    return make_key(file_hash(__file__), file_hash(kpi_engine.__file__), file_hash(taxonomy.__file__))
+
+
+# Compute the KPI tables of one company. Every figure comes from the KPI registry,
+# and only the KPIs of the tables asked for are computed. With a BuildCache, a table
+# is only recomputed when one of the statements it depends on changed for that company.
+def compute_kpi_tables(indexes, company=None, cache=None):
+    tables = {}
+    keys = {}
+    if cache is not None:
+        fingerprints = {statement: index.fingerprint(company) for statement, index in indexes.items()}
+        for name, (_, statements) in KPI_TABLES.items():
+            keys[name] = make_key("kpi", name, analysis_rules_hash(), *[fingerprints[s] for s in statements])
+            table = cache.get(keys[name])
+            if table is not None:
+                tables[name] = table
+
+    missing = [name for name in KPI_TABLES if name not in tables]
+    if not missing:
+        return tables
+    names = list(dict.fromkeys(kpi for name in missing for columns in KPI_TABLES[name][0] for kpi in columns.values()))
+    df_kpis = company_kpis(indexes, names, company)
+
+    # Years with any growth figure, the ones not reported counted as 0
+    if {"df_changes", "cagr", "df_summary"} & set(missing):
+        df_growth = kpi_columns(df_kpis, GROWTH_COLUMNS).dropna(how="all").fillna(0)
+    if "df_changes" in missing:
+        tables["df_changes"] = yoy_changes(df_growth)
+    if "cagr" in missing:
+        tables["cagr"] = cagr_summary(df_growth)
+    if "df_summary" in missing:
+        df_summary = df_growth.copy()
+        for column, series in kpi_columns(df_kpis, PROFITABILITY_COLUMNS).items():
+            df_summary[column] = series
+        tables["df_summary"] = df_summary
+
+    # Ratios only for the years all of their inputs were reported, rounded for readability
+    if "df_ratios" in missing:
+        tables["df_ratios"] = kpi_columns(df_kpis, LEVERAGE_COLUMNS).dropna(subset=["Net Income", "Total Assets", "Shareholders' Equity", "Debt"]).round(2)
+    if "df_efficiency" in missing:
+        df_efficiency = kpi_columns(df_kpis, EFFICIENCY_COLUMNS)
+        tables["df_efficiency"] = df_efficiency.dropna(subset=["Revenue", "Operating Profit (EBIT)", "Total Assets", "Interest Expense"]).round(2)
+    if "df_fcf" in missing:
+        tables["df_fcf"] = kpi_columns(df_kpis, FCF_COLUMNS).dropna(subset=["Operating Cash Flow", "CapEx"]).round(2)
+
+    if cache is not None:
+        for name in missing:
+            cache.put(keys[name], tables[name])
+    return tables
 
-# Compute EBITDA considering negative values of op_exp, sga, dep_ppe, dep_inv
-ebitda = gp + op_inc + op_exp + sga + dep_ppe + dep_inv
-
-# Store in summary table
-df_summary["EBITDA"] = ebitda
-df_summary["EBITDA Margin (%)"] = (df_summary["EBITDA"] / df_summary["Revenue"]) * 100
-
-# Print results
-print("\n📊 EBITDA Summary:")
-print(df_summary[["EBITDA", "EBITDA Margin (%)"]].round(2))
-
-
-
-# Is Emaar growing?
-
-# Calculate key metrics
-total_assets = df_balance_long[df_balance_long["Metric"].str.contains("Total Assets", case=False, na=False)]
-shareholders_equity = df_balance_long[df_balance_long["Metric"].str.contains("Total Equity", case=False, na=False)]
-op_profit = df_summary["Operating Profit"]
-debt = df_balance_long[
-    df_balance_long["Metric"].str.contains("Interest-bearing loans and borrowings|Sukuk", case=False, na=False)]
-
-# Aggregate by Year
-assets = total_assets.groupby("Year")["Value"].sum()
-interest = finance_costs.groupby("Year")["Value"].sum().abs()  
-equity = shareholders_equity.groupby("Year")["Value"].sum()
-debt_by_year = debt.groupby("Year")["Value"].sum()
-
-# Combine into a single DataFrame
-df_ratios = pd.DataFrame({
-    "Net Income": ni,
-    "Total Assets": assets,
-    "Shareholders' Equity": equity,
-    "Debt": debt_by_year
-}).dropna()
-
-# Calculate ROA, ROE and Debt to Equity
-df_ratios["ROA (%)"] = (df_ratios["Net Income"] / df_ratios["Total Assets"]) * 100
-df_ratios["ROE (%)"] = (df_ratios["Net Income"] / df_ratios["Shareholders' Equity"]) * 100
-df_ratios["Debt to Equity"] = (df_ratios["Debt"] / df_ratios["Shareholders' Equity"])
-
-# Calculate Current Ratio
-# Key metrics
-current_asset_items = [
-    "Bank Balances And Cash",
-    "Trade And Unbilled Receivables",
-    "Other Assets, Receivables, Deposits And Prepayments",
-    "Assets Classified As Held For Sale"]
-
-current_liability_items = [
-    "Trade And Other Payables",
-    "Advances From Customers",
-    "Retentions Payable",
-    "Liabilities Directly Associated With Assets Classified As Held For Sale"]
-
-# Filter using exact match
-current_assets = df_balance_long[
-    df_balance_long["Metric"].str.strip().isin(current_asset_items)]
-
-current_liabilities = df_balance_long[
-    df_balance_long["Metric"].str.strip().isin(current_liability_items)]
-
-
-# Group by Year
-current_assets_by_year = current_assets.groupby("Year")["Value"].sum().round(2)
-current_liabilities_by_year = current_liabilities.groupby("Year")["Value"].sum().round(2)
-
-# Current Ratio
-current_ratio = current_assets_by_year / current_liabilities_by_year
-
-# Add to df_ratios
-df_ratios["Current Ratio"] = current_ratio
-
-# Round for readability
-df_ratios = df_ratios.round(2)
-
-# Display the results
-print("\n📊 ROA, ROE, Debt to Equity by Year and Current Ratio:")
-print(df_ratios[["ROA (%)", "ROE (%)", "Debt to Equity", "Current Ratio"]])
 
+# Charts
+CHART_DPI = 300
+FONT_PATH = "Merriweather-VariableFont_opsz,wdth,wght.ttf"
+CHART_KEY_FIELD = "Build Key"
 
-# Create dataframe for analysis
-df_efficiency = pd.DataFrame({
-    "Revenue": rev,
-    "Operating Profit (EBIT)": op_profit,
-    "Total Assets": assets,
-    "Interest Expense": interest
-}).dropna()
 
-# Asset Turnover and Interest Coverage
-df_efficiency["Asset Turnover"] = df_efficiency["Revenue"] / df_efficiency["Total Assets"]
-df_efficiency["Interest Coverage"] = df_efficiency["Operating Profit (EBIT)"] / df_efficiency["Interest Expense"]
+# Loaded once per process (each render worker has its own copy)
+@functools.lru_cache(maxsize=None)
+def load_font():
+    from matplotlib import font_manager
 
-# Round for readability
-df_efficiency = df_efficiency.round(2)
+    if not os.path.exists(FONT_PATH):
+        print("Font not found. Using default font.")
+        return None
+    return font_manager.FontProperties(fname=FONT_PATH, size=16)
 
-# Display results
-print("\n📊 Efficiency & Risk Ratios:")
-print(df_efficiency[["Asset Turnover", "Interest Coverage"]])
 
+# Graph 1
+def financial_overview_data(income, company=None):
+    df_kpis = company_kpis({"income_statement": income}, ["revenue", "net_income", "finance_costs", "operating_expenses_reported"], company)
+    df_plot = kpi_columns(df_kpis, {
+        "Revenue": "revenue",
+        "Net Income": "net_income",
+        "Finance Costs": "finance_costs",
+        "Operating Expenses": "operating_expenses_reported"
+    })
+    df_plot[["Finance Costs", "Operating Expenses"]] = df_plot[["Finance Costs", "Operating Expenses"]].abs()
+    return df_plot.dropna()
+
+
+def plot_financial_overview(df_plot, company=None, merriweather=None, path="emaar_financial_overview.png", show=True, metadata=None):
+    import matplotlib.pyplot as plt
+
+    years = df_plot.index.astype(str).tolist()
+    x = range(len(years))
+    revenue = df_plot["Revenue"]
+    net_income = df_plot["Net Income"]
+    finance_costs = df_plot["Finance Costs"]
+    op_expenses = df_plot["Operating Expenses"]
+    total_costs = finance_costs + op_expenses
+
+    # Plot
+    fig, ax = plt.subplots(figsize=(14, 6))
+    bar_width = 0.4
+
+    # Bars
+    ax.bar(x, finance_costs.values, width=bar_width, label='Finance Costs', color='black')
+    ax.bar(x, op_expenses.values, bottom=finance_costs.values, width=bar_width, label='Operational Costs', color='#f5f7f8')
+
+    # Bar labels
+    for i, val in enumerate(total_costs):
+        ax.text(i, val, f'{val/1e6:.0f}M', ha='center', va='bottom', fontsize=14, color='gray', fontproperties=merriweather)
+
+    # Lines
+    ax.plot(x, revenue.values, label='Revenue', color='#0c243f', marker='o', linewidth=2)
+    ax.plot(x, net_income.values, label='Net Income', color='#cba366', marker='s', linewidth=2)
+
+    # Line labels
+    for i, val in enumerate(revenue.values):
+        ax.text(i, val - 2e6, f'{val/1e6:.0f}M', ha='center', va='top', fontsize=14, color='#0c243f', fontproperties=merriweather)
+    for i, val in enumerate(net_income.values):
+        ax.text(i, val + 2.1e6, f'{val/1e6:.0f}M', ha='center', va='bottom', fontsize=14, color='#cba366', fontproperties=merriweather)
+
+    # Axis settings
+    ax.set_xticks(x)
+    ax.set_xticklabels(years, fontproperties=merriweather, fontsize=16)
+    ax.set_xlabel('Year', fontproperties=merriweather, fontsize=16)
+
+    # Remove Y tick labels but keep axis name
+    ax.set_yticklabels([])
+    ax.tick_params(axis='y', which='both', length=0)
+    ax.set_ylabel('Value (AED)', fontproperties=merriweather, fontsize=16)
+
+    # Title & Legend
+    name = (company or DEFAULT_COMPANY).title()
+    ax.set_title(f'{name} Financial Overview ({years[0]}–{years[-1]})', fontproperties=merriweather, fontsize=30)
+    ax.legend(
+        loc='upper center',
+        bbox_to_anchor=(0.5, -0.15),
+        ncol=4,
+        prop=merriweather,
+        frameon=False
+    )
+
+    # Styling
+    ax.set_facecolor('white')
+    fig.patch.set_facecolor('white')
+    ax.grid(False)
+
+    # Save + Show
+    plt.tight_layout()
+    with stage("savefig"):
+        plt.savefig(path, dpi=CHART_DPI, metadata=metadata)
+    if show:
+        plt.show()
+    plt.close(fig)
 
-# Does Emaar generate enough cash?
 
-# Extract cash from operations and capital expenditures (CapEx)
-cash_ops = df_cashflow_long[df_cashflow_long["Metric"].str.contains("net cash flows from operating activities", na=False)]
-capex = df_cashflow_long[df_cashflow_long["Metric"].str.contains("amounts incurred on property, plant and equipment|amounts incurred on investment properties", na=False)]
+# Graph 2
+def profitability_data(df_ratios):
+    # Group and prepare data
+    roa = (df_ratios["Net Income"] / df_ratios["Total Assets"]) * 100
+    roe = (df_ratios["Net Income"] / df_ratios["Shareholders' Equity"]) * 100
+    roa = roa.sort_index()
+    roe = roe.sort_index()
 
-cash_ops = cash_ops.groupby("Year")["Value"].sum()
-capex = capex.groupby("Year")["Value"].sum()
+    return pd.DataFrame({
+        "Return on Asset": roa,
+        "Return on Equity": roe
+    }).dropna()
+
+
+def plot_profitability(df_plot, company=None, merriweather=None, path="emaar_profitability_overview.png", show=True, metadata=None):
+    import matplotlib.pyplot as plt
+
+    years = df_plot.index.astype(str).tolist()
+    x = range(len(years))
+
+    # Plot
+    fig, ax = plt.subplots(figsize=(14, 6))
+
+    # Lines
+    ax.plot(x, df_plot["Return on Equity"].values, label='ROE', color='#0c243f', marker='o', linewidth=2)
+    ax.plot(x, df_plot["Return on Asset"].values, label='ROA', color='#cba366', marker='s', linewidth=2)
 
-# Align years
-years = sorted(list(set(cash_ops.index) & set(capex.index)))
-cash_ops = cash_ops.reindex(years)
-capex = capex.reindex(years)
+    # Line labels
+    for i, val in enumerate(df_plot["Return on Equity"].values):
+        ax.text(i, val - 0.7, f'{val:.1f}%', ha='center', va='top', fontsize=14, color='#0c243f', fontproperties=merriweather)
+
+    for i, val in enumerate(df_plot["Return on Asset"].values):
+        ax.text(i, val + 0.7, f'{val:.1f}%', ha='center', va='bottom', fontsize=14, color='#cba366', fontproperties=merriweather)
 
-# Calculate FCF
-df_fcf = pd.DataFrame({
-    "Operating Cash Flow": cash_ops,
-    "CapEx": capex
-})
-df_fcf["Free Cash Flow"] = df_fcf["Operating Cash Flow"] + df_fcf["CapEx"]
-df_fcf = df_fcf.round(2)
+    # Axis settings
+    ax.set_xticks(x)
+    ax.set_xticklabels(years, fontproperties=merriweather, fontsize=16)
+    ax.set_xlabel('Year', fontproperties=merriweather, fontsize=16)
 
-print("\n📊 Free Cash Flow Analysis:")
-print(df_fcf)
+    # Remove Y tick labels but keep axis name
+    ax.set_yticklabels([])
+    ax.tick_params(axis='y', which='both', length=0)
+    ax.set_ylabel('Value', fontproperties=merriweather, fontsize=16)
 
+    # Title & Legend
+    name = (company or DEFAULT_COMPANY).title()
+    ax.set_title(f'{name} Profitability ({years[0]}–{years[-1]})', fontproperties=merriweather, fontsize=30)
+    ax.legend(
+        loc='upper center',
+        bbox_to_anchor=(0.5, -0.15),
+        ncol=4,
+        prop=merriweather,
+        frameon=False
+    )
 
+    # Styling
+    ax.set_facecolor('white')
+    fig.patch.set_facecolor('white')
+    ax.grid(False)
 
+    # Save + Show
+    plt.tight_layout()
+    with stage("savefig"):
+        plt.savefig(path, dpi=CHART_DPI, metadata=metadata)
+    if show:
+        plt.show()
+    plt.close(fig)
 
-# Charts
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-from matplotlib import font_manager
-import os
 
-font_path = "Merriweather-VariableFont_opsz,wdth,wght.ttf"
-if not os.path.exists(font_path):
-    print("Font not found. Using default font.")
-    merriweather = None
-else:
-    merriweather = font_manager.FontProperties(fname=font_path, size=16)
+CHARTS = {
+    "financial_overview": plot_financial_overview,
+    "profitability_overview": plot_profitability,
+}
 
-# Graph 1
-# Group and prepare data
-rev = revenue.groupby("Year")["Value"].sum()
-ni = net_income.groupby("Year")["Value"].sum()
-opexp = op_expenses.groupby("Year")["Value"].sum().abs()
-fin_costs = finance_costs.groupby("Year")["Value"].sum().abs()
-
-df_plot = pd.DataFrame({
-    "Revenue": rev,
-    "Net Income": ni,
-    "Finance Costs": fin_costs,
-    "Operating Expenses": opexp
-}).dropna()
-
-years = df_plot.index.astype(str).tolist()
-x = range(len(years))
-revenue = df_plot["Revenue"]
-net_income = df_plot["Net Income"]
-finance_costs = df_plot["Finance Costs"]
-op_expenses = df_plot["Operating Expenses"]
-total_costs = finance_costs + op_expenses
-
-# Plot
-fig, ax = plt.subplots(figsize=(14, 6))
-bar_width = 0.4
-
-# Bars
-ax.bar(x, finance_costs.values, width=bar_width, label='Finance Costs', color='black')
-ax.bar(x, op_expenses.values, bottom=finance_costs.values, width=bar_width, label='Operational Costs', color='#f5f7f8')
-
-# Bar labels
-for i, val in enumerate(total_costs):
-    ax.text(i, val, f'{val/1e6:.0f}M', ha='center', va='bottom', fontsize=14, color='gray', fontproperties=merriweather)
-
-# Lines
-ax.plot(x, revenue.values, label='Revenue', color='#0c243f', marker='o', linewidth=2)
-ax.plot(x, net_income.values, label='Net Income', color='#cba366', marker='s', linewidth=2)
-
-# Line labels
-for i, val in enumerate(revenue.values):
-    ax.text(i, val - 2e6, f'{val/1e6:.0f}M', ha='center', va='top', fontsize=14, color='#0c243f', fontproperties=merriweather)
-for i, val in enumerate(net_income.values):
-    ax.text(i, val + 2.1e6, f'{val/1e6:.0f}M', ha='center', va='bottom', fontsize=14, color='#cba366', fontproperties=merriweather)
-
-# Axis settings
-ax.set_xticks(x)
-ax.set_xticklabels(years, fontproperties=merriweather, fontsize=16)
-ax.set_xlabel('Year', fontproperties=merriweather, fontsize=16)
-
-# Remove Y tick labels but keep axis name
-ax.set_yticklabels([])
-ax.tick_params(axis='y', which='both', length=0)
-ax.set_ylabel('Value (AED)', fontproperties=merriweather, fontsize=16)
-
-# Title & Legend
-ax.set_title('Emaar Financial Overview (2021–2024)', fontproperties=merriweather, fontsize=30)
-ax.legend(
-    loc='upper center',
-    bbox_to_anchor=(0.5, -0.15),
-    ncol=4,
-    prop=merriweather,
-    frameon=False
-)
-
-# Styling
-ax.set_facecolor('white')
-fig.patch.set_facecolor('white')
-ax.grid(False)
-
-# Save + Show
-plt.tight_layout()
-plt.savefig("emaar_financial_overview.png", dpi=300)
-plt.show()
+
+# Hash of everything that changes the picture: the plotted data, the drawing code
+# (this file), the resolution and the font
+def chart_key(kind, company, df_plot):
+    data = hashlib.sha256(pd.util.hash_pandas_object(df_plot).values.tobytes()).hexdigest()
+    font = file_hash(FONT_PATH) if os.path.exists(FONT_PATH) else None
+    return make_key("chart", kind, company, list(df_plot.columns), data, analysis_rules_hash(), CHART_DPI, font)
+
+
+# Key stored in the PNG text chunk when the chart was saved, None if there is no chart
+def saved_chart_key(path):
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            return image.text.get(CHART_KEY_FIELD)
+    except (OSError, AttributeError):
+        return None
+
+
+def _init_render_worker():
+    import matplotlib
+
+    matplotlib.use("Agg")
+    load_font()
+
+
+def _render_chart(task):
+    kind, company, df_plot, path, key = task
+    with stage(f"render {kind}", company=company, rows=len(df_plot)):
+        CHARTS[kind](df_plot, company, load_font(), path, show=False, metadata={CHART_KEY_FIELD: key})
+    return path
+
+
+# Render (kind, company, df_plot, path) charts without a display. Charts whose saved
+# key matches are left as they are; the rest are drawn in worker processes that
+# each load the font once. Returns the paths that were (re)drawn.
+def render_charts(charts, processes=None):
+    tasks = []
+    for kind, company, df_plot, path in charts:
+        key = chart_key(kind, company, df_plot)
+        if saved_chart_key(path) != key:
+            tasks.append((kind, company, df_plot, path, key))
+
+    if processes == 1 or len(tasks) < 2:
+        _init_render_worker()
+        return [_render_chart(task) for task in tasks]
+
+    with ProcessPoolExecutor(processes, initializer=_init_render_worker) as pool:
+        return list(pool.map(_render_chart, tasks))
+
+
+# Print the KPI tables of one company
+def print_kpi_tables(tables):
+    # Print the result
+    print("Year-over-Year % Change in Financial Metrics:")
+    print(tables["df_changes"])
+
+    ## In 2022 and 2023, net income increased despite flat or declining revenue due to significant cost reductions. In 2024, revenue grew strongly, but higher production and operating costs reduced profit growth, leading to margin compression.
+
+    start_year, end_year, cagr_revenue, cagr_net_income = tables["cagr"]
+    print(f"\n📈 Revenue CAGR ({start_year}–{end_year}): {cagr_revenue * 100:.2f}%")
+    print(f"📈 Net Income CAGR ({start_year}–{end_year}): {cagr_net_income * 100:.2f}%")
+
+    df_summary = tables["df_summary"]
+
+    # Round for readability
+    df_summary_rounded = df_summary[[
+        "Revenue", "Net Income", "Gross Margin (%)", "Operating Margin (%)", "Net Margin (%)"
+    ]].round(2)
+
+    # Display
+    print("\n📊 Profitability Summary Table:")
+    print(df_summary_rounded)
+
+    ## Strong cost control and margin improvement across 2021–2024 show increasing operational efficiency and healthy profitability. Even with a slight dip in margin in 2024, the income-to-revenue ratio remains excellent.
+
+    print("\n📊 EBITDA Summary:")
+    print(df_summary[["EBITDA", "EBITDA Margin (%)"]].round(2))
+
+    df_ratios = tables["df_ratios"]
+    print("\n📊 ROA, ROE, Debt to Equity by Year and Current Ratio:")
+    print(df_ratios[["ROA (%)", "ROE (%)", "Debt to Equity", "Current Ratio"]])
+
+    df_efficiency = tables["df_efficiency"]
+    print("\n📊 Efficiency & Risk Ratios:")
+    print(df_efficiency[["Asset Turnover", "Interest Coverage"]])
+
+    df_fcf = tables["df_fcf"]
+    print("\n📊 Free Cash Flow Analysis:")
+    print(df_fcf)
 
 
-# Graph 2
-# Group and prepare data
-roa = (df_ratios["Net Income"] / df_ratios["Total Assets"]) * 100
-roe = (df_ratios["Net Income"] / df_ratios["Shareholders' Equity"]) * 100
-roa = roa.sort_index()
-roe = roe.sort_index()
-
-
-df_plot = pd.DataFrame({
-    "Return on Asset": roa,
-    "Return on Equity": roe
-}).dropna()
-
-years = df_plot.index.astype(str).tolist()
-x = range(len(years))
-returnonasset = df_plot["Return on Asset"]
-returnonequity = df_plot["Return on Equity"]
-
-# Plot
-fig, ax = plt.subplots(figsize=(14, 6))
-bar_width = 0.4
-
-# Lines
-ax.plot(x, roe.values, label='ROE', color='#0c243f', marker='o', linewidth=2)
-ax.plot(x, roa.values, label='ROA', color='#cba366', marker='s', linewidth=2)
-
-# Line labels
-for i, val in enumerate(roe.values):
-    ax.text(i, val - 0.7, f'{val:.1f}%', ha='center', va='top', fontsize=14, color='#0c243f', fontproperties=merriweather)
-
-for i, val in enumerate(roa.values):
-    ax.text(i, val + 0.7, f'{val:.1f}%', ha='center', va='bottom', fontsize=14, color='#cba366', fontproperties=merriweather)
-
-
-# Axis settings
-ax.set_xticks(x)
-ax.set_xticklabels(years, fontproperties=merriweather, fontsize=16)
-ax.set_xlabel('Year', fontproperties=merriweather, fontsize=16)
-
-# Remove Y tick labels but keep axis name
-ax.set_yticklabels([])
-ax.tick_params(axis='y', which='both', length=0)
-ax.set_ylabel('Value', fontproperties=merriweather, fontsize=16)
-
-# Title & Legend
-ax.set_title('Emaar Profitability (2021–2024)', fontproperties=merriweather, fontsize=30)
-ax.legend(
-    loc='upper center',
-    bbox_to_anchor=(0.5, -0.15),
-    ncol=4,
-    prop=merriweather,
-    frameon=False
-)
-
-# Styling
-ax.set_facecolor('white')
-fig.patch.set_facecolor('white')
-ax.grid(False)
-
-# Save + Show
-plt.tight_layout()
-plt.savefig("emaar_profitability_overview.png", dpi=300)
-plt.show()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="KPIs and charts from the cleaned statements.")
+    parser.add_argument("input_dir", nargs="?", default=".")
+    parser.add_argument("--only", choices=["kpis", "charts"], help="print the KPI tables or draw the charts, not both")
+    parser.add_argument("--cache", metavar="DIR", help="reuse KPI tables of companies whose statements are unchanged")
+    parser.add_argument("--headless", action="store_true", help="save the charts without showing them, skipping unchanged ones")
+    parser.add_argument("--charts-dir", default=".", help="where the chart images are written")
+    parser.add_argument("--processes", type=int, help="chart rendering processes in headless mode")
+    parser.add_argument("--memory", action="store_true", help="print the memory used by the loaded tables and indexes and the peak RSS")
+    parser.add_argument("--profile", metavar="FILE", help="record per-stage timings (.json: Chrome trace, otherwise JSON lines)")
+    args = parser.parse_args(argv)
+    if args.profile:
+        enable_profiling(args.profile)
+
+    show_kpis = args.only != "charts"
+    draw_charts = args.only != "kpis"
+    if draw_charts:
+        if args.headless:
+            import matplotlib
+
+            matplotlib.use("Agg")
+        os.makedirs(args.charts_dir, exist_ok=True)
+
+    frames = load_cleaned(args.input_dir) if args.memory else None
+    indexes = load_indexes(args.input_dir, frames)
+    if args.memory:
+        report_memory(frames, extra_bytes=sum(index.nbytes for index in indexes.values()))
+    income = indexes["income_statement"]
+    cache = BuildCache(args.cache) if args.cache else None
+    merriweather = load_font() if draw_charts and not args.headless else None
+    charts = []
+
+    for company in income.companies:
+        with stage("kpi_tables", company=company):
+            tables = compute_kpi_tables(indexes, company, cache)
+
+        if show_kpis:
+            print(f"\n🏢 {company}")
+            print_kpi_tables(tables)
+
+        if not draw_charts:
+            continue
+        for kind, df_plot in [
+            ("financial_overview", financial_overview_data(income, company)),
+            ("profitability_overview", profitability_data(tables["df_ratios"])),
+        ]:
+            path = os.path.join(args.charts_dir, f"{company}_{kind}.png")
+            if args.headless:
+                charts.append((kind, company, df_plot, path))
+            else:
+                CHARTS[kind](df_plot, company, merriweather, path)
+
+    if charts:
+        rendered = render_charts(charts, args.processes)
+        print(f"\nCharts: {len(rendered)} rendered, {len(charts) - len(rendered)} unchanged")
+
+    if cache is not None:
+        cache.evict()
+
+
+if __name__ == "__main__":
+    main()
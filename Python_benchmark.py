@@ -0,0 +1,212 @@
+#####################################################################
+##########  EMAAR Properties : Pipeline benchmarks          ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import Python_cleaning_v2 as cleaning
+from Python_analysis import build_indexes, compute_kpi_tables, financial_overview_data, load_cleaned, profitability_data, render_charts
+from Python_cleaning_v2 import (categorise_balance_sheet, categorise_income_statement, clean_statement, clean_universe,
+                                discover_statements, melt_statement, parse_values, rename_columns, save_cleaned)
+from Python_generate_statements import generate
+from Python_kpi_engine import KPI_REGISTRY, KPIEngine
+
+
+# Time a stage `repeat` times (best and mean wall time, best CPU time), then run it
+# once more under tracemalloc for the peak of Python/NumPy allocations. Memory used
+# inside worker processes is not included.
+class StageTimer:
+    def __init__(self, repeat=3, memory=True):
+        self.repeat = repeat
+        self.memory = memory
+        self.results = []
+
+    def run(self, stage, func, scale, rows=None):
+        walls, cpus = [], []
+        for _ in range(self.repeat):
+            wall, cpu = time.perf_counter(), time.process_time()
+            result = func()
+            walls.append(time.perf_counter() - wall)
+            cpus.append(time.process_time() - cpu)
+
+        peak = None
+        if self.memory:
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        record = {
+            **scale,
+            "stage": stage,
+            "wall_s": min(walls),
+            "wall_mean_s": sum(walls) / len(walls),
+            "cpu_s": min(cpus),
+            "peak_bytes": peak,
+            "rows": rows(result) if callable(rows) else rows,
+        }
+        self.results.append(record)
+        label = " ".join(f"{key}={value}" for key, value in scale.items() if value is not None)
+        print(f"{label:<24} {stage:<16} {record['wall_s']:9.4f}s"
+              + (f" {peak / 1024 ** 2:9.1f} MB" if peak is not None else ""))
+        return result
+
+
+def _total_rows(frames):
+    return sum(len(df) for df in frames.values())
+
+
+def bench_scale(timer, workdir, companies, years, formats, processes, render_companies):
+    scale = {"companies": companies, "years": years}
+    source = os.path.join(workdir, f"statements_{companies}x{years}")
+    generate(source, companies, years)
+    paths = discover_statements(source)
+    files = [(company, statement, path) for company, statements in paths.items() for statement, path in statements.items()]
+
+    # Cleaning, stage by stage, the way clean_statement runs them
+    raw = timer.run("load", lambda: {(c, s): pd.read_csv(p) for c, s, p in files}, scale, _total_rows)
+    melted = timer.run("melt", lambda: {key: melt_statement(rename_columns(df), key[1]) for key, df in raw.items()},
+                       scale, _total_rows)
+    timer.run("parse", lambda: [parse_values(df["Value"]) for df in melted.values()], scale, _total_rows(melted))
+    cleaned = {key: clean_statement(df, key[1]) for key, df in raw.items()}
+
+    def classify():
+        # Start from an empty memo, as a fresh worker process would
+        cleaning._income_category_memo.clear()
+        for (_, statement), df_long in cleaned.items():
+            if statement == "income_statement":
+                categorise_income_statement(df_long["Metric"])
+            elif statement == "balance_sheet":
+                categorise_balance_sheet(df_long.drop(columns="Category"))
+
+    timer.run("classify", classify, scale, _total_rows(cleaned))
+    universe = timer.run("clean", lambda: clean_universe(source, processes=processes), scale, _total_rows)
+
+    # Save and reload in every output format
+    frames = None
+    for fmt in formats:
+        output_dir = os.path.join(workdir, f"cleaned_{companies}x{years}_{fmt}")
+        timer.run(f"save_{fmt}", lambda: save_cleaned(universe, output_dir, fmt), scale, _total_rows(universe))
+        frames = timer.run(f"reload_{fmt}", lambda: load_cleaned(output_dir), scale, _total_rows)
+
+    # KPIs: per-company tables as printed by the analysis, and the whole grid at once
+    indexes = timer.run("index", lambda: build_indexes(frames), scale, _total_rows(frames))
+    company_names = list(indexes["income_statement"].companies)
+    tables = timer.run("kpi_tables", lambda: {c: compute_kpi_tables(indexes, c) for c in company_names}, scale, len(company_names))
+    timer.run("kpi_engine", lambda: KPIEngine(indexes).frame(list(KPI_REGISTRY)), scale, len)
+
+    # Rendering, always from scratch so the skip-if-unchanged check does not kick in
+    charts_dir = os.path.join(workdir, f"charts_{companies}x{years}")
+    income = indexes["income_statement"]
+    charts = []
+    for company in company_names[:render_companies]:
+        charts.append(("financial_overview", company, financial_overview_data(income, company),
+                       os.path.join(charts_dir, f"{company}_financial_overview.png")))
+        charts.append(("profitability_overview", company, profitability_data(tables[company]["df_ratios"]),
+                       os.path.join(charts_dir, f"{company}_profitability_overview.png")))
+
+    def render():
+        shutil.rmtree(charts_dir, ignore_errors=True)
+        os.makedirs(charts_dir)
+        return render_charts(charts, processes)
+
+    timer.run("render", render, scale, len)
+
+
+# Value parser against the chain it replaced: drop "–", str.replace(",", ""), astype(float)
+def bench_parser(timer, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    numbers = rng.uniform(-3e7, 3e7, rows)
+    text = pd.Series([f"{v:,.0f}" for v in numbers])
+    scale = {"companies": None, "years": None, "cells": rows}
+
+    timer.run("parse_values", lambda: parse_values(text), scale, rows)
+    timer.run("replace_astype", lambda: text[text.astype(str).str.strip() != "–"].astype(str).str.replace(",", "").astype(float), scale, rows)
+
+
+def environment():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": revision,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _result_key(record):
+    return record["stage"], record.get("companies"), record.get("years"), record.get("cells")
+
+
+# Stages that got slower than the baseline run by more than `tolerance` (0.25 = 25%)
+def compare(results, baseline, tolerance=0.25):
+    previous = {_result_key(record): record for record in baseline["results"]}
+    regressions = []
+    for record in results:
+        before = previous.get(_result_key(record))
+        if before and before["wall_s"] > 0 and record["wall_s"] > before["wall_s"] * (1 + tolerance):
+            regressions.append((record, before))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and memory-profile the cleaning and analysis stages on synthetic statements.")
+    parser.add_argument("--scales", default="1,10,100", help="comma-separated company counts")
+    parser.add_argument("--years", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--formats", default="csv,npy", help="output formats to save and reload (csv, npy, parquet)")
+    parser.add_argument("--processes", type=int, help="worker processes for cleaning and rendering")
+    parser.add_argument("--render-companies", type=int, default=4, help="companies whose charts are rendered at each scale")
+    parser.add_argument("--parser-rows", type=int, default=1_000_000, help="cells for the value parser benchmark (0 to skip)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    timer = StageTimer(args.repeat, memory=not args.no_memory)
+    with tempfile.TemporaryDirectory(prefix="emaar_bench_") as workdir:
+        for companies in [int(n) for n in args.scales.split(",")]:
+            bench_scale(timer, workdir, companies, args.years, args.formats.split(","), args.processes, args.render_companies)
+    if args.parser_rows:
+        bench_parser(timer, args.parser_rows)
+
+    report = {"environment": environment(), "settings": vars(args), "results": timer.results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(timer.results, json.load(f), args.tolerance)
+        for record, before in regressions:
+            print(f"⚠️ {record['stage']} ({record['companies']} x {record['years']}): "
+                  f"{before['wall_s']:.4f}s -> {record['wall_s']:.4f}s")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#####################################################################
+##########  EMAAR Properties : Incremental build cache     ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+DEFAULT_CACHE_DIR = ".emaar_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+_MISSING = object()
+
+
+# Content hash of a file, read in blocks so large exports don't sit in memory
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Same hash as file_hash, for contents already read into memory
+def bytes_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# Cache key from any number of parts (stage name, input hashes, rules hash, ...)
+def make_key(*parts):
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+# Pickled build products stored one file per key. Reading an entry touches its
+# mtime, and evict() removes the least recently used entries above max_bytes.
+class BuildCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return default
+        os.utime(path)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        # Write to a temporary file first so concurrent workers never read half an entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+
+    # Return the cached value for key, or compute, store and return it
+    def fetch(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+        return total
@@ -2,42 +2,305 @@
 ##########  EMAAR Properties : Data cleaning & preparation ##########
 #####################################################################
 
-## By Maria Elena Lasiu 
-
+## By Maria Elena Lasiu
+
+import argparse
+import contextlib
+import functools
+import hashlib
+import io
+import itertools
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-
-# Load the datasets
-df_balance = pd.read_csv("official_emaar_balance_sheet.csv")
-df_income = pd.read_csv("official_emaar_income_statement.csv")
-df_cashflow = pd.read_csv("official_emaar_cash_flow.csv")
 
+from Python_build_cache import BuildCache, bytes_hash, file_hash, make_key
+from Python_io import DEFAULT_IO_THREADS, WriteQueue, bounded_map, prefetch_files, read_ahead
+from Python_profiling import enable as enable_profiling, peak_rss_kb, stage
+import Python_taxonomy as taxonomy
+
+# Statements handled by the pipeline, keyed by the suffix used in the file names
+# (official_<company>_<statement>.csv -> cleaned_<statement>_v2.csv)
+STATEMENTS = ["balance_sheet", "income_statement", "cash_flow"]
+
+# Period headers: period-end dates ("31/12/2024", "2024-12-31", "31 Dec 2024",
+# "Dec 2024"), quarters ("Q1 2024", "2024 Q1") or fiscal years ("FY2024", "2024").
+# Each pattern gives (year, month, quarter), None where the header does not say.
+MONTHS = {month: i for i, month in enumerate(["jan", "feb", "mar", "apr", "may", "jun",
+                                              "jul", "aug", "sep", "oct", "nov", "dec"], start=1)}
+PERIOD_HEADERS = [
+    (re.compile(r"^(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})$"), lambda m: (int(m[3]), int(m[2]), None)),
+    (re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})$"), lambda m: (int(m[1]), int(m[2]), None)),
+    (re.compile(rf"^(?:\d{{1,2}}[\s-]+)?({'|'.join(MONTHS)})[a-z]*\.?[\s-]+(\d{{4}})$"), lambda m: (int(m[2]), MONTHS[m[1]], None)),
+    (re.compile(r"^q([1-4])[\s-]*(\d{4})$"), lambda m: (int(m[2]), None, int(m[1]))),
+    (re.compile(r"^(\d{4})[\s-]*q([1-4])$"), lambda m: (int(m[1]), None, int(m[2]))),
+    (re.compile(r"^(?:fy\s*)?(\d{4})$"), lambda m: (int(m[1]), None, None)),
+]
 
-# Rename columns
-df_balance.rename(columns={"Unnamed: 0":"Metric", "31/12/2024":"2024", "31/12/2023":"2023", "31/12/2022":"2022", "31/12/2021":"2021"}, inplace=True)
-
-df_income.rename(columns={"Unnamed: 0":"Metric", "31/12/2024":"2024", "31/12/2023":"2023", "31/12/2022":"2022", "31/12/2021":"2021"}, inplace=True)
-
-df_cashflow.rename(columns={"Unnamed: 0":"Metric", "31/12/2024":"2024", "31/12/2023":"2023", "31/12/2022":"2022", "31/12/2021":"2021"}, inplace=True)
 
-# Convert wide format to long format
-df_balance_long = df_balance.melt(id_vars=["Metric"], var_name="Year", value_name="Value")
-df_income_long = df_income.melt(id_vars=["Metric"], var_name="Year", value_name="Value")
-df_cashflow_long = df_cashflow.melt(id_vars=["Metric"], var_name="Year", value_name="Value")
+def parse_period_header(header):
+    header = str(header).strip().lower()
+    for pattern, period in PERIOD_HEADERS:
+        match = pattern.match(header)
+        if match:
+            return period(match)
+    return None
 
 
-# Remove blank lines
-df_balance_long.dropna(subset=["Metric"], inplace=True)
-df_balance_long = df_balance_long[df_balance_long["Metric"].str.strip().astype(bool)]
-df_balance_long = df_balance_long[df_balance_long["Value"].astype(str).str.strip() != "–"]
+# Rename columns
+# Annual columns become the plain year ("2024"), interim columns the year and quarter
+# ("2024Q1", quarters of the calendar year). With quarterly=None the frequency is
+# inferred: explicit quarters, or more than one period end in the same year, make a
+# filing quarterly. A single "31/12/2024" column cannot tell, so pass quarterly=True
+# for one-quarter filings. Headers that name a year in another shape ("H1 2024"),
+# period ends that are not quarter ends, and inferred annual columns that do not end
+# in December (half years, other fiscal years; pass quarterly=False for the latter)
+# raise ValueError rather than being guessed.
+def rename_columns(df, quarterly=None):
+    periods = {}
+    for column in df.columns:
+        period = parse_period_header(column)
+        if period is not None:
+            periods[column] = period
+        elif re.search(r"\d{4}", str(column)):
+            raise ValueError(f"Unrecognised period header: {column!r}")
+
+    months = {column: month for column, (_, month, _) in periods.items() if month is not None}
+    odd = [column for column, month in months.items() if month % 3]
+    if quarterly is not False and odd:
+        raise ValueError(f"Period ends are not quarter ends: {', '.join(map(repr, odd))}")
+    if quarterly is None:
+        years = [year for year, _, _ in periods.values()]
+        quarterly = any(quarter is not None for _, _, quarter in periods.values()) or len(set(years)) < len(years)
+        not_december = [column for column, month in months.items() if month != 12]
+        if not quarterly and not_december:
+            raise ValueError(f"Cannot tell whether the columns {', '.join(map(repr, not_december))} are years or "
+                             "interim periods; pass quarterly=True (--quarterly) or quarterly=False (--annual)")
+
+    columns = {"Unnamed: 0": "Metric"}
+    for column, (year, month, quarter) in periods.items():
+        if quarterly:
+            quarter = quarter or ((month - 1) // 3 + 1 if month else 4)
+            columns[column] = f"{year}Q{quarter}"
+        else:
+            columns[column] = str(year)
+    return df.rename(columns=columns)
+
+
+# Parse financial numbers
+# Every cell is read as UTF-8 bytes from one contiguous buffer and run through a
+# byte-level state machine, one character position at a time across all cells.
+_DIGITS = b"0123456789"
+_BYTE_CLASSES = {
+    "digit": _DIGITS, "skip": b", \t\x00", "dot": b".", "minus": b"-", "open": b"(", "close": b")",
+    "k": b"kK", "m": b"mM", "b": b"bB", "n": b"nN",
+}
+# Multi-byte characters folded to ASCII before parsing (padded with spaces to keep offsets)
+_UTF8_FOLDS = [
+    ("−".encode(), b"-  "),  # minus sign
+    ("–".encode(), b"-  "),  # en dash
+    ("—".encode(), b"-  "),  # em dash
+    ("\u00a0".encode(), b"  "),  # no-break space
+]
 
-df_income_long.dropna(subset=["Metric"], inplace=True)
-df_income_long = df_income_long[df_income_long["Metric"].str.strip().astype(bool)]
-df_income_long = df_income_long[df_income_long["Value"].astype(str).str.strip() != "–"]
+# States of one sign mode; each is repeated for plain, leading-minus and parenthesised numbers
+_STATES = ["start", "sign", "opened", "int", "dot_after", "dot_lead", "frac", "trail",
+           "k", "m", "b", "mn", "bn", "done_k", "done_m", "done_b",
+           "closed", "closed_k", "closed_m", "closed_b", "error"]
+_MODES = ["plain", "negative", "paren"]
+_NUMBER_STATES = ["int", "dot_after", "frac", "trail"]
+_SUFFIX_DONE = {"k": "done_k", "m": "done_m", "b": "done_b", "mn": "done_m", "bn": "done_b",
+                "done_k": "done_k", "done_m": "done_m", "done_b": "done_b"}
+_CLOSED = {"done_k": "closed_k", "done_m": "closed_m", "done_b": "closed_b"}
+_SCALE_OF = {"k": 1e3, "m": 1e6, "b": 1e9}
+
+
+def _state_id(mode, state):
+    return (_MODES.index(mode) * len(_STATES) + _STATES.index(state)) * 256
+
+
+def _build_parser_tables():
+    transitions = {}
+    for mode in _MODES:
+        def go(state, cls, target, target_mode=mode):
+            transitions[(mode, state, cls)] = (target_mode, target)
+
+        go("start", "skip", "start")
+        go("start", "minus", "sign", "negative")
+        go("start", "open", "opened", "paren")
+        go("sign", "skip", "sign")
+        go("opened", "skip", "opened")
+        for state in ("start", "sign", "opened"):
+            go(state, "digit", "int")
+            go(state, "dot", "dot_lead")
+        go("int", "digit", "int")
+        go("int", "skip", "int")
+        go("int", "dot", "dot_after")
+        for state in ("dot_after", "dot_lead", "frac"):
+            go(state, "digit", "frac")
+        for state in ("dot_after", "frac", "trail"):
+            go(state, "skip", "trail")
+        for state in _NUMBER_STATES:
+            for letter in "kmb":
+                go(state, letter, letter)
+        go("m", "n", "mn")
+        go("b", "n", "bn")
+        for state, done in _SUFFIX_DONE.items():
+            go(state, "skip", done)
+        if mode == "paren":
+            for state in _NUMBER_STATES:
+                go(state, "close", "closed")
+            for state, done in _SUFFIX_DONE.items():
+                go(state, "close", _CLOSED[done])
+            for closed in ["closed", *_CLOSED.values()]:
+                go(closed, "skip", closed)
+
+    table = np.empty(len(_MODES) * len(_STATES) * 256, dtype=np.int32)
+    for mode in _MODES:
+        for state in _STATES:
+            row = _state_id(mode, state)
+            table[row:row + 256] = _state_id(mode, "error")
+            for cls, chars in _BYTE_CLASSES.items():
+                if (mode, state, cls) in transitions:
+                    for byte in chars:
+                        table[row + byte] = _state_id(*transitions[(mode, state, cls)])
+
+    size = len(_MODES) * len(_STATES)
+    accept = np.zeros(size, dtype=bool)
+    scale = np.ones(size)
+    in_fraction = np.zeros(size, dtype=np.int16)
+    for mode in _MODES:
+        for state in _STATES:
+            i = _state_id(mode, state) // 256
+            closed = state.startswith("closed")
+            if mode == "paren":
+                accept[i] = closed
+            else:
+                accept[i] = state in _NUMBER_STATES or state in _SUFFIX_DONE
+            if state in _SUFFIX_DONE or closed:
+                scale[i] = _SCALE_OF.get(state.split("_")[-1][:1], 1.0)
+            in_fraction[i] = state == "frac"
+
+    # Index every per-state table by state * 256 directly
+    expand = lambda values: np.repeat(values, 256)
+    return table, expand(accept), expand(scale), expand(in_fraction)
+
+
+_TRANSITIONS, _ACCEPT, _STATE_SCALE, _IN_FRACTION = _build_parser_tables()
+_STATE_NEGATIVE = np.repeat(np.arange(len(_MODES) * len(_STATES)) >= len(_STATES), 256)
+_PLACEHOLDER = np.zeros(len(_TRANSITIONS), dtype=bool)
+_PLACEHOLDER[_state_id("negative", "sign")] = True
+_BLANK = np.zeros(len(_TRANSITIONS), dtype=bool)
+_BLANK[_state_id("plain", "start")] = True
+_IS_DIGIT = np.zeros(256, dtype=bool)
+_IS_DIGIT[list(_DIGITS)] = True
+_DIGIT_SHIFT = np.where(_IS_DIGIT, 10, 1).astype(np.int64)
+_DIGIT_VALUE = np.zeros(256, dtype=np.int64)
+_DIGIT_VALUE[list(_DIGITS)] = np.arange(10)
+_MAX_WIDTH = 40
+# Digits are accumulated in int64, which holds any 18-digit number exactly
+_MAX_DIGITS = 18
+
+
+# UTF-8 bytes of all cells back to back, with the start and end offset of each cell.
+# Arrow-backed strings already live in such a buffer; anything else is joined once.
+def _utf8_buffer(text):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        pa = None
+
+    if pa is not None:
+        array = pa.array(text.array, from_pandas=True)
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks()
+        array = array.cast(pa.large_string()).fill_null("")
+        _, offsets, data = array.buffers()
+        offsets = np.frombuffer(offsets, dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+        data = np.frombuffer(data, dtype=np.uint8) if data is not None else np.zeros(0, dtype=np.uint8)
+        starts, ends = offsets[:-1], offsets[1:]
+    else:
+        data = np.frombuffer("\x00".join(text.fillna("").tolist()).encode("utf-8"), dtype=np.uint8)
+        ends = np.append(np.flatnonzero(data == 0), len(data))
+        starts = np.append(0, ends[:-1] + 1)
+
+    if (data >= 0x80).any():
+        data = data.copy()
+        for pattern, replacement in _UTF8_FOLDS:
+            hits = np.flatnonzero(data[:len(data) - len(pattern) + 1] == pattern[0])
+            for k, byte in enumerate(pattern[1:], start=1):
+                hits = hits[data[hits + k] == byte]
+            for k, byte in enumerate(replacement):
+                data[hits + k] = byte
+    return data, starts, ends
+
+
+def _parse_block(data, starts, ends):
+    n = len(starts)
+    lengths = ends - starts
+    width = int(min(lengths.max(initial=0), _MAX_WIDTH))
+    last = max(len(data) - 1, 0)
+    # Most statements hold whole numbers; skip the decimal bookkeeping when there is no dot
+    has_dot = n and (data[starts[0]:ends[-1]] == ord(".")).any()
+
+    state = np.zeros(n, dtype=np.int32)
+    mantissa = np.zeros(n, dtype=np.int64)
+    decimals = np.zeros(n, dtype=np.int16)
+    for j in range(width):
+        chars = data[np.minimum(starts + j, last)]
+        chars[lengths <= j] = 0
+        state = _TRANSITIONS[state + chars]
+        # Horner step over the digits; non-digits multiply by 1 and add 0
+        mantissa = mantissa * _DIGIT_SHIFT[chars] + _DIGIT_VALUE[chars]
+        if has_dot:
+            decimals += _IN_FRACTION[state]
+
+    # Cells with more digits than int64 holds have wrapped around and are rejected.
+    # Only cells longer than _MAX_DIGITS can have that many, so only they are counted.
+    overflow = np.zeros(n, dtype=bool)
+    long_cells = np.flatnonzero(lengths > _MAX_DIGITS)
+    if len(long_cells):
+        offsets = np.arange(width)
+        positions = np.minimum(starts[long_cells, None] + offsets, last)
+        digits = _IS_DIGIT[data[positions]] & (offsets < lengths[long_cells, None])
+        overflow[long_cells] = digits.sum(axis=1) > _MAX_DIGITS
+
+    # The digits are converted to float once; states carry the sign mode and, once a
+    # suffix is read, the scale
+    values = mantissa / 10.0 ** decimals * _STATE_SCALE[state]
+    values[_STATE_NEGATIVE[state]] *= -1
+    # Cells longer than _MAX_WIDTH were only read in part, so whatever their first
+    # bytes look like (blank, a lone "-"), they are invalid
+    too_long = lengths > _MAX_WIDTH
+    accepted = _ACCEPT[state] & ~too_long & ~overflow
+    placeholder = _PLACEHOLDER[state] & ~too_long
+    values[~accepted] = np.nan
+    return values, ~accepted & ~placeholder & (~_BLANK[state] | too_long), placeholder
+
+
+# Parse a column of financial figures into float64. Handles thousands separators,
+# (parenthesised) negatives, Unicode minus signs, K/M/B(n) scale suffixes and blanks.
+# Numbers with more than 18 digits count as unparseable. Returns the values, a mask of unparseable cells (NaN in values) and a mask of
+# dash placeholders such as "–".
+def parse_values(values, block_size=1 << 16):
+    values = pd.Series(values)
+    n = len(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float), np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+
+    data, starts, ends = _utf8_buffer(values.astype("string"))
+    parsed = np.empty(n)
+    invalid = np.empty(n, dtype=bool)
+    placeholder = np.empty(n, dtype=bool)
+    for start in range(0, n, block_size):
+        block = slice(start, start + block_size)
+        parsed[block], invalid[block], placeholder[block] = _parse_block(data, starts[block], ends[block])
+    return parsed, invalid, placeholder
 
-df_cashflow_long.dropna(subset=["Metric"], inplace=True)
-df_cashflow_long = df_cashflow_long[df_cashflow_long["Metric"].str.strip().astype(bool)]
-df_cashflow_long = df_cashflow_long[df_cashflow_long["Value"].astype(str).str.strip() != "–"]
 
 # Remove extra rows on income statement
 metrics_to_remove = [
@@ -45,106 +308,598 @@ metrics_to_remove = [
     "Earnings per share attributable to the owners of the Company:"
 ]
 
-# Remove rows where Metric matches those values (case-insensitive + stripped)
-df_income_long = df_income_long[~df_income_long["Metric"].str.strip().str.lower().isin([m.lower() for m in metrics_to_remove])]
-
 
-# Manage missing values
-# df_balance_long.fillna(0, inplace=True)
-# df_income_long.fillna(0, inplace=True)
-# df_cashflow_long.fillna(0, inplace=True)
-
-# Standardise and Capitalise Metric column
-df_balance_long["Metric"] = df_balance_long["Metric"].str.lower().str.strip().str.title()
-df_income_long["Metric"] = df_income_long["Metric"].str.lower().str.strip().str.title()
-df_cashflow_long["Metric"] = df_cashflow_long["Metric"].str.lower().str.strip().str.title()
+# Categorise items in balance sheet
+# Each distinct line item is mapped to its canonical item (exact wording, synonym or
+# closest known label), and the category comes from the item, so it does not depend
+# on the position of the row. Items the taxonomy does not know are left without a
+# category, which the validation report lists.
+def categorise_balance_sheet(df_balance_long):
+    # Reset index to make sure ordering is clean
+    df_balance_long = df_balance_long.reset_index(drop=True)
 
-# Check for duplicates in each dataset
-duplicate_balance = df_balance_long[df_balance_long.duplicated()]
-duplicate_income = df_income_long[df_income_long.duplicated()]
-duplicate_cashflow = df_cashflow_long[df_cashflow_long.duplicated()]
+    metrics = df_balance_long["Metric"].astype("category")
+    categories = dict(zip(metrics.cat.categories, taxonomy.get_mapper("balance_sheet").categories(metrics.cat.categories)))
+    df_balance_long["Category"] = df_balance_long["Metric"].map(categories)
+    return df_balance_long
 
-print(f"\n🔍 Duplicate rows in Balance Sheet: {duplicate_balance.shape[0]}")
-print(f"🔍 Duplicate rows in Income Statement: {duplicate_income.shape[0]}")
-print(f"🔍 Duplicate rows in Cash Flow Statement: {duplicate_cashflow.shape[0]}")
 
-# Categorise items in balance sheet
-# Reset index to make sure ordering is clean
-df_balance_long.reset_index(drop=True, inplace=True)
-
-# Create a list of unique metrics in order
-unique_metrics = df_balance_long["Metric"].drop_duplicates().reset_index(drop=True)
+# Categorise items in income statement
+# Ordered rules: the first category whose keywords (or regex patterns) match wins
+INCOME_CATEGORY_RULES = [
+    ("COGS", ["cost of revenue"]),
+    ("Revenue", ["revenue"]),
+    ("Gross Profit", ["gross profit"]),
+    ("Operating Expenses", ["selling", "general", "admin", "marketing", "depreciation", "operating expense"]),
+    ("Operating Income", ["operating income", "ebit"]),
+    ("Finance Costs", ["finance costs"]),
+    ("Finance Income", ["finance income"]),
+    ("Non-Operating Items", ["non operating", "unusual", "write off", "other income", "share of results of associates and joint ventures", "impairment"]),
+    ("Pretax Income", ["profit before tax"]),
+    ("Tax", ["tax"]),
+    ("Net Income", ["interest", "normalized income", "profit for the year", "owners of the company"]),
+    ("EPS & Shareholders", ["basic and diluted earnings per share (aed)"]),
+]
 
-# Build a manual mapping based on position
-manual_categories = {}
-manual_categories.update({metric: "Assets" for metric in unique_metrics[:13]})
-manual_categories.update({metric: "Liabilities" for metric in unique_metrics[13:22]})
-manual_categories.update({metric: "Equity" for metric in unique_metrics[22:29]})
 
-df_balance_long["Category"] = df_balance_long["Metric"].map(manual_categories)
+def _compile_rules(rules):
+    compiled = []
+    for category, keywords in rules:
+        patterns = [k.pattern if isinstance(k, re.Pattern) else re.escape(k) for k in keywords]
+        compiled.append((category, re.compile("|".join(patterns))))
+    return compiled
 
 
-#unique_balance_metrics = df_balance_long[df_balance_long["Category"] == "Liabilities"]["Metric"].unique()
-#print(unique_balance_metrics)
+_income_rules = _compile_rules(INCOME_CATEGORY_RULES)
+_income_rules_hash = hashlib.sha1(repr(INCOME_CATEGORY_RULES).encode()).hexdigest()
 
-#unique_balance_counts = df_balance_long.groupby("Category")["Metric"].nunique()
-#print(unique_balance_counts)
+# Metric name -> category, shared by every file cleaned in this process
+_income_category_memo = {}
 
 
-# Categorise items in income statement
 def income_macro_category(metric):
-    m = metric.lower()
-
-    if "cost of revenue" in m:
-        return "COGS"
-    elif "revenue" in m:
-        return "Revenue"
-    elif "gross profit" in m:
-        return "Gross Profit"
-    elif any(x in m for x in ["selling", "general", "admin", "marketing", "depreciation", "operating expense"]):
-        return "Operating Expenses"
-    elif "operating income" in m or "ebit" in m:
-        return "Operating Income"
-    elif "finance costs" in m:
-        return "Finance Costs"
-    elif "finance income" in m:
-        return "Finance Income"
-    elif any(x in m for x in ["non operating", "unusual", "write off", "other income", "share of results of associates and joint ventures", "impairment"]):
-        return "Non-Operating Items"
-    elif "profit before tax" in m:
-        return "Pretax Income"
-    elif "tax" in m:
-        return "Tax"
-    elif any(x in m for x in ["interest", "normalized income", "profit for the year", "owners of the company"]): 
-        return "Net Income"
-    elif "basic and diluted earnings per share (aed)" in m:
-        return "EPS & Shareholders"
+    category = _income_category_memo.get(metric)
+    if category is None:
+        m = metric.lower()
+        category = next((name for name, pattern in _income_rules if pattern.search(m)), "Other")
+        _income_category_memo[metric] = category
+    return category
+
+
+# Classify each unique metric once and broadcast the result through the categorical codes
+def categorise_income_statement(metrics):
+    metrics = metrics.astype("category")
+    labels = pd.Index([income_macro_category(metric) for metric in metrics.cat.categories])
+    categories = labels.unique().sort_values()
+    label_codes = categories.get_indexer(labels)
+
+    codes = metrics.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, label_codes[codes], -1)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+# Persist the memo between runs; entries are dropped when the rules change
+def load_category_cache(path):
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        cache = json.load(f)
+    if cache.get("rules") == _income_rules_hash:
+        _income_category_memo.update(cache["categories"])
+
+
+def save_category_cache(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"rules": _income_rules_hash, "categories": _income_category_memo}, f, indent=1, ensure_ascii=False)
+
+
+# Apply a string normalisation to a categorical column once per distinct value.
+# Names that become equal are merged; categories come out sorted, like astype("category").
+def normalise_categories(values, normalise):
+    values = values.astype("category").cat.remove_unused_categories()
+    labels = normalise(values.cat.categories)
+    categories = pd.Index(labels).unique().sort_values()
+    codes = values.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, categories.get_indexer(labels)[codes], -1)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+# Deep memory use of each long table, by column
+def memory_usage(frames):
+    return pd.DataFrame({statement: df_long.memory_usage(index=False, deep=True) for statement, df_long in frames.items()}).T
+
+
+def report_memory(frames, extra_bytes=0):
+    usage = memory_usage(frames)
+    print("\n💾 Memory use (MB):")
+    print((usage / 1024 ** 2).round(3).fillna("").to_string())
+    steady = usage.sum().sum() + extra_bytes
+    peak = peak_rss_kb()
+    print(f"Steady state: {steady / 1024 ** 2:.2f} MB" + (f", peak RSS: {peak / 1024:.1f} MB" if peak else ""))
+
+
+# Rename -> encode metrics -> blank-row drop -> melt -> parse values -> title-case -> categorise
+# Cells that cannot be parsed become NaN; pass a list as invalid_values to collect them.
+# Interim filings get a Quarter column (1-4) next to Year.
+# Convert wide format (Metric and the renamed period columns) to long format, without
+# blank lines and the income statement metrics that are removed
+def melt_statement(df, statement):
+    year_columns = [column for column in df.columns if column != "Metric"]
+    periods = [str(column).partition("Q") for column in year_columns]
+
+    # Metric is dictionary-encoded first, so the checks below look at each distinct name once
+    metrics = df["Metric"].astype("category")
+    names = metrics.cat.categories.astype(str).str.strip()
+
+    # Remove blank lines
+    keep = np.asarray(names != "")
+
+    # Remove rows where Metric matches those values (case-insensitive + stripped)
+    if statement == "income_statement":
+        keep &= ~names.str.lower().isin([m.lower() for m in metrics_to_remove])
+
+    codes = metrics.cat.codes.to_numpy()
+    rows = np.flatnonzero(codes >= 0)
+    rows = rows[keep[codes[rows]]]
+
+    # Same row order as DataFrame.melt: all metrics of the first year, then the next year
+    df_long = pd.DataFrame({
+        "Metric": pd.Categorical.from_codes(np.tile(codes[rows], len(year_columns)), categories=metrics.cat.categories),
+        "Year": np.repeat(np.array([int(year) for year, _, _ in periods], dtype=np.int16), len(rows)),
+        "Value": df[year_columns].iloc[rows].to_numpy(dtype=object).ravel(order="F"),
+    })
+    if any(quarter for _, _, quarter in periods):
+        quarters = np.array([int(quarter) for _, _, quarter in periods], dtype=np.int8)
+        df_long.insert(2, "Quarter", np.repeat(quarters, len(rows)))
+    return df_long
+
+
+def clean_statement(df, statement, invalid_values=None, quarterly=None):
+    df = rename_columns(df, quarterly)
+
+    with stage(f"melt {statement}") as timing:
+        df_long = melt_statement(df, statement)
+        timing.rows = len(df_long)
+
+    # Parse values to floats, drop "–" placeholders and keep unparseable cells aside for reporting
+    with stage(f"parse {statement}", rows=len(df_long)):
+        values, invalid, placeholder = parse_values(df_long["Value"])
+        if invalid_values is not None and invalid.any():
+            invalid_values.append(df_long[invalid].assign(Statement=statement))
+        df_long = df_long.assign(Value=values)[~placeholder]
+
+    with stage(f"categorise {statement}", rows=len(df_long)):
+        # Standardise and Capitalise Metric column
+        df_long["Metric"] = normalise_categories(df_long["Metric"], lambda names: names.str.lower().str.strip().str.title())
+
+        if statement == "balance_sheet":
+            df_long = categorise_balance_sheet(df_long)
+        elif statement == "income_statement":
+            df_long["Category"] = categorise_income_statement(df_long["Metric"])
+
+    if "Category" in df_long:
+        df_long["Category"] = df_long["Category"].astype("category")
+
+    return df_long.reset_index(drop=True)
+
+
+# Annual view of an interim long table: balance sheet items as at the fourth quarter,
+# income and cash flow items summed over the years with all four quarters. Tables
+# without a Quarter column are returned unchanged.
+def annual_statement(df_long, statement):
+    if "Quarter" not in df_long:
+        return df_long
+    columns = [column for column in df_long.columns if column != "Quarter"]
+    if statement == "balance_sheet":
+        return df_long.loc[df_long["Quarter"] == 4, columns].reset_index(drop=True)
+
+    keys = [column for column in ["Company", "Year"] if column in df_long]
+    complete = df_long.groupby(keys, observed=True)["Quarter"].transform("nunique") == 4
+    groups = [column for column in columns if column != "Value"]
+    df_annual = df_long[complete].groupby(groups, observed=True, sort=False, dropna=False)["Value"].sum(min_count=1)
+    return df_annual.reset_index()[columns]
+
+
+# Hash of this module and of the taxonomy, so cached outputs are rebuilt whenever
+# the cleaning rules change
+@functools.lru_cache(maxsize=None)
+def cleaning_rules_hash():
+    return make_key(file_hash(__file__), file_hash(taxonomy.__file__))
+
+
+# Clean the three statements of one company and key them by company name.
+# With a BuildCache, statements whose source file content is unchanged are not re-cleaned.
+# sources holds the file contents when they were already read (prefetched).
+def clean_company(company, paths, invalid_values=None, cache=None, quarterly=None, sources=None):
+    cleaned = {}
+    found = []
+    for statement in STATEMENTS:
+        def clean(path=paths[statement], statement=statement):
+            statement_invalid = []
+            with stage(f"read_csv {statement}") as timing:
+                df = pd.read_csv(io.BytesIO(sources[statement]) if sources else path)
+                timing.rows = len(df)
+            return clean_statement(df, statement, statement_invalid, quarterly), statement_invalid
+
+        if cache is None:
+            df_long, statement_invalid = clean()
+        else:
+            source_hash = bytes_hash(sources[statement]) if sources else file_hash(paths[statement])
+            key = make_key("clean", statement, source_hash, cleaning_rules_hash(), quarterly)
+            df_long, statement_invalid = cache.fetch(key, clean)
+        found.extend(statement_invalid)
+
+        df_long.insert(0, "Company", company)
+        cleaned[statement] = df_long
+    if invalid_values is not None:
+        invalid_values.extend(frame.assign(Company=company) for frame in found)
+    return cleaned
+
+
+# Find statement triples either in a directory of official_<company>_<statement>.csv
+# files or in a manifest CSV with a Company column and one path column per statement
+def discover_statements(source):
+    companies = {}
+
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            for statement in STATEMENTS:
+                suffix = f"_{statement}.csv"
+                if name.startswith("official_") and name.endswith(suffix):
+                    company = name[len("official_"):-len(suffix)]
+                    companies.setdefault(company, {})[statement] = os.path.join(source, name)
     else:
-        return "Other"
-
-df_income_long["Category"] = df_income_long["Metric"].apply(income_macro_category)
-
-unique_income_metrics = df_income_long[df_income_long["Category"] == "Non-Operating Items"]["Metric"].unique()
-print(unique_income_metrics)
-
-unique_income_counts = df_income_long.groupby("Category")["Metric"].nunique()
-print(unique_income_counts)
-
-# Convert variables format
-df_balance_long["Metric"] = df_balance_long["Metric"].astype("category")
-df_income_long["Metric"] = df_income_long["Metric"].astype("category")
-df_cashflow_long["Metric"] = df_cashflow_long["Metric"].astype("category")
-
-df_balance_long["Category"] = df_balance_long["Category"].astype("category")
-df_income_long["Category"] = df_income_long["Category"].astype("category")
-#df_cashflow_long["Category"] = df_cashflow_long["Category"].astype("category")
-
-df_balance_long["Year"] = df_balance_long["Year"].astype(int)
-df_income_long["Year"] = df_income_long["Year"].astype(int)
-df_cashflow_long["Year"] = df_cashflow_long["Year"].astype(int)
+        manifest = pd.read_csv(source)
+        base = os.path.dirname(os.path.abspath(source))
+        for row in manifest.itertuples(index=False):
+            row = row._asdict()
+            companies[row["Company"]] = {statement: os.path.join(base, row[statement]) for statement in STATEMENTS}
+
+    incomplete = [company for company, paths in companies.items() if len(paths) != len(STATEMENTS)]
+    if incomplete:
+        raise ValueError(f"Missing statements for: {', '.join(incomplete)}")
+
+    return companies
+
+
+def _clean_company_task(task):
+    company, paths, cache, quarterly, sources = task
+    invalid_values = []
+    with stage("clean_company", company=company):
+        cleaned = clean_company(company, paths, invalid_values=invalid_values, cache=cache, quarterly=quarterly, sources=sources)
+    return cleaned, invalid_values
+
+
+def _clean_company_run(tasks):
+    return [_clean_company_task(task) for task in tasks]
+
+
+# Cleaning tasks in company order. With io_threads, the statement files are read by
+# a thread pool ahead of the company being cleaned and handed over as bytes.
+def _company_tasks(companies, cache, quarterly, io_threads):
+    if not io_threads:
+        for company, paths in companies.items():
+            yield company, paths, cache, quarterly, None
+        return
+    files = prefetch_files([paths[statement] for paths in companies.values() for statement in STATEMENTS], io_threads)
+    for company, paths in companies.items():
+        sources = {statement: next(files)[1] for statement in STATEMENTS}
+        yield company, paths, cache, quarterly, sources
+
+
+# Clean every company in a directory/manifest across a process pool and return
+# one long table per statement, keyed by company. Files are read in I/O threads
+# while earlier companies are cleaned, and only a few runs of companies are in
+# flight at a time, so the contents waiting for a worker stay bounded.
+def clean_universe(source, processes=None, category_cache=None, invalid_values=None, cache=None, quarterly=None,
+                   io_threads=DEFAULT_IO_THREADS):
+    companies = discover_statements(source)
+    tasks = _company_tasks(companies, cache, quarterly, io_threads)
+
+    if category_cache:
+        load_category_cache(category_cache)
+
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(companies) < 2:
+        results = [_clean_company_task(task) for task in tasks]
+    else:
+        # Hand each worker a run of companies at a time to keep pickling overhead low
+        chunksize = max(1, min(16, len(companies) // (processes * 4)))
+        runs = iter(lambda: list(itertools.islice(tasks, chunksize)), [])
+        # Each worker loads the memo itself, as spawned workers do not inherit it
+        initializer = {"initializer": load_category_cache, "initargs": (category_cache,)} if category_cache else {}
+        with ProcessPoolExecutor(max_workers=processes, **initializer) as executor:
+            results = [result for run in bounded_map(executor, _clean_company_run, runs, processes * 2) for result in run]
+
+    universe = {}
+    for statement in STATEMENTS:
+        with stage(f"concat {statement}") as timing:
+            df_long = pd.concat([cleaned[statement] for cleaned, _ in results], ignore_index=True)
+            # Categories differ per company, so concat falls back to object dtype
+            for column in ["Company", "Metric", "Category"]:
+                if column in df_long:
+                    df_long[column] = df_long[column].astype("category")
+            timing.rows = len(df_long)
+        universe[statement] = df_long
+
+    if invalid_values is not None:
+        for _, found in results:
+            invalid_values.extend(found)
+
+    if category_cache:
+        income = universe["income_statement"][["Metric", "Category"]].drop_duplicates()
+        _income_category_memo.update(zip(income["Metric"].astype(str), income["Category"].astype(str)))
+        save_category_cache(category_cache)
+
+    if cache is not None:
+        cache.evict()
+
+    return universe
+
+
+# Streaming mode
+# Statements are read a block of rows at a time and every block goes through the
+# same steps as clean_statement, so memory depends on the chunk size, not the file size.
+# Cells are read as text so that every chunk has the same column types.
+def read_statement_chunks(path, chunksize=100_000):
+    with pd.read_csv(path, chunksize=chunksize, dtype=str) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def clean_statement_chunks(chunks, statement, invalid_values=None, quarterly=None):
+    for chunk in chunks:
+        df_long = clean_statement(chunk, statement, invalid_values, quarterly)
+        if len(df_long):
+            yield df_long
+
+
+# Appends cleaned chunks to one output file. Categories differ between chunks, so
+# categorical columns are written as plain strings.
+class ChunkWriter:
+    def __init__(self, path, fmt="csv"):
+        if fmt not in ("csv", "parquet"):
+            raise ValueError(f"Streaming supports csv and parquet output, not {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.rows = 0
+        self._writer = None
+
+    def write(self, df_long):
+        df_long = df_long.astype({c: object for c in df_long.columns if isinstance(df_long[c].dtype, pd.CategoricalDtype)})
+        if self.fmt == "csv":
+            df_long.to_csv(self.path, mode="w" if self.rows == 0 else "a", header=self.rows == 0, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._writer is None:
+                self.schema = pa.schema([
+                    (c, pa.string() if df_long[c].dtype == object or pd.api.types.is_string_dtype(df_long[c]) else pa.from_numpy_dtype(df_long[c].dtype))
+                    for c in df_long.columns
+                ])
+                self._writer = pq.ParquetWriter(self.path, self.schema)
+            self._writer.write_table(pa.Table.from_pandas(df_long, schema=self.schema, preserve_index=False))
+        self.rows += len(df_long)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+# Clean every company in a directory/manifest chunk by chunk and append the results
+# to the cleaned_<statement>_v2 files. Returns the number of rows written per statement.
+# With io_threads, the next chunk is read while the current one is cleaned, and
+# cleaned chunks are appended by a writer thread (at most two waiting).
+def stream_universe(source, output_dir=".", fmt="csv", chunksize=100_000, invalid_values=None, quarterly=None,
+                    io_threads=DEFAULT_IO_THREADS, category_cache=None):
+    companies = discover_statements(source)
+    os.makedirs(output_dir, exist_ok=True)
+    if category_cache:
+        load_category_cache(category_cache)
+
+    def append(writer, statement, df_long):
+        with stage(f"append {statement}", rows=len(df_long)):
+            writer.write(df_long)
+
+    written = {}
+    for statement in STATEMENTS:
+        writer = ChunkWriter(os.path.join(output_dir, f"cleaned_{statement}_v2.{fmt}"), fmt)
+        # On an error the queued writes still finish, but a failing write does not
+        # replace the error that stopped the cleaning
+        try:
+            with WriteQueue(threads=1, maxsize=2) if io_threads else contextlib.nullcontext() as writes:
+                for company, paths in companies.items():
+                    found = []
+                    with stage("stream_company", company=company):
+                        chunks = read_statement_chunks(paths[statement], chunksize)
+                        if io_threads:
+                            chunks = read_ahead(chunks)
+                        for df_long in clean_statement_chunks(chunks, statement, found, quarterly):
+                            df_long.insert(0, "Company", company)
+                            if writes is None:
+                                append(writer, statement, df_long)
+                            else:
+                                writes.put(append, writer, statement, df_long)
+                    if invalid_values is not None:
+                        invalid_values.extend(frame.assign(Company=company) for frame in found)
+        finally:
+            writer.close()
+        written[statement] = writer.rows
+
+    if category_cache:
+        save_category_cache(category_cache)
+    return written
+
+
+# Typed columnar output: one memory-mapped .npy file per column plus a small
+# schema.json sidecar. Categoricals are stored as codes with their categories in
+# the sidecar, so dtypes survive the round trip and nothing is re-parsed on load.
+def write_columnar(df_long, path):
+    os.makedirs(path, exist_ok=True)
+    columns = []
+    for name in df_long.columns:
+        column = df_long[name]
+        if isinstance(column.dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(column):
+            column = column.astype("category")
+            np.save(os.path.join(path, f"{name}.codes.npy"), column.cat.codes.to_numpy())
+            columns.append({"name": name, "dtype": "category", "file": f"{name}.codes.npy",
+                            "categories": column.cat.categories.astype(str).tolist()})
+        else:
+            np.save(os.path.join(path, f"{name}.npy"), column.to_numpy())
+            columns.append({"name": name, "dtype": str(column.dtype), "file": f"{name}.npy"})
+
+    with open(os.path.join(path, "schema.json"), "w", encoding="utf-8") as f:
+        json.dump({"rows": len(df_long), "columns": columns}, f, indent=1, ensure_ascii=False)
+
+
+# Open a columnar table without copying: numeric columns and the codes of categorical
+# columns stay memory-mapped. The codes were written by write_columnar with the
+# smallest dtype for their categories, so they are used as they are, without the
+# range check that would read every page of the file.
+def read_columnar(path):
+    with open(os.path.join(path, "schema.json"), encoding="utf-8") as f:
+        schema = json.load(f)
+
+    data = {}
+    for column in schema["columns"]:
+        values = np.load(os.path.join(path, column["file"]), mmap_mode="r")
+        if column["dtype"] == "category":
+            values = pd.Categorical.from_codes(values, categories=column["categories"], validate=False)
+        data[column["name"]] = values
+    return pd.DataFrame(data, copy=False)
 
 
 #Save cleaned data
-df_income_long.to_csv("cleaned_income_statement_v2.csv", index=False)
-df_balance_long.to_csv("cleaned_balance_sheet_v2.csv", index=False)
-df_cashflow_long.to_csv("cleaned_cash_flow_v2.csv", index=False)
+# fmt is "csv" (default), "npy" (memory-mapped columns + schema sidecar), "parquet" (needs pyarrow)
+# or "sqlite" (all statements in one indexed cleaned_v2.sqlite database).
+# With io_threads, the statements are written at the same time, one thread each.
+# The per-item aggregates the analysis reads are saved next to them.
+def save_cleaned(universe, output_dir=".", fmt="csv", io_threads=DEFAULT_IO_THREADS):
+    from Python_analysis import build_indexes, save_aggregates
+
+    os.makedirs(output_dir, exist_ok=True)
+    if fmt == "sqlite":
+        from Python_store import STORE_NAME, write_store
+
+        with stage("save sqlite", rows=sum(len(df_long) for df_long in universe.values())):
+            write_store(universe, os.path.join(output_dir, STORE_NAME))
+        save_aggregates(build_indexes(universe), output_dir)
+        return
+    if fmt not in ("csv", "npy", "parquet"):
+        raise ValueError(f"Unknown output format: {fmt}")
+
+    def save(statement, df_long):
+        path = os.path.join(output_dir, f"cleaned_{statement}_v2")
+        with stage(f"save {statement}", rows=len(df_long)):
+            if fmt == "csv":
+                df_long.to_csv(f"{path}.csv", index=False)
+            elif fmt == "npy":
+                write_columnar(df_long, path)
+            else:
+                df_long.to_parquet(f"{path}.parquet", index=False)
+
+    if not io_threads:
+        for statement, df_long in universe.items():
+            save(statement, df_long)
+    else:
+        with WriteQueue(threads=min(io_threads, len(universe))) as writes:
+            for statement, df_long in universe.items():
+                writes.put(save, statement, df_long)
+    save_aggregates(build_indexes(universe), output_dir)
+
+
+# Print the cells that could not be parsed as numbers
+def report_invalid_values(invalid_values):
+    if not invalid_values:
+        return
+    df_invalid = pd.concat(invalid_values, ignore_index=True)
+    df_invalid = df_invalid[[c for c in ["Company", "Statement", "Metric", "Year", "Quarter", "Value"] if c in df_invalid]]
+    print(f"\n⚠️ Unparseable values: {len(df_invalid)}")
+    print(df_invalid.head(20).to_string(index=False))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clean EMAAR-style financial statements.")
+    parser.add_argument("source", nargs="?", help="directory of official_<company>_<statement>.csv files or a manifest CSV")
+    parser.add_argument("output_dir", nargs="?", default=".")
+    parser.add_argument("--format", default="csv", choices=["csv", "npy", "parquet", "sqlite"], help="output format for the cleaned tables")
+    parser.add_argument("--cache", metavar="DIR", help="reuse cleaned statements whose source files are unchanged")
+    parser.add_argument("--stream", action="store_true", help="clean in chunks and append to the output (csv or parquet)")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="statement rows per chunk in streaming mode")
+    parser.add_argument("--quarterly", action="store_true", default=None,
+                        help="read every period column as a quarter (default: inferred from the headers)")
+    parser.add_argument("--annual", action="store_false", dest="quarterly", default=None,
+                        help="read every period column as a fiscal year, whatever month it ends in")
+    parser.add_argument("--category-cache", metavar="FILE",
+                        help="keep the income statement categories of every metric name in FILE between runs")
+    parser.add_argument("--io-threads", type=int, default=DEFAULT_IO_THREADS,
+                        help="threads reading and writing files alongside the cleaning (0: read and write in turn)")
+    parser.add_argument("--memory", action="store_true", help="print the memory used by the cleaned tables and the peak RSS")
+    parser.add_argument("--profile", metavar="FILE", help="record per-stage timings (.json: Chrome trace, otherwise JSON lines)")
+    args = parser.parse_args(argv)
+    if args.profile:
+        enable_profiling(args.profile)
+
+    if args.stream:
+        if not args.source:
+            parser.error("--stream needs a source directory or manifest")
+        if args.format not in ("csv", "parquet"):
+            parser.error(f"--stream writes csv or parquet, not {args.format}")
+        invalid_values = []
+        written = stream_universe(args.source, args.output_dir, args.format, args.chunksize, invalid_values, args.quarterly,
+                                  args.io_threads, args.category_cache)
+        report_invalid_values(invalid_values)
+        print(f"Streamed {sum(written.values())} rows into {args.output_dir}")
+        return
+
+    if args.source:
+        invalid_values = []
+        cache = BuildCache(args.cache) if args.cache else None
+        universe = clean_universe(args.source, category_cache=args.category_cache, invalid_values=invalid_values,
+                                  cache=cache, quarterly=args.quarterly, io_threads=args.io_threads)
+        report_invalid_values(invalid_values)
+        save_cleaned(universe, args.output_dir, args.format, args.io_threads)
+        print(f"Cleaned {universe['balance_sheet']['Company'].nunique()} companies into {args.output_dir}")
+        if args.memory:
+            report_memory(universe)
+        return
+
+    # Load the datasets
+    if args.category_cache:
+        load_category_cache(args.category_cache)
+    invalid_values = []
+    df_balance_long = clean_statement(pd.read_csv("official_emaar_balance_sheet.csv"), "balance_sheet", invalid_values, args.quarterly)
+    df_income_long = clean_statement(pd.read_csv("official_emaar_income_statement.csv"), "income_statement", invalid_values, args.quarterly)
+    df_cashflow_long = clean_statement(pd.read_csv("official_emaar_cash_flow.csv"), "cash_flow", invalid_values, args.quarterly)
+
+    # Check for duplicates in each dataset
+    duplicate_balance = df_balance_long[df_balance_long.duplicated()]
+    duplicate_income = df_income_long[df_income_long.duplicated()]
+    duplicate_cashflow = df_cashflow_long[df_cashflow_long.duplicated()]
+
+    print(f"\n🔍 Duplicate rows in Balance Sheet: {duplicate_balance.shape[0]}")
+    print(f"🔍 Duplicate rows in Income Statement: {duplicate_income.shape[0]}")
+    print(f"🔍 Duplicate rows in Cash Flow Statement: {duplicate_cashflow.shape[0]}")
+
+    unique_income_metrics = df_income_long[df_income_long["Category"] == "Non-Operating Items"]["Metric"].unique()
+    print(unique_income_metrics)
+
+    unique_income_counts = df_income_long.groupby("Category", observed=True)["Metric"].nunique()
+    print(unique_income_counts)
+
+    universe = {
+        "income_statement": df_income_long,
+        "balance_sheet": df_balance_long,
+        "cash_flow": df_cashflow_long,
+    }
+    report_invalid_values(invalid_values)
+    save_cleaned(universe, args.output_dir, args.format, args.io_threads)
+    if args.category_cache:
+        save_category_cache(args.category_cache)
+    if args.memory:
+        report_memory(universe)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#####################################################################
+##########  EMAAR Properties : Command line                 ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+# Single entry point for the pipeline:
+#
+#     python Python_cli.py clean  <source> [output_dir] [cleaning options]
+#     python Python_cli.py kpis   [cleaned_dir] [analysis options]
+#     python Python_cli.py charts [cleaned_dir] [analysis options]
+#     python Python_cli.py validate [cleaned_dir] [validation options]
+#     python Python_cli.py all    <source> [output_dir] [--format ...] [--charts-dir ...] [--validate]
+#
+# Only the standard library is imported up front. Each subcommand imports the
+# modules it needs, so "kpis" never loads matplotlib. Use "<command> --help" for
+# the options of each step.
+
+import argparse
+import sys
+
+COMMANDS = {
+    "clean": "clean statements (options of Python_cleaning_v2.py)",
+    "kpis": "print the KPI tables (options of Python_analysis.py)",
+    "charts": "draw the charts (options of Python_analysis.py)",
+    "validate": "check accounting identities and categories (options of Python_validation.py)",
+    "all": "clean, then print the KPI tables and save the charts",
+}
+
+
+def clean(argv):
+    from Python_cleaning_v2 import main
+
+    main(argv)
+
+
+def kpis(argv):
+    from Python_analysis import main
+
+    main(argv + ["--only", "kpis"])
+
+
+def charts(argv):
+    from Python_analysis import main
+
+    main(argv + ["--only", "charts"])
+
+
+def validate(argv):
+    from Python_validation import main
+
+    main(argv)
+
+
+def run_all(argv):
+    parser = argparse.ArgumentParser(prog="Python_cli.py all", description=COMMANDS["all"])
+    parser.add_argument("source", help="directory of official_<company>_<statement>.csv files or a manifest CSV")
+    parser.add_argument("output_dir", nargs="?", default=".")
+    parser.add_argument("--format", default="csv", choices=["csv", "npy", "parquet", "sqlite"])
+    parser.add_argument("--cache", metavar="DIR")
+    parser.add_argument("--category-cache", metavar="FILE")
+    parser.add_argument("--charts-dir", default=".")
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--profile", metavar="FILE")
+    parser.add_argument("--validate", action="store_true", help="check the cleaned statements before the analysis")
+    args = parser.parse_args(argv)
+
+    cache = ["--cache", args.cache] if args.cache else []
+    profile = ["--profile", args.profile] if args.profile else []
+    category_cache = ["--category-cache", args.category_cache] if args.category_cache else []
+    clean([args.source, args.output_dir, "--format", args.format, *cache, *category_cache, *profile])
+
+    if args.validate:
+        validate([args.output_dir])
+
+    # Profiling stays enabled for the analysis, so both steps land in the same file
+    from Python_analysis import main
+
+    processes = ["--processes", str(args.processes)] if args.processes else []
+    main([args.output_dir, "--headless", "--charts-dir", args.charts_dir, *cache, *processes])
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commands = {"clean": clean, "kpis": kpis, "charts": charts, "validate": validate, "all": run_all}
+    if argv and argv[0] in commands:
+        # Options are parsed by the step itself, so "<command> --help" shows them
+        commands[argv[0]](argv[1:])
+        return
+
+    parser = argparse.ArgumentParser(description="EMAAR financial statements pipeline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, help in COMMANDS.items():
+        subparsers.add_parser(name, help=help)
+    parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main()
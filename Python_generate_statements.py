@@ -0,0 +1,244 @@
+#####################################################################
+##########  EMAAR Properties : Synthetic statement generator ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import argparse
+import csv
+import os
+
+import numpy as np
+
+# Line items in the order and wording of the official statements
+ASSET_ITEMS = [
+    "Bank Balances And Cash",
+    "Trade And Unbilled Receivables",
+    "Other Assets, Receivables, Deposits And Prepayments",
+    "Development Properties",
+    "Assets Classified As Held For Sale",
+    "Loans To Associates And Joint Ventures",
+    "Investments In Associates And Joint Ventures",
+    "Other Financial Assets",
+    "Property, Plant And Equipment",
+    "Investment Properties",
+    "Intangible Assets",
+    "Deferred Tax Assets",
+]
+LIABILITY_ITEMS = [
+    "Trade And Other Payables",
+    "Advances From Customers",
+    "Retentions Payable",
+    "Liabilities Directly Associated With Assets Classified As Held For Sale",
+    "Interest-Bearing Loans And Borrowings",
+    "Sukuk",
+    "Lease Liabilities",
+    "Deferred Tax Liabilities",
+]
+
+# Items that companies often do not report in a given year ("–" in the files)
+OPTIONAL_ITEMS = {
+    "Assets Classified As Held For Sale",
+    "Liabilities Directly Associated With Assets Classified As Held For Sale",
+    "Loans To Associates And Joint Ventures",
+    "Deferred Tax Assets",
+    "Deferred Tax Liabilities",
+    "Lease Liabilities",
+    "Impairment of financial assets",
+    "Other income",
+}
+
+PLACEHOLDER = "–"
+
+
+def format_value(value):
+    if isinstance(value, str):
+        return value
+    return f"{value:,.0f}"
+
+
+# Optional items are reported as the en-dash placeholder (and count as zero) at rate `blank_rate`
+def _amounts(rng, names, size, scale, blank_rate):
+    amounts = {}
+    for name in names:
+        values = rng.uniform(0.02, 0.3, size) * scale
+        if name in OPTIONAL_ITEMS:
+            values[rng.random(size) < blank_rate] = 0.0
+        amounts[name] = values
+    return amounts
+
+
+def _reported(values):
+    return [PLACEHOLDER if v == 0 else v for v in values]
+
+
+def balance_sheet(rng, assets_scale, blank_rate):
+    size = len(assets_scale)
+    assets = _amounts(rng, ASSET_ITEMS, size, assets_scale, blank_rate)
+    liabilities = _amounts(rng, LIABILITY_ITEMS, size, assets_scale * 0.5, blank_rate)
+    total_assets = sum(assets.values())
+    total_liabilities = sum(liabilities.values())
+
+    # Equity absorbs the difference so that assets = liabilities + equity
+    share_capital = np.full(size, np.round(total_assets[-1] * 0.1, -3))
+    reserves = total_assets * rng.uniform(0.05, 0.1, size)
+    non_controlling = total_assets * rng.uniform(0.01, 0.05, size)
+    retained = total_assets - total_liabilities - share_capital - reserves - non_controlling
+    owners = share_capital + reserves + retained
+    total_equity = owners + non_controlling
+
+    rows = [(name, _reported(values)) for name, values in assets.items()]
+    rows.append(("Total Assets", total_assets))
+    rows += [(name, _reported(values)) for name, values in liabilities.items()]
+    rows.append(("Total Liabilities", total_liabilities))
+    rows += [
+        ("Share Capital", share_capital),
+        ("Reserves", reserves),
+        ("Retained Earnings", retained),
+        ("Equity Attributable To Owners Of The Company", owners),
+        ("Non-Controlling Interests", non_controlling),
+        ("Total Equity", total_equity),
+        ("Total Liabilities And Equity", total_liabilities + total_equity),
+    ]
+    return rows
+
+
+def income_statement(rng, revenue, blank_rate):
+    size = len(revenue)
+
+    def share(low, high, sign=1):
+        return sign * revenue * rng.uniform(low, high, size)
+
+    cost_of_revenue = share(0.35, 0.6, -1)
+    gross_profit = revenue + cost_of_revenue
+    operating = {
+        "Other operating income": share(0.01, 0.04),
+        "Other operating expenses": share(0.01, 0.05, -1),
+        "Selling, general and administrative expenses": share(0.05, 0.12, -1),
+        "Depreciation of property, plant and equipment": share(0.01, 0.03, -1),
+        "Depreciation of investment properties": share(0.01, 0.03, -1),
+    }
+    other = {
+        "Finance income": share(0.01, 0.05),
+        "Finance costs": share(0.01, 0.06, -1),
+        "Other income": share(0.0, 0.02),
+        "Share of results of associates and joint ventures": share(-0.01, 0.03),
+        "Impairment of financial assets": share(0.0, 0.01, -1),
+    }
+    for name in [name for name in other if name in OPTIONAL_ITEMS]:
+        other[name][rng.random(size) < blank_rate] = 0.0
+    profit_before_tax = gross_profit + sum(operating.values()) + sum(other.values())
+    tax = -np.maximum(profit_before_tax, 0) * rng.uniform(0.0, 0.09, size)
+    profit = profit_before_tax + tax
+    owners = profit * rng.uniform(0.75, 0.95, size)
+    shares = rng.uniform(5e6, 1e7)
+
+    rows = [("Revenue", revenue), ("Cost of revenue", cost_of_revenue), ("Gross profit", gross_profit)]
+    rows += list(operating.items())
+    rows += [(name, _reported(values)) for name, values in other.items()]
+    rows += [
+        ("Profit before tax", profit_before_tax),
+        ("Income tax expense", tax),
+        ("Profit for the year", profit),
+        ("ATTRIBUTABLE TO:", [""] * size),
+        ("Owners of the Company", owners),
+        ("Non-controlling interests", profit - owners),
+        ("Earnings per share attributable to the owners of the Company:", [""] * size),
+        ("Basic and diluted earnings per share (AED)", [f"{v:.2f}" for v in owners / shares]),
+    ]
+    return rows, dict(rows)
+
+
+def cash_flow(rng, income):
+    size = len(income["Revenue"])
+    profit_before_tax = income["Profit before tax"]
+    depreciation = -(income["Depreciation of property, plant and equipment"] + income["Depreciation of investment properties"])
+    working_capital = income["Revenue"] * rng.uniform(-0.15, 0.1, size)
+    operating = profit_before_tax + depreciation + working_capital
+    capex_ppe = -income["Revenue"] * rng.uniform(0.01, 0.05, size)
+    capex_investment = -income["Revenue"] * rng.uniform(0.02, 0.08, size)
+    investing = capex_ppe + capex_investment - income["Revenue"] * rng.uniform(-0.02, 0.05, size)
+    dividends = -np.maximum(income["Profit for the year"], 0) * rng.uniform(0.2, 0.5, size)
+    financing = dividends - income["Revenue"] * rng.uniform(-0.1, 0.1, size)
+
+    return [
+        ("Profit before tax", profit_before_tax),
+        ("Depreciation", depreciation),
+        ("Movements in working capital", working_capital),
+        ("Net cash flows from operating activities", operating),
+        ("Amounts incurred on property, plant and equipment", capex_ppe),
+        ("Amounts incurred on investment properties", capex_investment),
+        ("Net cash flows used in investing activities", investing),
+        ("Dividends paid", dividends),
+        ("Net cash flows used in financing activities", financing),
+        ("Net increase in cash and cash equivalents", operating + investing + financing),
+    ]
+
+
+# Same layout as official_emaar_*.csv: "Unnamed: 0" metric column, period-end
+# headers from the latest period back, comma-formatted values and a blank last row
+def write_statement(path, rows, headers):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Unnamed: 0"] + headers)
+        for name, values in rows:
+            writer.writerow([name] + [format_value(v) for v in values])
+        writer.writerow([""] * (len(headers) + 1))
+
+
+# "31/12/YYYY" for annual statements; quarter ends, latest first, for quarterly ones
+QUARTER_ENDS = ["31/03", "30/06", "30/09", "31/12"]
+
+
+def period_headers(years, quarterly=False):
+    if not quarterly:
+        return [f"31/12/{year}" for year in years]
+    return [f"{QUARTER_ENDS[quarter]}/{year}" for year in years for quarter in range(3, -1, -1)]
+
+
+# Statements of one company. Values are in AED thousands and follow a random
+# growth path, and every statement adds up (subtotals, A = L + E, profit flows
+# into the cash flow statement). Quarterly flows are a quarter of a year's.
+def generate_company(rng, output_dir, company, headers, blank_rate=0.1, periods_per_year=1):
+    growth = np.cumprod(rng.uniform(0.85, 1.25, len(headers)) ** (1 / periods_per_year))[::-1]
+    revenue = rng.uniform(2e6, 3e7) / periods_per_year * growth
+    assets_scale = revenue * periods_per_year * rng.uniform(1.5, 4.0)
+
+    income_rows, income = income_statement(rng, revenue, blank_rate)
+    statements = {
+        "balance_sheet": balance_sheet(rng, assets_scale, blank_rate),
+        "income_statement": income_rows,
+        "cash_flow": cash_flow(rng, income),
+    }
+    for statement, rows in statements.items():
+        write_statement(os.path.join(output_dir, f"official_{company}_{statement}.csv"), rows, headers)
+
+
+# N companies x M years of statements; the first company is "emaar"
+def generate(output_dir, companies=1, years=4, last_year=2024, seed=0, blank_rate=0.1, quarterly=False):
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    headers = period_headers(range(last_year, last_year - years, -1), quarterly)
+    names = ["emaar"] + [f"company{i:05d}" for i in range(1, companies)]
+    for company in names:
+        generate_company(rng, output_dir, company, headers, blank_rate, 4 if quarterly else 1)
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic statements in the official_<company>_<statement>.csv layout.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--companies", type=int, default=1)
+    parser.add_argument("--years", type=int, default=4)
+    parser.add_argument("--last-year", type=int, default=2024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--blank-rate", type=float, default=0.1, help="share of optional items reported as \"–\"")
+    parser.add_argument("--quarterly", action="store_true", help="write four quarterly columns per year")
+    args = parser.parse_args()
+
+    names = generate(args.output_dir, args.companies, args.years, args.last_year, args.seed, args.blank_rate, args.quarterly)
+    print(f"Wrote {len(names)} companies x {args.years} years{' of quarters' if args.quarterly else ''} to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#####################################################################
+##########  EMAAR Properties : Concurrent file I/O          ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import collections
+import itertools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from Python_profiling import stage
+
+# Reading and writing statement files mostly waits on storage, especially on network
+# mounts. That waiting is moved to threads, while parsing and cleaning stay in the
+# main process or the worker processes. Every queue is bounded, so a slow consumer
+# holds the producer back instead of letting data pile up in memory.
+DEFAULT_IO_THREADS = 8
+
+
+def read_bytes(path):
+    with stage("read_bytes"):
+        with open(path, "rb") as f:
+            return f.read()
+
+
+# (path, contents) of each file in order. A pool of threads reads up to `ahead`
+# files past the one being consumed (default: 4 per thread).
+def prefetch_files(paths, threads=DEFAULT_IO_THREADS, ahead=None):
+    paths = iter(paths)
+    pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="prefetch")
+    try:
+        pending = collections.deque((path, pool.submit(read_bytes, path))
+                                    for path in itertools.islice(paths, ahead or threads * 4))
+        while pending:
+            path, future = pending.popleft()
+            for upcoming in itertools.islice(paths, 1):
+                pending.append((upcoming, pool.submit(read_bytes, upcoming)))
+            yield path, future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# Items of an iterable produced by a background thread, at most `ahead` of them
+# before the one being consumed. Errors are raised in the consumer.
+def read_ahead(iterable, ahead=2):
+    items = queue.Queue(maxsize=ahead)
+    stopped = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put(("item", item))
+                if stopped.is_set():
+                    return
+            items.put(("done", None))
+        except BaseException as error:
+            items.put(("error", error))
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+    thread = threading.Thread(target=produce, name="read_ahead", daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, item = items.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise item
+            yield item
+    finally:
+        # A consumer that stops early must not leave the producer blocked on a full queue
+        stopped.set()
+        while thread.is_alive():
+            try:
+                items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+# Results of function over the items, in order, with at most `limit` submitted to the
+# executor and not yet consumed
+def bounded_map(executor, function, iterable, limit):
+    iterable = iter(iterable)
+    pending = collections.deque(executor.submit(function, item) for item in itertools.islice(iterable, limit))
+    while pending:
+        future = pending.popleft()
+        for item in itertools.islice(iterable, 1):
+            pending.append(executor.submit(function, item))
+        yield future.result()
+
+
+# Writes run by background threads through bounded queues. put() blocks while
+# `maxsize` writes wait in the queue it goes to, so output never piles up faster
+# than storage takes it. Writes with the same lane run in order on one thread
+# (e.g. chunks appended to one file). close() waits for every write and raises
+# the first error; after an error, the writes still queued are dropped.
+#
+#     with WriteQueue(threads=3) as writes:
+#         for statement, df_long in universe.items():
+#             writes.put(df_long.to_csv, f"cleaned_{statement}_v2.csv", index=False)
+class WriteQueue:
+    def __init__(self, threads=2, maxsize=4):
+        self.queues = [queue.Queue(maxsize=maxsize) for _ in range(threads)]
+        self.errors = []
+        self._lanes = {}
+        self._next = itertools.count()
+        self.threads = [threading.Thread(target=self._run, args=(tasks,), name="write", daemon=True) for tasks in self.queues]
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self, tasks):
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            function, args, kwargs = task
+            if self.errors:
+                continue
+            try:
+                function(*args, **kwargs)
+            except BaseException as error:
+                self.errors.append(error)
+
+    def put(self, function, *args, lane=None, **kwargs):
+        if self.errors:
+            raise self.errors[0]
+        if lane is None:
+            index = next(self._next) % len(self.queues)
+        else:
+            index = self._lanes.setdefault(lane, len(self._lanes) % len(self.queues))
+        self.queues[index].put((function, args, kwargs))
+
+    def close(self):
+        for tasks in self.queues:
+            tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            # Keep the original error; the writes already queued still finish
+            try:
+                self.close()
+            except BaseException:
+                pass
+        return False
@@ -0,0 +1,256 @@
+#####################################################################
+##########  EMAAR Properties : KPI registry & engine        ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import numpy as np
+import pandas as pd
+
+import Python_store as store
+import Python_taxonomy as taxonomy
+
+# Every KPI declares the KPIs (or statement lines) it is computed from. Line items
+# are read from the aggregates of their statement, by canonical item of the taxonomy
+# or by category.
+# Derived KPIs are functions of their inputs, each a company x year NumPy array
+# with NaN where data is missing.
+KPI_REGISTRY = {}
+
+
+def register(name, inputs=(), compute=None, statement=None, items=None, category=None, registry=KPI_REGISTRY):
+    registry[name] = {
+        "name": name,
+        "inputs": list(inputs),
+        "compute": compute,
+        "statement": statement,
+        "items": [items] if isinstance(items, str) else items,
+        "category": category,
+    }
+
+
+def kpi(name, *inputs, registry=KPI_REGISTRY):
+    def decorator(compute):
+        register(name, inputs, compute, registry=registry)
+        return compute
+    return decorator
+
+
+def line_item(name, statement, items=None, category=None, registry=KPI_REGISTRY):
+    register(name, statement=statement, items=items, category=category, registry=registry)
+
+
+# Line items
+line_item("revenue", "income_statement", category="Revenue")
+line_item("net_income", "income_statement", "profit_for_the_year")
+line_item("operating_expenses_reported", "income_statement", category="Operating Expenses")
+line_item("cost_of_revenue", "income_statement", "cost_of_revenue")
+line_item("finance_costs", "income_statement", "finance_costs")
+line_item("gross_profit_reported", "income_statement", "gross_profit")
+line_item("other_operating_income", "income_statement", "other_operating_income")
+line_item("other_operating_expenses", "income_statement", "other_operating_expenses")
+line_item("sga", "income_statement", "sga")
+line_item("depreciation_ppe", "income_statement", "depreciation_ppe")
+line_item("depreciation_investment_properties", "income_statement", "depreciation_investment_properties")
+line_item("total_assets", "balance_sheet", "total_assets")
+line_item("total_equity", "balance_sheet", "total_equity")
+line_item("debt", "balance_sheet", ["borrowings", "sukuk"])
+line_item("current_assets", "balance_sheet", taxonomy.CURRENT_ASSETS)
+line_item("current_liabilities", "balance_sheet", taxonomy.CURRENT_LIABILITIES)
+line_item("operating_cash_flow", "cash_flow", "operating_cash_flow")
+line_item("capex", "cash_flow", ["capex_ppe", "capex_investment_properties"])
+
+
+# Is Emaar profitable?
+@kpi("gross_profit", "revenue", "cost_of_revenue")
+def _gross_profit(revenue, cost_of_revenue):
+    return revenue + cost_of_revenue
+
+
+@kpi("gross_margin", "gross_profit", "revenue")
+def _gross_margin(gross_profit, revenue):
+    return gross_profit / revenue * 100
+
+
+# Total Operating Expenses (should be negative)
+@kpi("operating_expenses", "sga", "other_operating_expenses", "depreciation_ppe", "depreciation_investment_properties")
+def _operating_expenses(sga, other, dep_ppe, dep_inv):
+    return sga + other + dep_ppe + dep_inv
+
+
+@kpi("operating_profit", "gross_profit", "operating_expenses")
+def _operating_profit(gross_profit, operating_expenses):
+    return gross_profit + operating_expenses
+
+
+@kpi("operating_margin", "operating_profit", "revenue")
+def _operating_margin(operating_profit, revenue):
+    return operating_profit / revenue * 100
+
+
+@kpi("net_margin", "net_income", "revenue")
+def _net_margin(net_income, revenue):
+    return net_income / revenue * 100
+
+
+# EBITDA considering negative values of op_exp, sga, dep_ppe, dep_inv
+@kpi("ebitda", "gross_profit_reported", "other_operating_income", "other_operating_expenses", "sga",
+     "depreciation_ppe", "depreciation_investment_properties")
+def _ebitda(gross_profit, op_income, op_expenses, sga, dep_ppe, dep_inv):
+    return gross_profit + op_income + op_expenses + sga + dep_ppe + dep_inv
+
+
+@kpi("ebitda_margin", "ebitda", "revenue")
+def _ebitda_margin(ebitda, revenue):
+    return ebitda / revenue * 100
+
+
+# Is Emaar overleveraged?
+@kpi("roa", "net_income", "total_assets")
+def _roa(net_income, total_assets):
+    return net_income / total_assets * 100
+
+
+@kpi("roe", "net_income", "total_equity")
+def _roe(net_income, total_equity):
+    return net_income / total_equity * 100
+
+
+@kpi("debt_to_equity", "debt", "total_equity")
+def _debt_to_equity(debt, total_equity):
+    return debt / total_equity
+
+
+@kpi("current_ratio", "current_assets", "current_liabilities")
+def _current_ratio(current_assets, current_liabilities):
+    return current_assets / current_liabilities
+
+
+# How efficient is Emaar?
+@kpi("interest_expense", "finance_costs")
+def _interest_expense(finance_costs):
+    return np.abs(finance_costs)
+
+
+@kpi("asset_turnover", "revenue", "total_assets")
+def _asset_turnover(revenue, total_assets):
+    return revenue / total_assets
+
+
+@kpi("interest_coverage", "operating_profit", "interest_expense")
+def _interest_coverage(operating_profit, interest_expense):
+    return operating_profit / interest_expense
+
+
+# Does Emaar generate enough cash?
+@kpi("free_cash_flow", "operating_cash_flow", "capex")
+def _free_cash_flow(operating_cash_flow, capex):
+    return operating_cash_flow + capex
+
+
+# Lazily evaluates KPIs over a company x year grid shared by all statements.
+# Only the requested KPIs and their inputs are computed, each at most once.
+# companies optionally restricts the grid, e.g. to the one company of a report.
+class KPIEngine:
+    def __init__(self, indexes, registry=None, companies=None):
+        self.indexes = indexes
+        self.registry = KPI_REGISTRY if registry is None else registry
+        if companies is None:
+            companies = sorted(set().union(*[index.companies for index in indexes.values()]))
+        self.companies = pd.Index(companies)
+        self.years = pd.Index(sorted(set().union(*[index.years for index in indexes.values()])), name="Year")
+
+    # Inputs first, each KPI once; raises on unknown names and cycles
+    def plan(self, names):
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name not in self.registry:
+                raise KeyError(f"Unknown KPI: {name}")
+            if name in visiting:
+                raise ValueError(f"Circular KPI definition: {name}")
+            visiting.add(name)
+            for dependency in self.registry[name]["inputs"]:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in names:
+            visit(name)
+        return order
+
+    def _line_item(self, spec, companies):
+        index = self.indexes[spec["statement"]]
+        # Positions of the requested companies in this statement, -1 where it has none
+        positions = index.companies.get_indexer(companies)
+        rows = np.maximum(positions, 0)
+        if spec["category"] is not None:
+            totals = index.category_total(spec["category"], rows)
+        else:
+            totals = index.total(index.item_columns(spec["items"]), rows)
+        totals[positions < 0] = np.nan
+
+        # Place the statement's years on the shared year axis
+        grid = np.full((len(companies), len(self.years)), np.nan)
+        grid[:, self.years.get_indexer(index.years)] = totals
+        return grid
+
+    # Dict of KPI name -> company x year array for the requested KPIs
+    def compute(self, names, companies=None):
+        companies = self.companies if companies is None else pd.Index(companies)
+        values = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for name in self.plan(names):
+                spec = self.registry[name]
+                if spec["compute"] is None:
+                    values[name] = self._line_item(spec, companies)
+                else:
+                    values[name] = spec["compute"](*[values[dependency] for dependency in spec["inputs"]])
+        return {name: values[name] for name in names}
+
+    # Long table with Company, Year and one column per KPI; all-missing rows dropped
+    def frame(self, names, companies=None):
+        companies = self.companies if companies is None else pd.Index(companies)
+        values = self.compute(names, companies)
+        index = pd.MultiIndex.from_product([companies, self.years], names=["Company", self.years.name])
+        df_kpis = pd.DataFrame({name: values[name].ravel() for name in names}, index=index)
+        return df_kpis.dropna(how="all").reset_index()
+
+
+# Same KPIs computed against the SQLite store: every line item is a grouped SUM over
+# only the rows of the requested companies, years and matching line items, e.g.
+# StoreKPIEngine("cleaned_v2.sqlite", years=[2024]).frame(["roe"])
+class StoreKPIEngine(KPIEngine):
+    def __init__(self, path, companies=None, years=None, registry=None):
+        self.conn = store.connect(path)
+        self.registry = KPI_REGISTRY if registry is None else registry
+        self.companies = pd.Index(companies if companies else store.list_companies(self.conn))
+        self.years = pd.Index(sorted(years if years else store.list_years(self.conn)), name="Year")
+        self._vocabulary = {}
+
+    # Line items of the statement that map to the spec's canonical items, resolved
+    # once against the distinct names of the statement
+    def _metrics(self, spec):
+        statement = spec["statement"]
+        if statement not in self._vocabulary:
+            self._vocabulary[statement] = store.list_metrics(self.conn, statement)
+        vocabulary = self._vocabulary[statement]
+        items = taxonomy.get_mapper(statement).map([metric.strip() for metric in vocabulary])
+        return [metric for metric, item in zip(vocabulary, items) if item in spec["items"]]
+
+    def _line_item(self, spec, companies):
+        grid = np.full((len(companies), len(self.years)), np.nan)
+        if spec["category"] is not None:
+            totals = store.sum_by_company_year(self.conn, spec["statement"], categories=[spec["category"]],
+                                               companies=list(companies), years=list(self.years))
+        else:
+            metrics = self._metrics(spec)
+            if not metrics:
+                return grid
+            totals = store.sum_by_company_year(self.conn, spec["statement"], metrics=metrics,
+                                               companies=list(companies), years=list(self.years))
+        grid[companies.get_indexer(totals["company"]), self.years.get_indexer(totals["year"])] = totals["value"].to_numpy()
+        return grid
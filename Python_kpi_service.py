@@ -0,0 +1,149 @@
+#####################################################################
+##########  EMAAR Properties : Local KPI service             ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import argparse
+import functools
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from Python_analysis import DEFAULT_COMPANY, cagr_summary, cleaned_files_signature, compute_kpi_tables, load_indexes
+
+# URL name -> table returned by compute_kpi_tables
+TABLES = {
+    "summary": "df_summary",
+    "changes": "df_changes",
+    "ratios": "df_ratios",
+    "efficiency": "df_efficiency",
+    "fcf": "df_fcf",
+}
+
+
+class QueryError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Cleaned data loaded once and KPI answers kept in LRU caches. Before each request
+# the cleaned files are stat'ed; if any of them changed, the data is reloaded and
+# the caches start empty.
+class KPIService:
+    def __init__(self, input_dir=".", maxsize=1024):
+        self.input_dir = input_dir
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.signature = None
+        self.refresh()
+
+    def refresh(self):
+        signature = cleaned_files_signature(self.input_dir)
+        if signature == self.signature:
+            return
+        with self.lock:
+            if signature == self.signature:
+                return
+            indexes = load_indexes(self.input_dir)
+            self.companies = list(indexes["income_statement"].companies)
+            self.tables = functools.lru_cache(self.maxsize)(functools.partial(compute_kpi_tables, indexes))
+            self.responses = functools.lru_cache(self.maxsize)(self._response)
+            self.signature = signature
+
+    def _response(self, table, company, start, end):
+        if company not in self.companies:
+            raise QueryError(404, f"Unknown company: {company}")
+        tables = self.tables(company)
+
+        if table == "cagr":
+            df_summary = tables["df_summary"].loc[start:end]
+            if len(df_summary) < 2:
+                raise QueryError(404, "CAGR needs at least two years")
+            start_year, end_year, cagr_revenue, cagr_net_income = cagr_summary(df_summary)
+            body = json.dumps({"company": company, "table": table, "start_year": int(start_year), "end_year": int(end_year),
+                               "revenue": float(cagr_revenue), "net_income": float(cagr_net_income)})
+        else:
+            if table not in TABLES:
+                raise QueryError(404, f"Unknown table: {table}")
+            df_table = tables[TABLES[table]].loc[start:end]
+            rows = df_table.reset_index().to_json(orient="records")
+            body = f'{{"company": {json.dumps(company)}, "table": {json.dumps(table)}, "rows": {rows}}}'
+        return body.encode("utf-8")
+
+    # JSON bytes for /kpis/<table>?company=...&from=...&to=...
+    def query(self, table, company=None, start=None, end=None):
+        self.refresh()
+        if company is None:
+            company = DEFAULT_COMPANY if DEFAULT_COMPANY in self.companies else self.companies[0]
+        return self.responses(table, company, start, end)
+
+
+class KPIRequestHandler(BaseHTTPRequestHandler):
+    service = None
+    verbose = False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split("/") if part]
+        try:
+            if parts == ["health"]:
+                body = b'{"status": "ok"}'
+            elif parts == ["companies"]:
+                self.service.refresh()
+                body = json.dumps(self.service.companies).encode("utf-8")
+            elif len(parts) == 2 and parts[0] == "kpis":
+                try:
+                    start = int(params["from"]) if "from" in params else None
+                    end = int(params["to"]) if "to" in params else None
+                except ValueError:
+                    raise QueryError(400, "from and to must be years")
+                body = self.service.query(parts[1], params.get("company"), start, end)
+            else:
+                raise QueryError(404, "Use /kpis/<summary|changes|ratios|efficiency|fcf|cagr>, /companies or /health")
+        except QueryError as error:
+            self._send(error.status, json.dumps({"error": str(error)}).encode("utf-8"))
+            return
+        self._send(200, body)
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+def serve(input_dir=".", host="127.0.0.1", port=8765, maxsize=1024, verbose=False):
+    handler = type("Handler", (KPIRequestHandler,), {"service": KPIService(input_dir, maxsize), "verbose": verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving KPIs from {os.path.abspath(input_dir)} on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve KPI tables of the cleaned statements over HTTP on localhost.")
+    parser.add_argument("input_dir", nargs="?", default=".")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=1024, help="answers kept in memory")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+    serve(args.input_dir, args.host, args.port, args.cache_size, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#####################################################################
+##########  EMAAR Properties : Peer panel analytics         ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from Python_analysis import load_indexes
+from Python_kpi_engine import KPI_REGISTRY, KPIEngine
+
+# Growth and peer ranks for every company at once. Every function takes a
+# company x year array (as returned by KPIEngine.compute) and the years of its
+# columns, and works on whole arrays. Years may have gaps: values are first placed
+# on a calendar year axis, so a change is only computed between the years it names
+# and never across a missing year.
+
+
+# Columns of a company x year array placed on every calendar year from the first to
+# the last, NaN for years without data
+def contiguous(values, years):
+    years = np.asarray(years, dtype=int)
+    calendar = np.arange(years.min(), years.max() + 1)
+    grid = np.full((values.shape[0], len(calendar)), np.nan)
+    grid[:, years - calendar[0]] = values
+    return grid, calendar
+
+
+# Change in % against the previous calendar year, NaN where either year is missing
+# or the previous value is zero
+def panel_yoy(values, years):
+    grid, calendar = contiguous(values, years)
+    changes = np.full(grid.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        changes[:, 1:] = (grid[:, 1:] - grid[:, :-1]) / grid[:, :-1] * 100
+    changes[~np.isfinite(changes)] = np.nan
+    return changes[:, np.asarray(years, dtype=int) - calendar[0]]
+
+
+# Compound annual growth in % between two values `periods` years apart. Only defined
+# for a positive start and a non-negative end.
+def _cagr(start, end, periods):
+    defined = (start > 0) & (end >= 0) & (periods > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cagr = ((end / start) ** (1 / periods) - 1) * 100
+    return np.where(defined, cagr, np.nan)
+
+
+# CAGR over the `window` years ending in each year (e.g. 3 -> 2021 to 2024 for 2024)
+def rolling_cagr(values, years, window=3):
+    grid, calendar = contiguous(values, years)
+    cagr = np.full(grid.shape, np.nan)
+    if window < len(calendar):
+        cagr[:, window:] = _cagr(grid[:, :-window], grid[:, window:], window)
+    return cagr[:, np.asarray(years, dtype=int) - calendar[0]]
+
+
+# CAGR per company from `start` to `end` (default: all years). With first_last, each
+# company is measured from its first to its last reported year inside the window,
+# so a company that started reporting late still gets a rate over the years it has.
+def panel_cagr(values, years, start=None, end=None, first_last=False):
+    grid, calendar = contiguous(values, years)
+    start = calendar[0] if start is None else start
+    end = calendar[-1] if end is None else end
+    inside = (calendar >= start) & (calendar <= end)
+    grid, calendar = grid[:, inside], calendar[inside]
+    if not len(calendar):
+        return np.full(grid.shape[0], np.nan)
+
+    if not first_last:
+        if calendar[0] != start or calendar[-1] != end:
+            return np.full(grid.shape[0], np.nan)
+        return _cagr(grid[:, 0], grid[:, -1], end - start)
+
+    reported = ~np.isnan(grid)
+    first = reported.argmax(axis=1)
+    last = len(calendar) - 1 - reported[:, ::-1].argmax(axis=1)
+    rows = np.arange(len(grid))
+    periods = np.where(reported.any(axis=1), calendar[last] - calendar[first], 0)
+    return _cagr(grid[rows, first], grid[rows, last], periods)
+
+
+# Percentile rank (0-100] of each company among the companies reporting the same
+# year, within its peer group when groups (one label per company) are given. Ties
+# share the average rank; missing values are not ranked.
+def peer_percentiles(values, groups=None):
+    df_values = pd.DataFrame(values)
+    if groups is None:
+        ranks = df_values.rank(pct=True)
+    else:
+        ranks = df_values.groupby(np.asarray(groups)).rank(pct=True)
+    return ranks.to_numpy() * 100
+
+
+# Long table of every company, year and KPI with its value, YoY change, rolling
+# CAGR and peer percentile, computed in one pass over the engine's arrays
+def panel_frame(engine, names, window=3, groups=None):
+    values = engine.compute(names)
+    years = engine.years.to_numpy()
+    if groups is not None:
+        groups = pd.Series(groups).reindex(engine.companies).fillna("Other").to_numpy()
+
+    frames = []
+    index = pd.MultiIndex.from_product([engine.companies, engine.years], names=["Company", "Year"])
+    for name in names:
+        frames.append(pd.DataFrame({
+            "KPI": name,
+            "Value": values[name].ravel(),
+            "YoY (%)": panel_yoy(values[name], years).ravel(),
+            f"CAGR {window}y (%)": rolling_cagr(values[name], years, window).ravel(),
+            "Percentile": peer_percentiles(values[name], groups).ravel(),
+        }, index=index))
+    df_panel = pd.concat(frames).dropna(subset=["Value"]).reset_index()
+    if groups is not None:
+        df_panel.insert(1, "Group", groups[engine.companies.get_indexer(df_panel["Company"])])
+    return df_panel
+
+
+# Companies of one year ranked on a KPI, best first
+def league_table(df_panel, kpi, year, top=None, ascending=False):
+    df_league = df_panel[(df_panel["KPI"] == kpi) & (df_panel["Year"] == year)]
+    df_league = df_league.sort_values("Value", ascending=ascending).reset_index(drop=True)
+    df_league.index = df_league.index + 1
+    return df_league if top is None else df_league.head(top)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YoY, CAGR and peer percentiles of KPIs for every company.")
+    parser.add_argument("input_dir", nargs="?", default=".")
+    parser.add_argument("--kpis", default="revenue,net_income,net_margin,roe,debt_to_equity",
+                        help="comma-separated KPI names from Python_kpi_engine")
+    parser.add_argument("--window", type=int, default=3, help="years of the rolling CAGR")
+    parser.add_argument("--groups", metavar="FILE", help="CSV with Company and Group columns defining peer groups")
+    parser.add_argument("--year", type=int, help="year of the league tables (default: latest)")
+    parser.add_argument("--top", type=int, default=10, help="companies per league table")
+    parser.add_argument("--output", metavar="FILE", help="write the full panel to a CSV file")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.kpis.split(",") if name.strip()]
+    unknown = [name for name in names if name not in KPI_REGISTRY]
+    if unknown:
+        parser.error(f"unknown KPIs: {', '.join(unknown)}")
+
+    groups = None
+    if args.groups:
+        df_groups = pd.read_csv(args.groups, dtype=str)
+        groups = df_groups.set_index("Company")["Group"]
+
+    engine = KPIEngine(load_indexes(args.input_dir))
+    df_panel = panel_frame(engine, names, args.window, groups)
+    year = args.year if args.year is not None else int(engine.years.max())
+    for name in names:
+        print(f"\n🏆 {name} ({year}):")
+        print(league_table(df_panel, name, year, args.top).drop(columns=["KPI", "Year"]).round(2).to_string())
+    if args.output:
+        df_panel.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#####################################################################
+##########  EMAAR Properties : Power BI export              ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import argparse
+import datetime
+import glob
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from Python_analysis import DEFAULT_COMPANY, build_indexes, factorize_names, load_cleaned
+from Python_kpi_engine import KPI_REGISTRY, KPIEngine
+import Python_taxonomy as taxonomy
+
+# Star schema for the dashboard. Facts only hold integer keys, the year and the value;
+# names live once in the dimension tables:
+#
+#     dim_company (company_id, Company)
+#     dim_category (category_id, Statement, Category)
+#     dim_metric (metric_id, Statement, Metric, Item, category_id)
+#     dim_kpi (kpi_id, KPI, Statement)
+#     fact_statement (company_id, metric_id, Year[, Quarter], Value, batch)
+#     fact_kpi (company_id, kpi_id, Year, Value)
+#     export_batches (batch, Exported, Statement Rows, KPI Rows)
+#
+# Ids never change once given. fact_statement is append-only: each export appends
+# only the statement facts that are new or changed, as a row holding the difference
+# from the values already exported. Summing the rows of a key gives its current value,
+# so statement measures must aggregate Value with SUM. KPIs are ratios and margins,
+# which cannot be summed, so fact_kpi is rewritten with one row per key holding the
+# current value whenever any KPI changes.
+DIMENSIONS = {
+    "dim_company": ("company_id", ["Company"]),
+    "dim_category": ("category_id", ["Statement", "Category"]),
+    "dim_metric": ("metric_id", ["Statement", "Metric", "category_id"]),
+    "dim_kpi": ("kpi_id", ["KPI"]),
+}
+
+# Facts within this relative difference of the exported value count as unchanged
+CHANGE_RTOL = 1e-9
+
+# Name columns are read back as text, so a company or metric named with digits
+# matches its exported member instead of being added again
+NAME_COLUMNS = {"Company": str, "Statement": str, "Category": str, "Metric": str, "Item": str, "KPI": str}
+
+
+# A table of the export, or None before the first export. Parquet facts are a folder
+# with one file per batch (Power BI "Folder" source); everything else is one file.
+def read_table(output_dir, name, fmt="csv"):
+    path = os.path.join(output_dir, name)
+    if fmt == "csv":
+        return pd.read_csv(f"{path}.csv", dtype=NAME_COLUMNS) if os.path.exists(f"{path}.csv") else None
+    if os.path.isdir(path):
+        return pd.read_parquet(path)
+    return pd.read_parquet(f"{path}.parquet") if os.path.exists(f"{path}.parquet") else None
+
+
+def write_table(df, output_dir, name, fmt="csv"):
+    path = os.path.join(output_dir, name)
+    if fmt == "csv":
+        df.to_csv(f"{path}.csv", index=False)
+    else:
+        df.to_parquet(f"{path}.parquet", index=False)
+
+
+def append_table(df, output_dir, name, batch, fmt="csv"):
+    path = os.path.join(output_dir, name)
+    if fmt == "csv":
+        df.to_csv(f"{path}.csv", mode="a", header=not os.path.exists(f"{path}.csv"), index=False)
+    else:
+        os.makedirs(path, exist_ok=True)
+        df.to_parquet(os.path.join(path, f"batch_{batch:05d}.parquet"), index=False)
+
+
+# Ids of members (a frame of the dimension's key columns), adding the members not
+# exported before after the existing ones. Returns the ids and the updated dimension.
+def dimension_ids(df_dim, members, id_column, columns):
+    members = members[columns].reset_index(drop=True)
+    if df_dim is None:
+        df_dim = pd.DataFrame({id_column: pd.Series(dtype=np.int32), **{c: members[c].iloc[:0] for c in columns}})
+
+    key = lambda df: list(df[columns].astype(object).fillna("").itertuples(index=False, name=None))
+    known = dict(zip(key(df_dim), df_dim[id_column]))
+    new = members[[k not in known for k in key(members)]].drop_duplicates()
+    if len(new):
+        new = new.assign(**{id_column: np.arange(len(new), dtype=np.int32) + (int(df_dim[id_column].max()) + 1 if len(df_dim) else 1)})
+        df_dim = pd.concat([df_dim, new[[id_column, *columns]]], ignore_index=True)
+        known = dict(zip(key(df_dim), df_dim[id_column]))
+    return np.array([known[k] for k in key(members)], dtype=np.int32), df_dim
+
+
+# Statement facts of the cleaned long tables. Names are resolved once per distinct
+# (metric, category) pair and the rows only gather ids.
+def statement_facts(frames, dims):
+    facts = []
+    for statement, df_long in frames.items():
+        df_long = df_long[df_long["Value"].notna()]
+        company = df_long["Company"] if "Company" in df_long else pd.Series(DEFAULT_COMPANY, index=df_long.index)
+        company_codes, companies = factorize_names(company)
+        company_ids, dims["dim_company"] = dimension_ids(
+            dims["dim_company"], pd.DataFrame({"Company": companies}), *DIMENSIONS["dim_company"])
+
+        metric_codes, metrics = factorize_names(df_long["Metric"])
+        if "Category" in df_long:
+            category_codes, categories = factorize_names(df_long["Category"])
+        else:
+            category_codes, categories = np.full(len(df_long), -1), pd.Index([], dtype=object)
+        # Rows without a category have code -1, which picks the None appended last
+        categories = np.append(np.asarray(categories, dtype=object), None)
+        pair_codes, pairs = pd.factorize(metric_codes * len(categories) + category_codes + 1)
+        pair_metrics = metrics[pairs // len(categories)]
+        pair_categories = pd.Series(categories[pairs % len(categories) - 1], dtype=object)
+
+        category_ids = pd.Series(pd.NA, index=range(len(pairs)), dtype="Int32")
+        present = pair_categories.notna().to_numpy()
+        if present.any():
+            ids, dims["dim_category"] = dimension_ids(
+                dims["dim_category"], pd.DataFrame({"Statement": statement, "Category": pair_categories[present]}),
+                *DIMENSIONS["dim_category"])
+            category_ids[present] = ids
+
+        members = pd.DataFrame({"Statement": statement, "Metric": pair_metrics, "category_id": category_ids})
+        metric_ids, dims["dim_metric"] = dimension_ids(dims["dim_metric"], members, *DIMENSIONS["dim_metric"])
+
+        df_facts = pd.DataFrame({
+            "company_id": company_ids[company_codes],
+            "metric_id": metric_ids[pair_codes],
+            "Year": df_long["Year"].to_numpy(dtype=np.int16),
+        })
+        if "Quarter" in df_long:
+            df_facts["Quarter"] = df_long["Quarter"].to_numpy(dtype=np.int8)
+        df_facts["Value"] = df_long["Value"].to_numpy(dtype=float)
+        facts.append(df_facts)
+
+    # Canonical items of the metrics, for dashboards that compare issuers
+    df_metric = dims["dim_metric"]
+    df_metric["Item"] = pd.Series(None, index=df_metric.index, dtype=object)
+    for statement in df_metric["Statement"].unique():
+        rows = df_metric["Statement"] == statement
+        if statement in taxonomy.TAXONOMY:
+            df_metric.loc[rows, "Item"] = taxonomy.get_mapper(statement).map(df_metric.loc[rows, "Metric"])
+    dims["dim_metric"] = df_metric[["metric_id", "Statement", "Metric", "Item", "category_id"]]
+    return pd.concat(facts, ignore_index=True)
+
+
+# KPI facts for every company and year, from the same engine as the KPI tables
+def kpi_facts(frames, dims, names=None):
+    names = list(KPI_REGISTRY) if names is None else names
+    engine = KPIEngine(build_indexes(frames))
+    df_kpis = engine.frame(names).melt(id_vars=["Company", "Year"], var_name="KPI", value_name="Value")
+    df_kpis = df_kpis[np.isfinite(df_kpis["Value"].to_numpy(dtype=float))]
+
+    company_ids, dims["dim_company"] = dimension_ids(
+        dims["dim_company"], pd.DataFrame({"Company": engine.companies}), *DIMENSIONS["dim_company"])
+    kpi_ids, dims["dim_kpi"] = dimension_ids(dims["dim_kpi"], pd.DataFrame({"KPI": names}), *DIMENSIONS["dim_kpi"])
+    dims["dim_kpi"]["Statement"] = dims["dim_kpi"]["KPI"].map(lambda name: KPI_REGISTRY.get(name, {}).get("statement"))
+
+    return pd.DataFrame({
+        "company_id": company_ids[engine.companies.get_indexer(df_kpis["Company"])],
+        "kpi_id": kpi_ids[pd.Index(names).get_indexer(df_kpis["KPI"])],
+        "Year": df_kpis["Year"].to_numpy(dtype=np.int16),
+        "Value": df_kpis["Value"].to_numpy(dtype=float),
+    })
+
+
+# Rows to append so that the exported rows of every key sum to the new facts: new
+# keys with their value, changed keys with the difference and keys no longer
+# reported with the reversal of what was exported
+def fact_changes(df_exported, df_facts, keys):
+    target = df_facts.groupby(keys, sort=False)["Value"].sum()
+    if df_exported is None or not len(df_exported):
+        return target.reset_index()
+    if set(keys) != set(df_exported.columns) - {"Value", "batch"}:
+        raise ValueError(f"Exported facts have columns {list(df_exported.columns)}, expected {keys}; "
+                         "export to a new folder or pass --rebuild")
+    exported = df_exported.groupby(keys, sort=False)["Value"].sum()
+
+    index = target.index.union(exported.index)
+    new = ~index.isin(exported.index)
+    target, exported = target.reindex(index, fill_value=0.0), exported.reindex(index, fill_value=0.0)
+    changed = new | ~np.isclose(target.to_numpy(), exported.to_numpy(), rtol=CHANGE_RTOL, atol=0)
+    return (target - exported)[changed].rename("Value").reset_index()
+
+
+# Export the cleaned statements and their KPIs into output_dir, appending to an
+# earlier export there. Returns the batch number and the facts added or changed per
+# fact table.
+def export_star(frames, output_dir, fmt="csv", kpis=None):
+    os.makedirs(output_dir, exist_ok=True)
+    dims = {name: read_table(output_dir, name, fmt) for name in ["dim_company", "dim_category", "dim_metric", "dim_kpi"]}
+    if dims["dim_metric"] is not None:
+        dims["dim_metric"]["category_id"] = dims["dim_metric"]["category_id"].astype("Int32")
+    df_batches = read_table(output_dir, "export_batches", fmt)
+    batch = int(df_batches["batch"].max()) + 1 if df_batches is not None and len(df_batches) else 1
+
+    df_statement = statement_facts(frames, dims)
+    keys = [column for column in df_statement.columns if column != "Value"]
+    df_changes = fact_changes(read_table(output_dir, "fact_statement", fmt), df_statement, keys).assign(batch=batch)
+
+    # KPIs are compared with the exported values only to count the changes
+    df_kpi = kpi_facts(frames, dims, kpis)
+    df_exported_kpi = read_table(output_dir, "fact_kpi", fmt)
+    changed_kpis = len(fact_changes(df_exported_kpi, df_kpi, ["company_id", "kpi_id", "Year"]))
+
+    appended = {"fact_statement": len(df_changes), "fact_kpi": changed_kpis}
+    if not len(df_changes) and not changed_kpis:
+        return None, appended
+
+    # Dimensions first, so facts never point at ids that are not written yet
+    for name, df_dim in dims.items():
+        write_table(df_dim, output_dir, name, fmt)
+    if len(df_changes):
+        append_table(df_changes, output_dir, "fact_statement", batch, fmt)
+    if changed_kpis:
+        write_table(df_kpi, output_dir, "fact_kpi", fmt)
+    exported = pd.DataFrame({"batch": [batch], "Exported": [datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")],
+                             "Statement Rows": [appended["fact_statement"]], "KPI Rows": [appended["fact_kpi"]]})
+    write_table(exported if df_batches is None else pd.concat([df_batches, exported], ignore_index=True), output_dir, "export_batches", fmt)
+    return batch, appended
+
+
+# Remove the tables of an earlier export
+def remove_export(output_dir):
+    for pattern in ["dim_*", "fact_*", "export_batches.*"]:
+        for path in glob.glob(os.path.join(output_dir, pattern)):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the cleaned statements and KPIs as a star schema for Power BI.")
+    parser.add_argument("input_dir", nargs="?", default=".")
+    parser.add_argument("output_dir", nargs="?", default="powerbi")
+    parser.add_argument("--format", default="csv", choices=["csv", "parquet"])
+    parser.add_argument("--kpis", help="comma-separated KPI names (default: every KPI of Python_kpi_engine)")
+    parser.add_argument("--rebuild", action="store_true", help="drop the earlier export and write everything again")
+    args = parser.parse_args()
+
+    names = None
+    if args.kpis:
+        names = [name.strip() for name in args.kpis.split(",") if name.strip()]
+        unknown = [name for name in names if name not in KPI_REGISTRY]
+        if unknown:
+            parser.error(f"unknown KPIs: {', '.join(unknown)}")
+
+    if args.rebuild:
+        remove_export(args.output_dir)
+    batch, appended = export_star(load_cleaned(args.input_dir), args.output_dir, args.format, names)
+    if batch is None:
+        print("No new or changed facts")
+        return
+    print(f"📦 Batch {batch}: {appended['fact_statement']} statement facts appended, {appended['fact_kpi']} KPI facts changed in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
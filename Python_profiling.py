@@ -0,0 +1,185 @@
+#####################################################################
+##########  EMAAR Properties : Stage instrumentation        ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Profiling is switched on by pointing this variable at an output file, so worker
+# processes (forked or spawned) record into the same file as the parent.
+# "*.json" files are written as a Chrome trace (chrome://tracing, Perfetto),
+# anything else as one JSON object per line.
+PROFILE_ENV = "EMAAR_PROFILE"
+
+_path = os.environ.get(PROFILE_ENV) or None
+_companies = threading.local()
+
+
+def enable(path):
+    global _path
+    _path = path
+    os.environ[PROFILE_ENV] = path
+    with open(path, "w", encoding="utf-8") as f:
+        if _is_trace(path):
+            # The trace format allows the closing bracket to be left out, which
+            # lets every process append its own events
+            f.write("[\n")
+
+
+def disable():
+    global _path
+    _path = None
+    os.environ.pop(PROFILE_ENV, None)
+
+
+def _is_trace(path):
+    return path.endswith(".json")
+
+
+# Peak resident set size of this process so far, in KB
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class _NullStage:
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, name, company, rows):
+        self.name = name
+        self.company = company
+        self.rows = rows
+
+    def __enter__(self):
+        stack = getattr(_companies, "stack", None)
+        if stack is None:
+            stack = _companies.stack = []
+        # Nested stages are attributed to the company of the enclosing stage
+        if self.company is None and stack:
+            self.company = stack[-1]
+        stack.append(self.company)
+        self.start = time.time()
+        self.wall = time.perf_counter()
+        # Stages also run in I/O threads, so cpu_s is the CPU time of the stage's own
+        # thread; process_cpu_s includes every thread of the process
+        self.cpu = time.thread_time()
+        self.process_cpu = time.process_time()
+        self.peak_rss = peak_rss_kb()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        process_cpu = time.process_time() - self.process_cpu
+        # ru_maxrss only covers the whole process, so a stage gets how much it raised
+        # the process peak; other threads running at the same time count too
+        peak_rss = peak_rss_kb()
+        self.peak_rss_growth = None if peak_rss is None else peak_rss - self.peak_rss
+        self.process_peak_rss = peak_rss
+        _companies.stack.pop()
+        _write(self, wall, cpu, process_cpu)
+        return False
+
+
+def _write(record, wall, cpu, process_cpu):
+    event = {
+        "stage": record.name,
+        "company": None if record.company is None else str(record.company),
+        "rows": None if record.rows is None else int(record.rows),
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "process_cpu_s": process_cpu,
+        "process_peak_rss_kb": record.process_peak_rss,
+        "peak_rss_growth_kb": record.peak_rss_growth,
+    }
+    if _is_trace(_path):
+        line = json.dumps({
+            "name": record.name,
+            "cat": "pipeline",
+            "ph": "X",
+            "ts": record.start * 1e6,
+            "dur": wall * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": event,
+        }) + ",\n"
+    else:
+        line = json.dumps({"ts": record.start, "pid": os.getpid(), **event}) + "\n"
+
+    # One append per event, so lines from concurrent processes do not interleave
+    with open(_path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+# Time a pipeline stage: wall time, thread and process CPU time, how much it raised the
+# process peak RSS and (if set on the returned object) a row count. Does nothing unless profiling is enabled.
+#
+#     with stage("melt") as s:
+#         df_long = df.melt(...)
+#         s.rows = len(df_long)
+def stage(name, company=None, rows=None):
+    if _path is None:
+        return _NULL_STAGE
+    return _Stage(name, company, rows)
+
+
+# Events of a JSON lines or Chrome trace file as one table
+def read_profile(path):
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if _is_trace(path):
+        events = [event["args"] | {"pid": event["pid"]} for event in json.loads("[" + text.strip().lstrip("[").rstrip(",]") + "]")]
+    else:
+        events = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return pd.DataFrame(events)
+
+
+def summarise(df_profile):
+    return (df_profile.groupby("stage")
+            .agg(calls=("wall_s", "size"), wall_s=("wall_s", "sum"), cpu_s=("cpu_s", "sum"),
+                 process_cpu_s=("process_cpu_s", "sum"), rows=("rows", "sum"),
+                 peak_rss_growth_kb=("peak_rss_growth_kb", "max"), process_peak_rss_kb=("process_peak_rss_kb", "max"))
+            .sort_values("wall_s", ascending=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise a profile written with --profile.")
+    parser.add_argument("path")
+    parser.add_argument("--by-company", action="store_true", help="break the totals down per company")
+    args = parser.parse_args()
+
+    df_profile = read_profile(args.path)
+    print(summarise(df_profile).round(4).to_string())
+    if args.by_company:
+        by_company = df_profile.pivot_table(index="company", columns="stage", values="wall_s", aggfunc="sum")
+        print("\n" + by_company.round(4).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#####################################################################
+##########  EMAAR Properties : Scenario analysis            ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from Python_analysis import compute_kpi_tables, load_indexes
+
+# Shocks are relative changes against the base year (0.1 = +10%). Cost of revenue
+# moves with revenue, and its shock is a change per unit of revenue. Operating
+# expenses, finance costs and capex only move when shocked.
+SHOCKS = ["revenue_growth", "cost_of_revenue", "operating_expenses", "finance_costs", "capex"]
+
+METRICS = ["Gross Margin (%)", "Operating Margin (%)", "Net Margin (%)", "EBITDA", "EBITDA Margin (%)",
+           "Interest Coverage", "Debt to Equity", "Free Cash Flow"]
+
+# Thresholds counted per scenario. Interest coverage uses the lower end of the
+# regional benchmark (2.0-3.0).
+BREACHES = {
+    "Net Margin < 0": ("Net Margin (%)", np.less, 0.0),
+    "Interest Coverage < 2": ("Interest Coverage", np.less, 2.0),
+    "Debt to Equity > 1": ("Debt to Equity", np.greater, 1.0),
+    "Free Cash Flow < 0": ("Free Cash Flow", np.less, 0.0),
+}
+
+# Scenarios per batch are chosen so that one metric array holds about this many
+# values (16 MB), whatever the number of issuers
+BATCH_VALUES = 2 ** 21
+HISTOGRAM_BINS = 512
+
+
+# Base year inputs of one company from its KPI tables: the latest year with a
+# summary, ratios and free cash flow (None when there is none)
+def base_inputs(tables, year=None):
+    df_summary, df_ratios, df_fcf = tables["df_summary"], tables["df_ratios"], tables["df_fcf"]
+    years = df_summary.index.intersection(df_ratios.index).intersection(df_fcf.index)
+    if year is None and len(years):
+        year = years.max()
+    if year not in years:
+        return None
+
+    summary, ratios, fcf = df_summary.loc[year], df_ratios.loc[year], df_fcf.loc[year]
+    return pd.Series({
+        "Year": year,
+        "Revenue": summary["Revenue"],
+        "Cost of Revenue": summary["Cost of Revenue"],
+        "Operating Expenses": summary["Operating Expenses"],
+        # Part of EBITDA that is neither gross profit nor operating expenses
+        "Other Operating Income": summary["EBITDA"] - summary["Gross Profit"] - summary["Operating Expenses"],
+        "Finance Costs": summary["Finance Costs"],
+        "Net Income": summary["Net Income"],
+        "Debt": ratios["Debt"],
+        "Equity": ratios["Shareholders' Equity"],
+        "Operating Cash Flow": fcf["Operating Cash Flow"],
+        "CapEx": fcf["CapEx"],
+    })
+
+
+# One row of base inputs per company
+def base_table(indexes, companies=None, year=None):
+    companies = indexes["income_statement"].companies if companies is None else companies
+    rows = {}
+    for company in companies:
+        base = base_inputs(compute_kpi_tables(indexes, company), year)
+        if base is not None:
+            rows[company] = base
+    df_base = pd.DataFrame(rows).T
+    df_base.index.name = "Company"
+    return df_base.astype(float).astype({"Year": int})
+
+
+# Metrics of every company under every scenario of a batch. base holds one column
+# per input (companies x 1), shocks is a scenarios x SHOCKS array; every metric
+# comes back as a companies x scenarios array.
+def evaluate(base, shocks):
+    growth, cost, opex, finance, capex = (shocks[:, [i]].T for i in range(len(SHOCKS)))
+    revenue = base["Revenue"] * (1 + growth)
+    gross_profit = revenue + base["Cost of Revenue"] * (1 + growth) * (1 + cost)
+    operating_expenses = base["Operating Expenses"] * (1 + opex)
+    operating_profit = gross_profit + operating_expenses
+    finance_costs = base["Finance Costs"] * (1 + finance)
+    ebitda = gross_profit + base["Other Operating Income"] + operating_expenses
+
+    # The change in profit goes to net income, retained earnings and operating cash
+    # flow in full (before tax)
+    base_operating_profit = base["Revenue"] + base["Cost of Revenue"] + base["Operating Expenses"]
+    change = operating_profit - base_operating_profit + finance_costs - base["Finance Costs"]
+    net_income = base["Net Income"] + change
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "Gross Margin (%)": gross_profit / revenue * 100,
+            "Operating Margin (%)": operating_profit / revenue * 100,
+            "Net Margin (%)": net_income / revenue * 100,
+            "EBITDA": ebitda,
+            "EBITDA Margin (%)": ebitda / revenue * 100,
+            "Interest Coverage": operating_profit / np.abs(finance_costs),
+            "Debt to Equity": base["Debt"] / (base["Equity"] + change),
+            "Free Cash Flow": base["Operating Cash Flow"] + change + base["CapEx"] * (1 + capex),
+        }
+
+
+# Normally distributed shocks, {shock: (mean, sd)}; shocks not given stay at 0.
+# Each batch has its own generator seeded from (seed, batch number), so a run gives
+# the same scenarios however its batches are split across processes.
+class ScenarioDraws:
+    def __init__(self, distributions, scenarios, seed=0):
+        self.means = np.array([distributions.get(shock, (0.0, 0.0))[0] for shock in SHOCKS])
+        self.sds = np.array([distributions.get(shock, (0.0, 0.0))[1] for shock in SHOCKS])
+        self.scenarios = scenarios
+        self.seed = seed
+
+    def __len__(self):
+        return self.scenarios
+
+    def batch(self, number, size):
+        count = min(size, self.scenarios - number * size)
+        rng = np.random.default_rng([self.seed, number])
+        # A cost cannot fall by more than 100%
+        return np.maximum(rng.normal(self.means, self.sds, (count, len(SHOCKS))), -1.0)
+
+
+# Every combination of the given values, {shock: values}; shocks not given stay at 0.
+# Batches are decoded from their positions in the grid, which is never built whole.
+class ScenarioGrid:
+    def __init__(self, axes):
+        self.axes = [np.asarray(axes.get(shock, [0.0]), dtype=float) for shock in SHOCKS]
+        self.shape = tuple(len(axis) for axis in self.axes)
+
+    def __len__(self):
+        return int(np.prod(self.shape))
+
+    def batch(self, number, size):
+        positions = np.unravel_index(np.arange(number * size, min((number + 1) * size, len(self))), self.shape)
+        return np.column_stack([axis[position] for axis, position in zip(self.axes, positions)])
+
+
+# Running statistics of every metric per company: count, sum, min, max, threshold
+# breaches and a histogram for the percentiles. Memory does not depend on the
+# number of scenarios. Histogram bins span the 0.5th to 99.5th percentile of a first
+# batch, padded by half of that range on each side, so a long tail (coverage when
+# finance costs nearly vanish) does not flatten the bins. Values beyond fall in the
+# end bins: percentiles are exact to one bin inside the range. Statistics skip
+# undefined values (e.g. a margin at zero revenue).
+class ScenarioStats:
+    def __init__(self, low, width):
+        self.low, self.width = low, width
+        metrics, companies = low.shape
+        self.count = np.zeros((metrics, companies), dtype=np.int64)
+        self.total = np.zeros((metrics, companies))
+        self.minimum = np.full((metrics, companies), np.inf)
+        self.maximum = np.full((metrics, companies), -np.inf)
+        self.histogram = np.zeros((metrics, companies, HISTOGRAM_BINS), dtype=np.int64)
+        self.breaches = np.zeros((len(BREACHES), companies), dtype=np.int64)
+
+    @classmethod
+    def from_sample(cls, values):
+        sample = np.stack([values[metric] for metric in METRICS])
+        # Sorted with undefined values last, then read at the 0.5th and 99.5th percentiles
+        sample = np.sort(np.where(np.isfinite(sample), sample, np.nan), axis=2)
+        last = np.maximum(np.isfinite(sample).sum(axis=2, keepdims=True) - 1, 0)
+        lowest = np.nan_to_num(np.take_along_axis(sample, (last * 0.005).astype(int), axis=2)[..., 0])
+        highest = np.nan_to_num(np.take_along_axis(sample, (last * 0.995).astype(int), axis=2)[..., 0])
+        spread = np.maximum(highest - lowest, np.maximum(np.abs(lowest), 1.0) * 1e-6)
+        low = lowest - spread / 2
+        return cls(low, spread * 2 / HISTOGRAM_BINS)
+
+    def update(self, values):
+        companies = self.count.shape[1]
+        for m, metric in enumerate(METRICS):
+            value = values[metric]
+            defined = np.isfinite(value)
+            self.count[m] += defined.sum(axis=1)
+            self.total[m] += np.where(defined, value, 0).sum(axis=1)
+            self.minimum[m] = np.minimum(self.minimum[m], np.where(defined, value, np.inf).min(axis=1))
+            self.maximum[m] = np.maximum(self.maximum[m], np.where(defined, value, -np.inf).max(axis=1))
+
+            position = (np.where(defined, value, 0) - self.low[m][:, None]) / self.width[m][:, None]
+            bins = np.clip(position, 0, HISTOGRAM_BINS - 1).astype(np.int64)
+            bins += np.arange(companies)[:, None] * HISTOGRAM_BINS
+            self.histogram[m] += np.bincount(bins[defined], minlength=companies * HISTOGRAM_BINS).reshape(companies, -1)
+
+        with np.errstate(invalid="ignore"):
+            for b, (metric, compare, threshold) in enumerate(BREACHES.values()):
+                self.breaches[b] += compare(values[metric], threshold).sum(axis=1)
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        self.histogram += other.histogram
+        self.breaches += other.breaches
+        return self
+
+    # Metric x company array of the q-th percentile, taken at the bin centre
+    def percentile(self, q):
+        cumulative = self.histogram.cumsum(axis=2)
+        bins = (cumulative < self.count[..., None] * q / 100).sum(axis=2)
+        value = self.low + (np.minimum(bins, HISTOGRAM_BINS - 1) + 0.5) * self.width
+        return np.where(self.count > 0, np.clip(value, self.minimum, self.maximum), np.nan)
+
+
+def _base_arrays(df_base):
+    return {column: df_base[column].to_numpy(dtype=float)[:, None] for column in df_base.columns}
+
+
+# Run the batches of one shard (a list of batch numbers)
+def _run_shard(task):
+    df_base, scenarios, stats, numbers, batch_size = task
+    base = _base_arrays(df_base)
+    for number in numbers:
+        stats.update(evaluate(base, scenarios.batch(number, batch_size)))
+    return stats
+
+
+# Evaluate every scenario for every company in batches of batch_size scenarios
+# (default: about BATCH_VALUES values per array). With processes > 1, the batches
+# are split into one contiguous shard per process. Returns a summary per company
+# and metric (base value, mean, 5th/50th/95th percentiles, min and max) and the
+# share of scenarios breaching each threshold, in %.
+def run_scenarios(df_base, scenarios, batch_size=None, processes=1):
+    batch_size = batch_size or max(1, BATCH_VALUES // max(len(df_base), 1))
+    batches = -(-len(scenarios) // batch_size)
+    base = _base_arrays(df_base)
+    stats = ScenarioStats.from_sample(evaluate(base, scenarios.batch(0, batch_size)))
+
+    if processes == 1 or batches < 2:
+        stats = _run_shard((df_base, scenarios, stats, range(batches), batch_size))
+    else:
+        empty = ScenarioStats(stats.low, stats.width)
+        tasks = [(df_base, scenarios, empty, shard, batch_size)
+                 for shard in np.array_split(np.arange(batches), processes) if len(shard)]
+        with ProcessPoolExecutor(processes) as pool:
+            for shard_stats in pool.map(_run_shard, tasks):
+                stats.merge(shard_stats)
+
+    unshocked = evaluate(base, np.zeros((1, len(SHOCKS))))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        columns = {
+            "Base": np.stack([unshocked[metric][:, 0] for metric in METRICS]),
+            "Mean": np.where(stats.count > 0, stats.total / stats.count, np.nan),
+            "P5": stats.percentile(5),
+            "P50": stats.percentile(50),
+            "P95": stats.percentile(95),
+            "Min": np.where(stats.count > 0, stats.minimum, np.nan),
+            "Max": np.where(stats.count > 0, stats.maximum, np.nan),
+        }
+    index = pd.MultiIndex.from_product([METRICS, df_base.index], names=["Metric", "Company"])
+    df_scenarios = pd.DataFrame({name: values.ravel() for name, values in columns.items()}, index=index)
+    df_scenarios = df_scenarios.swaplevel().sort_index(level="Company", sort_remaining=False)
+
+    df_breaches = pd.DataFrame(stats.breaches.T / len(scenarios) * 100, index=df_base.index, columns=list(BREACHES))
+    return df_scenarios, df_breaches
+
+
+# "mean,sd" -> normal draws, "low:high:steps" -> grid values, "value" -> fixed
+def parse_shock(spec):
+    if ":" in spec:
+        low, high, steps = spec.split(":")
+        return "grid", np.linspace(float(low), float(high), int(steps))
+    if "," in spec:
+        mean, sd = spec.split(",")
+        return "draws", (float(mean), float(sd))
+    return "fixed", float(spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress margins, coverage, leverage and free cash flow under shocks.")
+    parser.add_argument("input_dir", nargs="?", default=".")
+    defaults = {"revenue_growth": "0,0.1", "cost_of_revenue": "0,0.05", "operating_expenses": "0,0.05",
+                "finance_costs": "0,0.2", "capex": "0,0.15"}
+    for shock, default in defaults.items():
+        parser.add_argument(f"--{shock.replace('_', '-')}", metavar="SPEC",
+                            help=f"mean,sd for normal draws, low:high:steps for a grid or a fixed value "
+                                 f"(default {default} when drawing, 0 on a grid)")
+    parser.add_argument("--scenarios", type=int, default=1_000_000, help="number of draws (ignored for a grid)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--year", type=int, help="base year (default: latest per company)")
+    parser.add_argument("--company", action="append", help="limit the run to a company (repeatable)")
+    parser.add_argument("--batch-size", type=int, help="scenarios evaluated at once")
+    parser.add_argument("--processes", type=int, default=1, help="split the batches across processes")
+    parser.add_argument("--output", metavar="FILE", help="write the summary per company and metric to a CSV file")
+    args = parser.parse_args()
+
+    shocks = {shock: parse_shock(getattr(args, shock)) for shock in SHOCKS if getattr(args, shock) is not None}
+    kinds = {kind for kind, _ in shocks.values()}
+    if {"grid", "draws"} <= kinds:
+        parser.error("use either grids (low:high:steps) or draws (mean,sd), not both")
+    # Shocks left out stay at 0 on a grid and take their default spread when drawing
+    for shock in SHOCKS:
+        if shock not in shocks:
+            shocks[shock] = ("fixed", 0.0) if "grid" in kinds else parse_shock(defaults[shock])
+    if "grid" in kinds:
+        scenarios = ScenarioGrid({shock: np.atleast_1d(value) for shock, (_, value) in shocks.items()})
+    else:
+        scenarios = ScenarioDraws({shock: value if kind == "draws" else (value, 0.0)
+                                   for shock, (kind, value) in shocks.items()}, args.scenarios, args.seed)
+
+    df_base = base_table(load_indexes(args.input_dir), args.company, args.year)
+    if not len(df_base):
+        parser.error("no company has a summary, ratios and free cash flow for the same year")
+    df_scenarios, df_breaches = run_scenarios(df_base, scenarios, args.batch_size, args.processes)
+
+    print(f"🎲 {len(scenarios):,} scenarios x {len(df_base)} companies")
+    for company in df_base.index:
+        print(f"\n📊 {company} ({df_base.loc[company, 'Year']} base):")
+        print(df_scenarios.loc[company].round(2).to_string())
+    print("\n⚠️ Scenarios breaching each threshold (%):")
+    print(df_breaches.round(2).to_string())
+    if args.output:
+        df_scenarios.reset_index().to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#####################################################################
+##########  EMAAR Properties : Embedded statement store     ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import argparse
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+# All cleaned statements in one SQLite table, indexed so that queries by company,
+# statement, line item and year only read the rows they need
+STORE_NAME = "cleaned_v2.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS statement_values (
+    company TEXT NOT NULL,
+    statement TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    value REAL,
+    category TEXT
+);
+CREATE INDEX IF NOT EXISTS statement_values_key ON statement_values (company, statement, metric, year);
+CREATE INDEX IF NOT EXISTS statement_values_metric ON statement_values (statement, metric, year);
+CREATE INDEX IF NOT EXISTS statement_values_category ON statement_values (statement, category, year);
+"""
+
+
+def connect(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _placeholders(values):
+    return ", ".join("?" * len(values))
+
+
+# Write the cleaned long tables. Rows of the companies being written are replaced,
+# other companies already in the store are kept.
+def write_store(universe, path, default_company="emaar"):
+    quarterly = [statement for statement, df_long in universe.items() if "Quarter" in df_long]
+    if quarterly:
+        raise ValueError(f"The statement store holds annual statements; {', '.join(quarterly)} "
+                         "are quarterly (save them as csv, npy or parquet)")
+    with connect(path) as conn:
+        for statement, df_long in universe.items():
+            if "Company" in df_long:
+                company = df_long["Company"].astype(str)
+            else:
+                company = pd.Series(default_company, index=df_long.index)
+            companies = list(company.unique())
+            conn.execute(f"DELETE FROM statement_values WHERE statement = ? AND company IN ({_placeholders(companies)})",
+                         [statement, *companies])
+
+            values = df_long["Value"].to_numpy(dtype=float)
+            category = df_long["Category"].astype(object) if "Category" in df_long else pd.Series(None, index=df_long.index)
+            rows = zip(
+                company,
+                [statement] * len(df_long),
+                df_long["Metric"].astype(str),
+                df_long["Year"].astype(int).tolist(),
+                np.where(np.isnan(values), None, values).tolist(),
+                category.where(category.notna(), None),
+            )
+            conn.executemany("INSERT INTO statement_values VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.close()
+
+
+def _where(statement, companies=None, years=None, metrics=None, categories=None):
+    clauses, params = ["statement = ?"], [statement]
+    if companies is not None:
+        clauses.append(f"company IN ({_placeholders(companies)})")
+        params += list(companies)
+    if years is not None:
+        clauses.append(f"year IN ({_placeholders(years)})")
+        params += [int(year) for year in years]
+    if metrics is not None:
+        clauses.append(f"metric IN ({_placeholders(metrics)})")
+        params += list(metrics)
+    if categories is not None:
+        clauses.append(f"category IN ({_placeholders(categories)})")
+        params += list(categories)
+    return " AND ".join(clauses), params
+
+
+# Long table of one statement with the same columns and dtypes as the cleaned files
+def read_statement(conn, statement, companies=None, years=None, metrics=None):
+    where, params = _where(statement, companies, years, metrics)
+    df_long = pd.read_sql_query(
+        f"SELECT company AS Company, metric AS Metric, year AS Year, value AS Value, category AS Category "
+        f"FROM statement_values WHERE {where} ORDER BY rowid", conn, params=params)
+    if df_long["Category"].isna().all():
+        df_long = df_long.drop(columns="Category")
+    df_long["Value"] = df_long["Value"].astype(float)
+    df_long["Year"] = df_long["Year"].astype(np.int16)
+    for column in ["Company", "Metric", "Category"]:
+        if column in df_long:
+            df_long[column] = df_long[column].astype("category")
+    return df_long
+
+
+def read_store(path, statements):
+    with connect(path) as conn:
+        frames = {statement: read_statement(conn, statement) for statement in statements}
+    conn.close()
+    return frames
+
+
+def list_companies(conn):
+    return [row[0] for row in conn.execute("SELECT DISTINCT company FROM statement_values ORDER BY company")]
+
+
+def list_years(conn):
+    return [row[0] for row in conn.execute("SELECT DISTINCT year FROM statement_values ORDER BY year")]
+
+
+# Distinct line items of a statement (answered from the (statement, metric) index)
+def list_metrics(conn, statement):
+    return [row[0] for row in conn.execute("SELECT DISTINCT metric FROM statement_values WHERE statement = ?", [statement])]
+
+
+# Sum of the selected line items (or categories) per company and year, computed in
+# SQL. Missing values count as zero, as in ItemAggregates.total.
+def sum_by_company_year(conn, statement, metrics=None, categories=None, companies=None, years=None):
+    where, params = _where(statement, companies, years, metrics, categories)
+    return pd.read_sql_query(
+        f"SELECT company, year, TOTAL(value) AS value FROM statement_values WHERE {where} GROUP BY company, year",
+        conn, params=params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute KPIs in the statement store.")
+    parser.add_argument("kpis", nargs="+", help="KPI names from Python_kpi_engine")
+    parser.add_argument("--store", default=STORE_NAME, help="database written with --format sqlite")
+    parser.add_argument("--company", action="append", help="limit to a company (repeatable)")
+    parser.add_argument("--year", type=int, action="append", help="limit to a year (repeatable)")
+    args = parser.parse_args()
+
+    from Python_kpi_engine import StoreKPIEngine
+
+    engine = StoreKPIEngine(args.store, companies=args.company, years=args.year)
+    print(engine.frame(args.kpis).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#####################################################################
+##########  EMAAR Properties : Line item taxonomy           ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import argparse
+import functools
+import re
+
+import numpy as np
+import pandas as pd
+
+# Canonical line items of each statement: (item, balance sheet category, labels).
+# The first label is the wording of the EMAAR statements, the others are synonyms
+# used by other issuers. Labels are compared after normalise_label, so case,
+# punctuation and "&" / "and" do not matter.
+TAXONOMY = {
+    "balance_sheet": [
+        ("cash", "Assets", ["Bank Balances And Cash", "Cash And Cash Equivalents", "Cash And Bank Balances",
+                            "Cash And Balances With Banks"]),
+        ("trade_receivables", "Assets", ["Trade And Unbilled Receivables", "Trade Receivables",
+                                         "Trade And Other Receivables", "Accounts Receivable"]),
+        ("other_receivables", "Assets", ["Other Assets, Receivables, Deposits And Prepayments",
+                                         "Prepayments And Other Receivables", "Deposits, Prepayments And Other Receivables",
+                                         "Other Receivables"]),
+        ("development_properties", "Assets", ["Development Properties", "Properties Under Development",
+                                              "Inventories", "Property Inventory"]),
+        ("assets_held_for_sale", "Assets", ["Assets Classified As Held For Sale", "Assets Held For Sale"]),
+        ("loans_to_associates", "Assets", ["Loans To Associates And Joint Ventures", "Loans To Joint Ventures"]),
+        ("investments_in_associates", "Assets", ["Investments In Associates And Joint Ventures",
+                                                 "Investment In Associates", "Equity Accounted Investees"]),
+        ("other_financial_assets", "Assets", ["Other Financial Assets", "Financial Assets At Fair Value",
+                                              "Investments In Securities"]),
+        ("property_plant_equipment", "Assets", ["Property, Plant And Equipment", "Fixed Assets"]),
+        ("investment_properties", "Assets", ["Investment Properties", "Investment Property"]),
+        ("intangible_assets", "Assets", ["Intangible Assets", "Goodwill And Intangible Assets", "Goodwill"]),
+        ("deferred_tax_assets", "Assets", ["Deferred Tax Assets"]),
+        ("total_current_assets", "Assets", ["Total Current Assets"]),
+        ("total_non_current_assets", "Assets", ["Total Non-Current Assets"]),
+        ("total_assets", "Assets", ["Total Assets"]),
+        ("trade_payables", "Liabilities", ["Trade And Other Payables", "Trade Payables", "Accounts Payable"]),
+        ("customer_advances", "Liabilities", ["Advances From Customers", "Customer Advances", "Contract Liabilities"]),
+        ("retentions_payable", "Liabilities", ["Retentions Payable", "Retention Payables"]),
+        ("liabilities_held_for_sale", "Liabilities", ["Liabilities Directly Associated With Assets Classified As Held For Sale",
+                                                      "Liabilities Held For Sale"]),
+        ("borrowings", "Liabilities", ["Interest-Bearing Loans And Borrowings", "Loans And Borrowings",
+                                       "Bank Borrowings", "Borrowings", "Bank Loans"]),
+        ("sukuk", "Liabilities", ["Sukuk", "Sukuk Certificates", "Bonds"]),
+        ("lease_liabilities", "Liabilities", ["Lease Liabilities", "Lease Obligations"]),
+        ("deferred_tax_liabilities", "Liabilities", ["Deferred Tax Liabilities"]),
+        ("total_current_liabilities", "Liabilities", ["Total Current Liabilities"]),
+        ("total_non_current_liabilities", "Liabilities", ["Total Non-Current Liabilities"]),
+        ("total_liabilities", "Liabilities", ["Total Liabilities"]),
+        ("share_capital", "Equity", ["Share Capital", "Issued Share Capital", "Paid-Up Capital"]),
+        ("reserves", "Equity", ["Reserves", "Other Reserves", "Statutory Reserve"]),
+        ("retained_earnings", "Equity", ["Retained Earnings", "Accumulated Profits"]),
+        ("equity_owners", "Equity", ["Equity Attributable To Owners Of The Company",
+                                     "Equity Attributable To Owners Of The Parent",
+                                     "Equity Attributable To Equity Holders Of The Parent"]),
+        ("non_controlling_interests", "Equity", ["Non-Controlling Interests", "Minority Interests"]),
+        ("total_equity", "Equity", ["Total Equity", "Total Shareholders' Equity"]),
+        ("total_liabilities_and_equity", "Equity", ["Total Liabilities And Equity", "Total Equity And Liabilities",
+                                                    "Total Liabilities And Shareholders' Equity"]),
+    ],
+    "income_statement": [
+        ("revenue", None, ["Revenue", "Revenues", "Sales", "Turnover"]),
+        ("cost_of_revenue", None, ["Cost Of Revenue", "Cost Of Sales", "Cost Of Revenues"]),
+        ("gross_profit", None, ["Gross Profit"]),
+        ("other_operating_income", None, ["Other Operating Income"]),
+        ("other_operating_expenses", None, ["Other Operating Expenses"]),
+        ("sga", None, ["Selling, General And Administrative Expenses", "Selling, General And Administration Expenses",
+                       "General, Administrative And Selling Expenses"]),
+        ("depreciation_ppe", None, ["Depreciation Of Property, Plant And Equipment"]),
+        ("depreciation_investment_properties", None, ["Depreciation Of Investment Properties"]),
+        ("finance_income", None, ["Finance Income", "Interest Income"]),
+        ("finance_costs", None, ["Finance Costs", "Finance Cost", "Finance Expenses", "Interest Expense"]),
+        ("other_income", None, ["Other Income"]),
+        ("share_of_associates", None, ["Share Of Results Of Associates And Joint Ventures",
+                                       "Share Of Profit Of Associates And Joint Ventures"]),
+        ("impairment_financial_assets", None, ["Impairment Of Financial Assets"]),
+        ("profit_before_tax", None, ["Profit Before Tax", "Profit Before Income Tax", "Profit Before Taxation"]),
+        ("income_tax", None, ["Income Tax Expense", "Income Tax", "Tax Expense"]),
+        ("profit_for_the_year", None, ["Profit For The Year", "Net Profit For The Year", "Profit For The Period"]),
+        ("profit_owners", None, ["Owners Of The Company", "Owners Of The Parent", "Equity Holders Of The Parent"]),
+        ("profit_non_controlling", None, ["Non-Controlling Interests", "Minority Interests"]),
+        ("earnings_per_share", None, ["Basic And Diluted Earnings Per Share (AED)", "Basic And Diluted Earnings Per Share"]),
+    ],
+    "cash_flow": [
+        ("profit_before_tax", None, ["Profit Before Tax", "Profit Before Income Tax"]),
+        ("depreciation", None, ["Depreciation", "Depreciation And Amortisation"]),
+        ("working_capital", None, ["Movements In Working Capital", "Changes In Working Capital"]),
+        ("operating_cash_flow", None, ["Net Cash Flows From Operating Activities", "Net Cash Flows Used In Operating Activities",
+                                       "Net Cash From Operating Activities", "Net Cash Generated From Operating Activities",
+                                       "Net Cash Flows (Used In)/From Operating Activities"]),
+        ("capex_ppe", None, ["Amounts Incurred On Property, Plant And Equipment",
+                             "Purchase Of Property, Plant And Equipment", "Purchase Of Property And Equipment",
+                             "Additions To Property, Plant And Equipment"]),
+        ("capex_investment_properties", None, ["Amounts Incurred On Investment Properties",
+                                               "Additions To Investment Properties"]),
+        ("investing_cash_flow", None, ["Net Cash Flows Used In Investing Activities", "Net Cash Flows From Investing Activities",
+                                       "Net Cash Used In Investing Activities", "Net Cash Generated From Investing Activities",
+                                       "Net Cash Flows (Used In)/From Investing Activities"]),
+        ("dividends_paid", None, ["Dividends Paid"]),
+        ("financing_cash_flow", None, ["Net Cash Flows Used In Financing Activities", "Net Cash Flows From Financing Activities",
+                                       "Net Cash Used In Financing Activities", "Net Cash Generated From Financing Activities",
+                                       "Net Cash Flows (Used In)/From Financing Activities"]),
+        ("net_change_in_cash", None, ["Net Increase In Cash And Cash Equivalents", "Net Decrease In Cash And Cash Equivalents",
+                                      "Net (Decrease)/Increase In Cash And Cash Equivalents",
+                                      "Net Increase/(Decrease) In Cash And Cash Equivalents"]),
+    ],
+}
+
+# Balance sheet items that make up current assets and current liabilities
+CURRENT_ASSETS = ["cash", "trade_receivables", "other_receivables", "assets_held_for_sale"]
+CURRENT_LIABILITIES = ["trade_payables", "customer_advances", "retentions_payable", "liabilities_held_for_sale"]
+
+# Share of trigrams (Dice coefficient) a label needs with a known label to be matched
+FUZZY_THRESHOLD = 0.8
+
+# Words that do not tell line items apart
+STOP_WORDS = {"and", "of", "the", "in", "to", "from", "for", "on", "with", "as", "by"}
+
+
+# Lower case, "&" as "and", punctuation as spaces, single spaces
+def normalise_label(label):
+    label = str(label).lower().replace("&", " and ")
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", label).split())
+
+
+# Character trigrams of a normalised label, padded so that word starts and ends count
+def trigrams(label):
+    padded = f"  {label} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Every content word of each label has a counterpart in the other with the same
+# first four letters ("liability" / "liabilities"), so near-identical labels that
+# differ in the one word that matters ("operating" / "financing") are not matched
+def same_words(a, b):
+    a = {word[:4] for word in a.split() if word not in STOP_WORDS}
+    b = {word[:4] for word in b.split() if word not in STOP_WORDS}
+    return a == b
+
+
+# Inverted index from trigram to the known labels containing it. A query only
+# touches the labels that share a trigram with it, and a whole batch of queries
+# is scored with one bincount instead of comparing every pair of labels.
+class TrigramIndex:
+    def __init__(self, labels):
+        self.labels = list(labels)
+        grams = [trigrams(label) for label in self.labels]
+        self.sizes = np.array([len(g) for g in grams])
+        self.gram_ids = {}
+        pairs = [(self.gram_ids.setdefault(gram, len(self.gram_ids)), i) for i, g in enumerate(grams) for gram in g]
+        gram_codes, label_codes = np.array(pairs, dtype=np.intp).reshape(-1, 2).T
+        order = np.argsort(gram_codes, kind="stable")
+        self.postings = label_codes[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(gram_codes, minlength=len(self.gram_ids)))])
+
+    # The k closest known labels and their Dice scores for each query label, best
+    # first. Queries are scored block_size at a time to bound the score matrix.
+    def best(self, queries, k=3, block_size=4096):
+        k = min(k, len(self.labels))
+        best, scores = np.zeros((len(queries), k), dtype=np.intp), np.zeros((len(queries), k))
+        for start in range(0, len(queries), block_size):
+            block = slice(start, start + block_size)
+            best[block], scores[block] = self._best_block(queries[block], k)
+        return best, scores
+
+    def _best_block(self, queries, k):
+        n, m = len(queries), len(self.labels)
+        query_rows, query_grams, query_sizes = [], [], np.zeros(n, dtype=np.intp)
+        for row, query in enumerate(queries):
+            grams = trigrams(query)
+            query_sizes[row] = len(grams)
+            known = [self.gram_ids[gram] for gram in grams if gram in self.gram_ids]
+            query_rows += [row] * len(known)
+            query_grams += known
+        query_rows = np.array(query_rows, dtype=np.intp)
+        query_grams = np.array(query_grams, dtype=np.intp)
+
+        # Expand every (query, trigram) pair into the postings of that trigram
+        starts, counts = self.offsets[query_grams], np.diff(self.offsets)[query_grams]
+        rows = np.repeat(query_rows, counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        labels = self.postings[np.repeat(starts, counts) + within]
+
+        shared = np.bincount(rows * m + labels, minlength=n * m).reshape(n, m)
+        scores = 2 * shared / (query_sizes[:, None] + self.sizes[None, :])
+        best = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return best, np.take_along_axis(scores, best, axis=1)
+
+
+# Maps raw metric labels of one statement to canonical items: exact wording first,
+# then synonyms, then the closest known label by trigram similarity. Each distinct
+# label is resolved once and remembered for the life of the mapper.
+class TaxonomyMapper:
+    def __init__(self, items, threshold=FUZZY_THRESHOLD):
+        self.threshold = threshold
+        self.category = {item: category for item, category, _ in items}
+        self.known = {}
+        for item, _, labels in items:
+            for rank, label in enumerate(labels):
+                self.known.setdefault(normalise_label(label), (item, "exact" if rank == 0 else "synonym"))
+        self.index = TrigramIndex(self.known)
+        self.labels = list(self.known)
+        self.items = [item for item, _ in self.known.values()]
+        self._memo = {}
+
+    # Resolve the labels not seen before, in one batch
+    def _resolve(self, labels):
+        new = [label for label in dict.fromkeys(labels) if label not in self._memo]
+        fuzzy = []
+        for label in new:
+            normalised = normalise_label(label)
+            if normalised in self.known:
+                item, match = self.known[normalised]
+                self._memo[label] = (item, match, 1.0)
+            elif normalised:
+                fuzzy.append((label, normalised))
+            else:
+                self._memo[label] = (None, None, 0.0)
+        if fuzzy:
+            best, scores = self.index.best([normalised for _, normalised in fuzzy])
+            for (label, normalised), candidates, candidate_scores in zip(fuzzy, best, scores):
+                self._memo[label] = (None, None, float(candidate_scores[0]))
+                for i, score in zip(candidates, candidate_scores):
+                    if score < self.threshold:
+                        break
+                    if same_words(normalised, self.labels[i]):
+                        self._memo[label] = (self.items[i], "fuzzy", float(score))
+                        break
+
+    # Canonical item of each label (None where nothing is close enough)
+    def map(self, labels):
+        labels = [str(label) for label in labels]
+        self._resolve(labels)
+        return [self._memo[label][0] for label in labels]
+
+    # Item, match type and score per distinct label, for reviewing a new issuer's wording
+    def explain(self, labels):
+        labels = list(dict.fromkeys(str(label) for label in labels))
+        self._resolve(labels)
+        return pd.DataFrame([(label, *self._memo[label]) for label in labels], columns=["Label", "Item", "Match", "Score"])
+
+    # Balance sheet category of each label, through the canonical item
+    def categories(self, labels):
+        return [self.category.get(item) for item in self.map(labels)]
+
+    # Canonical item of every row of a metric column, mapped once per distinct name
+    def map_column(self, metrics):
+        metrics = metrics.astype("category")
+        items = pd.Index(self.map(metrics.cat.categories), dtype=object)
+        categories = items.dropna().unique().sort_values()
+        codes = metrics.cat.codes.to_numpy()
+        codes = np.where(codes >= 0, categories.get_indexer(items)[codes], -1)
+        return pd.Categorical.from_codes(codes, categories=categories)
+
+
+# One mapper per statement, shared by everything that maps labels in this process
+@functools.lru_cache(maxsize=None)
+def get_mapper(statement):
+    return TaxonomyMapper(TAXONOMY[statement])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how the line items of cleaned statements map to canonical items.")
+    parser.add_argument("input_dir", nargs="?", default=".")
+    parser.add_argument("--unmatched", action="store_true", help="only list labels without a canonical item")
+    args = parser.parse_args()
+
+    from Python_analysis import load_cleaned
+
+    for statement, df_long in load_cleaned(args.input_dir).items():
+        mapping = get_mapper(statement).explain(df_long["Metric"].astype("category").cat.categories)
+        if args.unmatched:
+            mapping = mapping[mapping["Item"].isna()]
+        print(f"\n{statement}:")
+        print(mapping.round(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#####################################################################
+##########  EMAAR Properties : Trailing twelve months       ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import argparse
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from Python_analysis import ItemAggregates, load_cleaned
+from Python_kpi_engine import KPI_REGISTRY, KPIEngine
+
+# Income and cash flow items are flows: their TTM value is the sum of the last four
+# quarters. Balance sheet items are positions, taken as at the quarter end.
+FLOW_STATEMENTS = {"income_statement", "cash_flow"}
+QUARTERS_PER_YEAR = 4
+
+
+# Quarters as consecutive integers, so the quarter after 2024Q4 is 2025Q1
+def period_code(year, quarter):
+    return np.asarray(year, dtype=int) * QUARTERS_PER_YEAR + np.asarray(quarter, dtype=int) - 1
+
+
+def period_label(code):
+    return f"{code // QUARTERS_PER_YEAR}Q{code % QUARTERS_PER_YEAR + 1}"
+
+
+# Last `window` quarterly values of every company in a ring buffer. push() adds one
+# quarter, overwriting the oldest, and returns the window sums (NaN unless every
+# quarter in the window was reported).
+class RollingWindow:
+    def __init__(self, window=QUARTERS_PER_YEAR, companies=0):
+        self.buffer = np.full((companies, window), np.nan)
+        self.position = 0
+
+    def grow(self, companies):
+        extra = np.full((companies - len(self.buffer), self.buffer.shape[1]), np.nan)
+        self.buffer = np.vstack([self.buffer, extra])
+
+    def push(self, values):
+        self.buffer[:, self.position] = values
+        self.position = (self.position + 1) % self.buffer.shape[1]
+        return self.buffer.sum(axis=1)
+
+
+# TTM KPIs over quarterly statements. Quarters are appended in order; each one
+# updates the line items of every company through their rolling windows, so adding
+# a quarter costs O(companies), not a pass over the whole history. Derived KPIs
+# use the same registry functions as the annual engine, applied to TTM inputs:
+# ttm.frame(["revenue", "ebitda", "free_cash_flow", "roe"])
+class TTMEngine(KPIEngine):
+    def __init__(self, registry=None, window=QUARTERS_PER_YEAR):
+        self.registry = KPI_REGISTRY if registry is None else registry
+        self.window = window
+        self.line_items = [name for name, spec in self.registry.items() if spec["compute"] is None]
+        self.companies = pd.Index([], dtype=object)
+        self.periods = []
+        self._rolling = {name: RollingWindow(window) for name in self.line_items
+                         if self.registry[name]["statement"] in FLOW_STATEMENTS}
+        self._history = {name: [] for name in self.line_items}
+        self._last = None
+
+    @property
+    def years(self):
+        return pd.Index([period_label(code) for code in self.periods[-self._last if self._last else 0:]], name="Period")
+
+    # Append the quarters of cleaned long tables (with Year and Quarter columns) that
+    # come after the last quarter appended; earlier ones are skipped. Returns the
+    # labels of the quarters added.
+    def append(self, frames):
+        positions = {}
+        for statement, df_long in frames.items():
+            if "Quarter" not in df_long:
+                raise ValueError(f"{statement} has no Quarter column; TTM needs quarterly statements")
+            codes = period_code(df_long["Year"].to_numpy(), df_long["Quarter"].to_numpy())
+            positions[statement] = pd.Series(codes).groupby(codes).indices
+
+        added = []
+        codes = sorted(set().union(*positions.values()))
+        for code in codes:
+            if self.periods and code <= self.periods[-1]:
+                continue
+            # Quarters nobody reported still move the windows
+            while self.periods and self.periods[-1] + 1 < code:
+                self._push(self.periods[-1] + 1, {})
+            quarter = {statement: frames[statement].iloc[rows[code]]
+                       for statement, rows in positions.items() if code in rows}
+            self._push(code, quarter)
+            added.append(period_label(code))
+        return added
+
+    def _push(self, code, frames):
+        indexes = {statement: ItemAggregates.from_long(df_long, statement) for statement, df_long in frames.items()}
+        reported = sorted(set().union(*[index.companies for index in indexes.values()]))
+        new = [company for company in reported if company not in self.companies]
+        if new:
+            self.companies = self.companies.append(pd.Index(new, dtype=object))
+            for rolling in self._rolling.values():
+                rolling.grow(len(self.companies))
+
+        engine = KPIEngine(indexes, self.registry) if indexes else None
+        for name in self.line_items:
+            spec = self.registry[name]
+            if spec["statement"] in indexes:
+                values = engine._line_item(spec, self.companies)[:, 0]
+            else:
+                values = np.full(len(self.companies), np.nan)
+            if name in self._rolling:
+                values = self._rolling[name].push(values)
+            self._history[name].append(values)
+        self.periods.append(code)
+
+    # Company x quarter array of a line item's TTM (or quarter-end) values
+    def _line_item(self, spec, companies):
+        history = self._history[spec["name"]][-self._last if self._last else 0:]
+        grid = np.full((len(self.companies), len(history)), np.nan)
+        for column, values in enumerate(history):
+            grid[:len(values), column] = values
+        rows = self.companies.get_indexer(companies)
+        return np.where((rows >= 0)[:, None], grid[np.maximum(rows, 0)], np.nan)
+
+    # KPIs of the latest quarter only, one row per company
+    def latest(self, names, companies=None):
+        self._last = 1
+        try:
+            df_kpis = self.frame(names, companies)
+        finally:
+            self._last = None
+        return df_kpis
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trailing twelve months KPIs from quarterly cleaned statements.")
+    parser.add_argument("input_dir", nargs="?", default=".")
+    parser.add_argument("--kpis", default="revenue,ebitda,free_cash_flow,net_margin,roe,current_ratio",
+                        help="comma-separated KPI names from Python_kpi_engine")
+    parser.add_argument("--company", action="append", help="limit the output to a company (repeatable)")
+    parser.add_argument("--latest", action="store_true", help="only print the latest quarter")
+    parser.add_argument("--state", metavar="FILE",
+                        help="keep the rolling windows in FILE, so the next run only appends new quarters")
+    parser.add_argument("--output", metavar="FILE", help="write the TTM table to a CSV file")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.kpis.split(",") if name.strip()]
+    unknown = [name for name in names if name not in KPI_REGISTRY]
+    if unknown:
+        parser.error(f"unknown KPIs: {', '.join(unknown)}")
+
+    engine = TTMEngine()
+    if args.state and os.path.exists(args.state):
+        with open(args.state, "rb") as f:
+            engine = pickle.load(f)
+    added = engine.append(load_cleaned(args.input_dir))
+    print(f"Appended {len(added)} quarters" + (f" ({added[0]} to {added[-1]})" if added else ""))
+    if args.state:
+        with open(args.state, "wb") as f:
+            pickle.dump(engine, f)
+
+    df_ttm = engine.latest(names, args.company) if args.latest else engine.frame(names, args.company)
+    print(df_ttm.round(2).to_string(index=False))
+    if args.output:
+        df_ttm.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
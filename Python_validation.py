@@ -0,0 +1,195 @@
+#####################################################################
+##########  EMAAR Properties : Accounting checks            ##########
+#####################################################################
+
+## By Maria Elena Lasiu
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from Python_analysis import DEFAULT_COMPANY, build_indexes, load_cleaned, load_indexes
+from Python_kpi_engine import KPIEngine, kpi, line_item
+
+# Line items and sums the checks compare, evaluated by the KPI engine over the
+# company x year grid of every statement at once
+VALIDATION_REGISTRY = {}
+
+
+def _item(name, statement, items=None, category=None):
+    line_item(name, statement, items, category=category, registry=VALIDATION_REGISTRY)
+
+
+def _sum(name, *inputs):
+    kpi(name, *inputs, registry=VALIDATION_REGISTRY)(lambda *values: sum(values))
+
+
+# Sum of a category without its total and its subtotals (when the statement has them)
+def _category_items(name, category, total, subtotals):
+    kpi(name, category, total, subtotals, registry=VALIDATION_REGISTRY)(
+        lambda category, total, subtotals: category - total - np.nan_to_num(subtotals))
+
+
+# Balance sheet
+_item("total_assets", "balance_sheet", "total_assets")
+_item("total_liabilities", "balance_sheet", "total_liabilities")
+_item("total_equity", "balance_sheet", "total_equity")
+_item("total_liabilities_and_equity", "balance_sheet", "total_liabilities_and_equity")
+_item("equity_owners", "balance_sheet", "equity_owners")
+_item("equity_non_controlling", "balance_sheet", "non_controlling_interests")
+_item("assets_category", "balance_sheet", category="Assets")
+_item("liabilities_category", "balance_sheet", category="Liabilities")
+_item("asset_subtotals", "balance_sheet", ["total_current_assets", "total_non_current_assets"])
+_item("liability_subtotals", "balance_sheet", ["total_current_liabilities", "total_non_current_liabilities"])
+_category_items("asset_items", "assets_category", "total_assets", "asset_subtotals")
+_category_items("liability_items", "liabilities_category", "total_liabilities", "liability_subtotals")
+_sum("liabilities_plus_equity", "total_liabilities", "total_equity")
+_sum("equity_items", "equity_owners", "equity_non_controlling")
+
+# Income statement
+_item("revenue", "income_statement", "revenue")
+_item("cost_of_revenue", "income_statement", "cost_of_revenue")
+_item("gross_profit", "income_statement", "gross_profit")
+_item("profit_before_tax", "income_statement", "profit_before_tax")
+_item("income_tax", "income_statement", "income_tax")
+_item("profit", "income_statement", "profit_for_the_year")
+_item("profit_owners", "income_statement", "profit_owners")
+_item("profit_non_controlling", "income_statement", "profit_non_controlling")
+_sum("gross_profit_items", "revenue", "cost_of_revenue")
+_sum("profit_items", "profit_before_tax", "income_tax")
+_sum("profit_attribution", "profit_owners", "profit_non_controlling")
+
+# Cash flow
+_item("cash_flow_profit_before_tax", "cash_flow", "profit_before_tax")
+_item("operating_cash_flow", "cash_flow", "operating_cash_flow")
+_item("investing_cash_flow", "cash_flow", "investing_cash_flow")
+_item("financing_cash_flow", "cash_flow", "financing_cash_flow")
+_item("net_change_in_cash", "cash_flow", "net_change_in_cash")
+_sum("cash_flow_sections", "operating_cash_flow", "investing_cash_flow", "financing_cash_flow")
+
+# (check, statement, reported item, item it should equal)
+IDENTITY_CHECKS = [
+    ("assets = liabilities + equity", "balance_sheet", "total_assets", "liabilities_plus_equity"),
+    ("total liabilities and equity", "balance_sheet", "total_liabilities_and_equity", "total_assets"),
+    ("total assets subtotal", "balance_sheet", "total_assets", "asset_items"),
+    ("total liabilities subtotal", "balance_sheet", "total_liabilities", "liability_items"),
+    ("total equity subtotal", "balance_sheet", "total_equity", "equity_items"),
+    ("gross profit subtotal", "income_statement", "gross_profit", "gross_profit_items"),
+    ("profit for the year subtotal", "income_statement", "profit", "profit_items"),
+    ("profit attribution", "income_statement", "profit", "profit_attribution"),
+    ("cash flow sections", "cash_flow", "net_change_in_cash", "cash_flow_sections"),
+    ("profit before tax matches income statement", "cash_flow", "cash_flow_profit_before_tax", "profit_before_tax"),
+]
+
+# Statements whose every row must get a category, and the catch-all label that means "not classified"
+CATEGORISED_STATEMENTS = {"balance_sheet": None, "income_statement": "Other"}
+
+REPORT_COLUMNS = ["Check", "Statement", "Company", "Year", "Quarter", "Metric", "Reported", "Expected", "Difference", "Rows"]
+
+
+# Identity checks for every company and year in one pass. Values are in reporting
+# units, so differences within atol + rtol * |reported| are rounding, not errors.
+# Company/years where an item is not reported are counted as unchecked.
+def identity_checks(indexes, atol=10.0, rtol=1e-4):
+    engine = KPIEngine(indexes, VALIDATION_REGISTRY)
+    values = engine.compute(sorted({item for _, _, lhs, rhs in IDENTITY_CHECKS for item in (lhs, rhs)}))
+
+    summary, violations = [], []
+    for check, statement, lhs, rhs in IDENTITY_CHECKS:
+        reported, expected = values[lhs], values[rhs]
+        checked = ~np.isnan(reported) & ~np.isnan(expected)
+        difference = reported - expected
+        failed = checked & (np.abs(np.where(checked, difference, 0)) > atol + rtol * np.abs(np.where(checked, reported, 0)))
+
+        summary.append({"Check": check, "Statement": statement, "Checked": int(checked.sum()),
+                        "Unchecked": int((~checked).sum()), "Violations": int(failed.sum())})
+        company, year = np.nonzero(failed)
+        violations.append(pd.DataFrame({
+            "Check": check,
+            "Statement": statement,
+            "Company": engine.companies[company],
+            "Year": engine.years[year],
+            "Reported": reported[company, year],
+            "Expected": expected[company, year],
+            "Difference": difference[company, year],
+        }))
+    return pd.DataFrame(summary), pd.concat(violations, ignore_index=True)
+
+
+# Rows without a category (or with the catch-all label), one line per company and metric
+def category_coverage(frames):
+    summary, violations = [], []
+    for statement, fallback in CATEGORISED_STATEMENTS.items():
+        df_long = frames[statement]
+        category = df_long["Category"] if "Category" in df_long else pd.Series(np.nan, index=df_long.index)
+        missing = category.isna().to_numpy()
+        if fallback is not None:
+            missing = missing | (category.astype(object) == fallback).to_numpy()
+
+        company = df_long["Company"].astype(str) if "Company" in df_long else pd.Series(DEFAULT_COMPANY, index=df_long.index)
+        uncovered = pd.DataFrame({"Company": company[missing], "Metric": df_long["Metric"].astype(str)[missing]})
+        uncovered = uncovered.groupby(["Company", "Metric"], sort=True).size().rename("Rows").reset_index()
+        summary.append({"Check": "category coverage", "Statement": statement, "Checked": len(df_long),
+                        "Unchecked": 0, "Violations": int(missing.sum())})
+        violations.append(uncovered.assign(Check="category coverage", Statement=statement))
+    return pd.DataFrame(summary), pd.concat(violations, ignore_index=True)
+
+
+# The same line item reported twice for a company and year
+def duplicate_rows(frames):
+    summary, violations = [], []
+    for statement, df_long in frames.items():
+        periods = [column for column in ["Year", "Quarter"] if column in df_long]
+        keys = [column for column in ["Company", "Metric"] if column in df_long] + periods
+        duplicated = df_long.duplicated(keys, keep=False).to_numpy()
+        rows = df_long[duplicated]
+        company = rows["Company"].astype(str) if "Company" in rows else pd.Series(DEFAULT_COMPANY, index=rows.index)
+        found = pd.DataFrame({"Company": company, "Metric": rows["Metric"].astype(str), **{column: rows[column] for column in periods}})
+        found = found.groupby(["Company", "Metric", *periods], sort=True).size().rename("Rows").reset_index()
+        summary.append({"Check": "duplicate rows", "Statement": statement, "Checked": len(df_long),
+                        "Unchecked": 0, "Violations": len(found)})
+        violations.append(found.assign(Check="duplicate rows", Statement=statement))
+    return pd.DataFrame(summary), pd.concat(violations, ignore_index=True)
+
+
+# Run every check over the cleaned statements. Returns a summary per check and the
+# violations, one row each.
+def validate(frames, indexes=None, atol=10.0, rtol=1e-4):
+    indexes = build_indexes(frames) if indexes is None else indexes
+    results = [identity_checks(indexes, atol, rtol), category_coverage(frames), duplicate_rows(frames)]
+    summary = pd.concat([s for s, _ in results], ignore_index=True)
+    violations = [v for _, v in results if len(v)]
+    violations = pd.concat(violations, ignore_index=True) if violations else pd.DataFrame()
+    return summary, violations.reindex(columns=REPORT_COLUMNS)
+
+
+def report_violations(summary, violations, limit=20):
+    print("\n✅ Validation:")
+    print(summary.to_string(index=False))
+    if len(violations):
+        print(f"\n⚠️ Violations: {len(violations)}")
+        print(violations.dropna(axis=1, how="all").head(limit).to_string(index=False))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check accounting identities, subtotals and category coverage.")
+    parser.add_argument("input_dir", nargs="?", default=".")
+    parser.add_argument("--report", metavar="FILE", help="write every violation to a CSV file")
+    parser.add_argument("--atol", type=float, default=10.0, help="absolute tolerance, in reporting units")
+    parser.add_argument("--rtol", type=float, default=1e-4, help="tolerance relative to the reported value")
+    parser.add_argument("--strict", action="store_true", help="exit with status 1 when there are violations")
+    args = parser.parse_args(argv)
+
+    frames = load_cleaned(args.input_dir)
+    summary, violations = validate(frames, load_indexes(args.input_dir, frames), args.atol, args.rtol)
+    report_violations(summary, violations)
+    if args.report:
+        violations.to_csv(args.report, index=False)
+    if args.strict and len(violations):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+# The pipeline scripts live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Python_cleaning_v2 import clean_universe  # noqa: E402
+from Python_generate_statements import generate  # noqa: E402
+
+
+# Directory of synthetic official_<company>_<statement>.csv files, written once per
+# set of options for the whole session
+@pytest.fixture(scope="session")
+def statements(tmp_path_factory):
+    written = {}
+
+    def make(companies=3, years=3, seed=0, quarterly=False):
+        key = (companies, years, seed, quarterly)
+        if key not in written:
+            path = tmp_path_factory.mktemp("statements")
+            generate(str(path), companies=companies, years=years, seed=seed, quarterly=quarterly)
+            written[key] = str(path)
+        return written[key]
+
+    return make
+
+
+# Cleaned long tables of those statements, in one process and without I/O threads.
+# Shared by every test, so tests change copies only.
+@pytest.fixture(scope="session")
+def cleaned(statements):
+    frames = {}
+
+    def clean(**options):
+        key = tuple(sorted(options.items()))
+        if key not in frames:
+            frames[key] = clean_universe(statements(**options), processes=1, io_threads=0)
+        return frames[key]
+
+    return clean
+
+
+@pytest.fixture
+def frames(cleaned):
+    return cleaned()
+
+
+@pytest.fixture
+def quarterly_frames(cleaned):
+    return cleaned(quarterly=True)
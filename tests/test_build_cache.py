@@ -0,0 +1,78 @@
+import os
+import shutil
+
+import pandas as pd
+
+from Python_build_cache import BuildCache, bytes_hash, file_hash, make_key
+from Python_cleaning_v2 import STATEMENTS, clean_company, discover_statements
+
+
+def test_keys_and_hashes(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_bytes(b"a,b\n1,2\n")
+    assert file_hash(str(path), block_size=3) == bytes_hash(b"a,b\n1,2\n")
+    assert make_key("clean", 1, "x") == make_key("clean", 1, "x")
+    assert make_key("clean", 1, "x") != make_key("clean", "x", 1)
+
+
+def test_fetch_computes_once(tmp_path):
+    cache = BuildCache(str(tmp_path))
+    calls = []
+    compute = lambda: calls.append(1) or {"value": 42}
+    assert cache.fetch("key", compute) == {"value": 42}
+    assert cache.fetch("key", compute) == {"value": 42}
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.get("other", "default") == "default"
+
+
+def test_entries_survive_a_new_cache_object(tmp_path):
+    BuildCache(str(tmp_path)).put("key", [1, 2, 3])
+    assert BuildCache(str(tmp_path)).get("key") == [1, 2, 3]
+
+
+def test_eviction_removes_the_least_recently_used(tmp_path):
+    cache = BuildCache(str(tmp_path), max_bytes=0)
+    for i, key in enumerate(["old", "used", "new"]):
+        cache.put(key, b"x" * 1000)
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    size = os.path.getsize(cache._path("new"))
+    # Reading an entry makes it the most recently used
+    cache.get("old")
+    cache.max_bytes = 2 * size
+
+    assert cache.evict() == 2 * size
+    assert cache.get("used") is None
+    assert cache.get("old") == b"x" * 1000
+    assert cache.get("new") == b"x" * 1000
+
+
+def test_clean_company_reuses_unchanged_statements(statements, tmp_path):
+    source = tmp_path / "source"
+    shutil.copytree(statements(), source)
+    paths = discover_statements(str(source))["emaar"]
+    cache = BuildCache(str(tmp_path / "cache"))
+
+    first = clean_company("emaar", paths, cache=cache)
+    assert (cache.hits, cache.misses) == (0, len(STATEMENTS))
+    second = clean_company("emaar", paths, cache=cache)
+    assert (cache.hits, cache.misses) == (len(STATEMENTS), len(STATEMENTS))
+    for statement in STATEMENTS:
+        pd.testing.assert_frame_equal(first[statement], second[statement])
+
+    # A new modification time alone does not invalidate the entry
+    os.utime(paths["cash_flow"])
+    clean_company("emaar", paths, cache=cache)
+    assert cache.misses == len(STATEMENTS)
+
+    # Changed content does, for that statement only
+    with open(paths["income_statement"], encoding="utf-8") as f:
+        text = f.read()
+    with open(paths["income_statement"], "w", encoding="utf-8") as f:
+        f.write(text.replace("Revenue,\"", "Revenue,\"1", 1))
+    hits = cache.hits
+    third = clean_company("emaar", paths, cache=cache)
+    assert cache.misses == len(STATEMENTS) + 1
+    assert cache.hits == hits + len(STATEMENTS) - 1
+    revenue = lambda cleaned: cleaned["income_statement"].query("Metric == 'Revenue'")["Value"].iloc[0]
+    assert revenue(third) != revenue(first)
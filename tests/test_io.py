@@ -0,0 +1,195 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from Python_io import WriteQueue, bounded_map, prefetch_files, read_ahead
+
+
+def io_threads(prefix):
+    return [thread for thread in threading.enumerate() if thread.name.startswith(prefix) and thread.is_alive()]
+
+
+# Wait for background threads to catch up, at most a few seconds
+def settle(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class Counter:
+    def __init__(self, items):
+        self.items = items
+        self.produced = 0
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            for item in self.items:
+                self.produced += 1
+                yield item
+        finally:
+            self.closed = True
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for i in range(20):
+        path = tmp_path / f"file_{i:02d}.csv"
+        # Larger files first, so later reads tend to finish earlier
+        path.write_bytes(str(i).encode() * (20 - i) * 1000)
+        paths.append(str(path))
+    return paths
+
+
+# Order
+
+def test_prefetch_keeps_the_order(files):
+    read = list(prefetch_files(files, threads=4, ahead=6))
+    assert [path for path, _ in read] == files
+    for path, contents in read:
+        with open(path, "rb") as f:
+            assert contents == f.read()
+
+
+def test_read_ahead_keeps_the_order():
+    assert list(read_ahead(iter(range(100)), ahead=3)) == list(range(100))
+
+
+def test_bounded_map_keeps_the_order():
+    def slow_square(n):
+        time.sleep(0.001 * (10 - n % 10))
+        return n * n
+
+    with ThreadPoolExecutor(4) as executor:
+        assert list(bounded_map(executor, slow_square, range(30), limit=5)) == [n * n for n in range(30)]
+
+
+def test_write_queue_keeps_the_order_of_a_lane():
+    written = {"a": [], "b": []}
+    with WriteQueue(threads=3, maxsize=2) as writes:
+        for i in range(50):
+            lane = "ab"[i % 2]
+            writes.put(written[lane].append, i, lane=lane)
+    assert written == {"a": list(range(0, 50, 2)), "b": list(range(1, 50, 2))}
+
+
+# Errors reach the caller
+
+def test_prefetch_raises_read_errors(files, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        list(prefetch_files([files[0], str(tmp_path / "missing.csv"), files[1]], threads=2))
+    assert settle(lambda: not io_threads("prefetch"))
+
+
+def test_read_ahead_raises_producer_errors():
+    def produce():
+        yield 1
+        raise ValueError("bad chunk")
+
+    items = read_ahead(produce())
+    assert next(items) == 1
+    with pytest.raises(ValueError, match="bad chunk"):
+        next(items)
+
+
+def test_bounded_map_raises_worker_errors():
+    def check(n):
+        if n == 3:
+            raise ValueError(f"bad item {n}")
+        return n
+
+    with ThreadPoolExecutor(2) as executor:
+        with pytest.raises(ValueError, match="bad item 3"):
+            list(bounded_map(executor, check, range(10), limit=2))
+
+
+def test_write_queue_raises_write_errors():
+    def write(n):
+        if n == 2:
+            raise OSError("disk full")
+
+    # Raised by a later put() or by close(), whichever comes first
+    with pytest.raises(OSError, match="disk full"):
+        with WriteQueue(threads=1, maxsize=1) as writes:
+            for n in range(20):
+                writes.put(write, n)
+    assert not any(thread.is_alive() for thread in writes.threads)
+
+
+def test_write_queue_keeps_the_callers_error():
+    def write():
+        raise OSError("disk full")
+
+    with pytest.raises(ValueError, match="bad chunk"):
+        with WriteQueue(threads=1) as writes:
+            writes.put(write)
+            raise ValueError("bad chunk")
+    assert not any(thread.is_alive() for thread in writes.threads)
+
+
+# Threads stop when the consumer stops early
+
+def test_read_ahead_stops_with_the_consumer():
+    source = Counter(iter(range(1_000_000)))
+    items = read_ahead(iter(source), ahead=2)
+    assert [next(items) for _ in range(3)] == [0, 1, 2]
+    items.close()
+    assert settle(lambda: not io_threads("read_ahead"))
+    assert source.closed and source.produced < 10
+
+
+def test_prefetch_stops_with_the_consumer(files):
+    read = prefetch_files(files, threads=3, ahead=4)
+    next(read)
+    read.close()
+    assert settle(lambda: not io_threads("prefetch"))
+
+
+# Bounded queues hold the producer back
+
+def test_read_ahead_is_bounded():
+    source = Counter(iter(range(100)))
+    items = read_ahead(iter(source), ahead=3)
+    next(items)
+    time.sleep(0.2)
+    # Three waiting in the queue and one held by the producer until there is room
+    assert source.produced <= 1 + 3 + 1
+    items.close()
+
+
+def test_bounded_map_is_bounded():
+    submitted = []
+
+    def record(n):
+        submitted.append(n)
+        return n
+
+    with ThreadPoolExecutor(4) as executor:
+        results = bounded_map(executor, record, range(100), limit=5)
+        for consumed in range(1, 20):
+            next(results)
+            assert len(submitted) <= consumed + 5
+        results.close()
+
+
+def test_write_queue_put_blocks_when_full():
+    release = threading.Event()
+    writes = WriteQueue(threads=1, maxsize=2)
+    writes.put(release.wait)
+    # The writer thread holds the first write, the queue holds two more
+    assert settle(lambda: writes.queues[0].empty())
+    writes.put(lambda: None)
+    writes.put(lambda: None)
+
+    blocked = threading.Thread(target=writes.put, args=(lambda: None,))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+    release.set()
+    blocked.join(5)
+    assert not blocked.is_alive()
+    writes.close()
@@ -0,0 +1,45 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Python_cleaning_v2 import save_cleaned
+from Python_kpi_service import KPIService, QueryError
+
+
+def revenue(service, company):
+    rows = json.loads(service.query("summary", company))["rows"]
+    return {row["Year"]: row["Revenue"] for row in rows}
+
+
+# A cleaned file rewritten between requests is picked up by the next request
+def test_changed_cleaned_file_is_served(frames, tmp_path):
+    input_dir = str(tmp_path)
+    save_cleaned(frames, input_dir, "csv", io_threads=0)
+    service = KPIService(input_dir)
+    before = revenue(service, "emaar")
+    assert revenue(service, "emaar") == before
+
+    path = os.path.join(input_dir, "cleaned_income_statement_v2.csv")
+    df_income = pd.read_csv(path)
+    rows = (df_income["Company"] == "emaar") & (df_income["Category"] == "Revenue")
+    df_income.loc[rows, "Value"] *= 2
+    df_income.to_csv(path, index=False)
+    # A later modification time, even on file systems with coarse timestamps
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    after = revenue(service, "emaar")
+    assert after.keys() == before.keys()
+    np.testing.assert_allclose([after[year] for year in before], [2 * value for value in before.values()])
+
+
+def test_unknown_company_and_table(frames, tmp_path):
+    save_cleaned(frames, str(tmp_path), "csv", io_threads=0)
+    service = KPIService(str(tmp_path))
+    with pytest.raises(QueryError, match="Unknown company"):
+        service.query("summary", "nobody")
+    with pytest.raises(QueryError, match="Unknown table"):
+        service.query("balance", "emaar")
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from Python_analysis import build_indexes
+from Python_kpi_engine import KPIEngine
+from Python_panel import league_table, panel_cagr, panel_frame, panel_yoy, peer_percentiles, rolling_cagr
+
+nan = np.nan
+
+
+def test_yoy_is_not_taken_across_missing_years():
+    # 2022 is missing from the panel, 2021 is missing for the second company
+    years = [2020, 2021, 2023, 2024]
+    values = np.array([[100.0, 110.0, 121.0, 133.1],
+                       [100.0, nan, 120.0, 150.0]])
+    np.testing.assert_allclose(panel_yoy(values, years), [[nan, 10.0, nan, 10.0],
+                                                          [nan, nan, nan, 25.0]])
+
+
+def test_yoy_of_zero_and_negative_bases():
+    values = np.array([[0.0, 50.0, 0.0],
+                       [-100.0, -50.0, 25.0]])
+    # No change from zero; from a negative base the change is relative to its size
+    np.testing.assert_allclose(panel_yoy(values, [2022, 2023, 2024]), [[nan, nan, -100.0],
+                                                                       [nan, -50.0, -150.0]])
+
+
+def test_rolling_cagr_needs_both_ends():
+    years = [2020, 2021, 2022, 2023, 2024]
+    values = np.array([[100.0, 100.0, 100.0, 133.1, 144.0],
+                       [nan, 100.0, 100.0, 100.0, 121.0]])
+    cagr = rolling_cagr(values, years, window=2)
+    np.testing.assert_allclose(cagr[0], [nan, nan, 0.0, 15.368, 20.0], rtol=1e-4)
+    np.testing.assert_allclose(cagr[1], [nan, nan, nan, 0.0, 10.0])
+    # A window longer than the panel gives no rates
+    assert np.isnan(rolling_cagr(values, years, window=5)).all()
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    (100.0, 121.0, 10.0),
+    (100.0, 0.0, -100.0),
+    (0.0, 121.0, nan),
+    (-100.0, -121.0, nan),
+    (100.0, -121.0, nan),
+])
+def test_cagr_of_zero_and_negative_values(start, end, expected):
+    values = np.array([[start, 110.0, end]])
+    np.testing.assert_allclose(panel_cagr(values, [2022, 2023, 2024]), [expected])
+
+
+def test_cagr_window_outside_the_panel():
+    values = np.array([[100.0, 121.0]])
+    assert np.isnan(panel_cagr(values, [2023, 2024], start=2022)).all()
+    assert np.isnan(panel_cagr(values, [2023, 2024], start=2030, end=2031)).all()
+
+
+def test_first_last_cagr_and_single_year_companies():
+    years = [2021, 2022, 2023, 2024]
+    values = np.array([[100.0, 110.0, 121.0, 133.1],
+                       [nan, 100.0, nan, 121.0],
+                       [nan, nan, 50.0, nan],
+                       [nan, nan, nan, nan]])
+    # Fixed window: companies without both ends have no rate
+    np.testing.assert_allclose(panel_cagr(values, years), [10.0, nan, nan, nan])
+    # First to last reported year; one reported year is no period at all
+    np.testing.assert_allclose(panel_cagr(values, years, first_last=True), [10.0, 10.0, nan, nan])
+
+
+def test_single_year_panel():
+    values = np.array([[100.0], [nan]])
+    assert np.isnan(panel_yoy(values, [2024])).all()
+    assert np.isnan(rolling_cagr(values, [2024])).all()
+    assert np.isnan(panel_cagr(values, [2024], first_last=True)).all()
+
+
+def test_percentiles_share_ties_and_skip_missing():
+    values = np.array([[1.0], [2.0], [2.0], [nan]])
+    np.testing.assert_allclose(peer_percentiles(values), [[100 / 3], [250 / 3], [250 / 3], [nan]])
+    # Each peer group is ranked on its own
+    np.testing.assert_allclose(peer_percentiles(values, ["a", "a", "b", "b"]), [[50.0], [100.0], [100.0], [nan]])
+
+
+def test_panel_frame_matches_engine(frames):
+    engine = KPIEngine(build_indexes(frames))
+    df_panel = panel_frame(engine, ["revenue", "roe"], window=1)
+    values = engine.compute(["revenue"])["revenue"]
+
+    df_revenue = df_panel[df_panel["KPI"] == "revenue"].set_index(["Company", "Year"])
+    emaar = engine.companies.get_loc("emaar")
+    np.testing.assert_allclose(df_revenue.loc["emaar", "Value"], values[emaar][~np.isnan(values[emaar])])
+    np.testing.assert_allclose(df_revenue.loc["emaar", "YoY (%)"], df_revenue.loc["emaar", "CAGR 1y (%)"])
+
+    year = int(engine.years.max())
+    df_league = league_table(df_panel, "revenue", year)
+    assert list(df_league.index) == list(range(1, len(df_league) + 1))
+    assert df_league["Value"].is_monotonic_decreasing
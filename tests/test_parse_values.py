@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Python_cleaning_v2 import parse_values
+
+
+def parse(cells):
+    return parse_values(pd.Series(cells, dtype="string"))
+
+
+@pytest.mark.parametrize("cell, expected", [
+    ("1,234,567", 1234567.0),
+    ("  42 ", 42.0),
+    ("-1,234", -1234.0),
+    ("(1,234)", -1234.0),
+    ("( 1,234.5 )", -1234.5),
+    ("0.25", 0.25),
+    (".5", 0.5),
+    ("1234.5678", 1234.5678),
+    ("−1,000", -1000.0),
+    ("–5", -5.0),
+    ("1 000", 1000.0),
+])
+def test_numbers(cell, expected):
+    values, invalid, placeholder = parse([cell])
+    assert values[0] == expected
+    assert not invalid[0] and not placeholder[0]
+
+
+@pytest.mark.parametrize("cell, expected", [
+    ("12.5k", 12_500.0),
+    ("3K", 3_000.0),
+    ("-1.5M", -1_500_000.0),
+    ("2 mn", 2_000_000.0),
+    ("2bn", 2_000_000_000.0),
+    ("(4B)", -4_000_000_000.0),
+])
+def test_scales(cell, expected):
+    values, invalid, _ = parse([cell])
+    assert values[0] == expected
+    assert not invalid[0]
+
+
+@pytest.mark.parametrize("cell", ["–", "-", "—", " - "])
+def test_placeholders(cell):
+    values, invalid, placeholder = parse([cell])
+    assert np.isnan(values[0])
+    assert placeholder[0] and not invalid[0]
+
+
+@pytest.mark.parametrize("cell", ["", "   ", None])
+def test_blanks(cell):
+    values, invalid, placeholder = parse([cell])
+    assert np.isnan(values[0])
+    assert not invalid[0] and not placeholder[0]
+
+
+@pytest.mark.parametrize("cell", ["abc", "1.2.3", "(12", "12)", "--5", "5kk", "1 2x", "9" * 41])
+def test_invalid(cell):
+    values, invalid, placeholder = parse([cell])
+    assert np.isnan(values[0])
+    assert invalid[0] and not placeholder[0]
+
+
+@pytest.mark.parametrize("cell", [" " * 60 + "5", "," * 45 + "7", "-" + " " * 50 + "3", "( " + " " * 45 + "2)"])
+def test_cells_longer_than_the_parser_reads_are_invalid(cell):
+    values, invalid, placeholder = parse([cell])
+    assert np.isnan(values[0])
+    assert invalid[0] and not placeholder[0]
+
+
+def test_large_integers_are_rounded_once():
+    values, invalid, _ = parse(["9007199254740993", "123,456,789,012,345,678", "999999999999999999"])
+    assert values.tolist() == [float(9007199254740993), float(123456789012345678), float(999999999999999999)]
+    assert not invalid.any()
+
+
+def test_more_than_18_digits_is_invalid():
+    values, invalid, _ = parse(["99999999999999999999", "1,234,567,890,123,456,789"])
+    assert np.isnan(values).all()
+    assert invalid.all()
+
+
+def test_matches_replace_and_astype():
+    numbers = np.random.default_rng(0).integers(-10 ** 12, 10 ** 12, 5000)
+    cells = pd.Series(numbers).map("{:,}".format)
+    values, invalid, _ = parse(cells)
+    assert np.array_equal(values, cells.str.replace(",", "").astype(float).to_numpy())
+    assert not invalid.any()
+
+
+def test_blocks_give_the_same_result():
+    cells = pd.Series(["(1,234)", "5.5k", "–", "x", "", "7"] * 50, dtype="string")
+    whole = parse_values(cells)
+    blocked = parse_values(cells, block_size=7)
+    for a, b in zip(whole, blocked):
+        assert np.array_equal(a, b, equal_nan=True)
+
+
+def test_numeric_columns_pass_through():
+    values, invalid, placeholder = parse_values(pd.Series([1.5, np.nan, -2.0]))
+    assert np.array_equal(values, [1.5, np.nan, -2.0], equal_nan=True)
+    assert not invalid.any() and not placeholder.any()
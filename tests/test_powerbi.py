@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Python_powerbi import export_star, fact_changes, kpi_facts, read_table, statement_facts
+
+KEYS = ["company_id", "metric_id", "Year"]
+
+
+def facts(rows):
+    return pd.DataFrame(rows, columns=[*KEYS, "Value"])
+
+
+def replay(df_exported, df_changes):
+    df_all = pd.concat([df_exported, df_changes], ignore_index=True)
+    df_all = df_all.groupby(KEYS)["Value"].sum()
+    return df_all[df_all != 0]
+
+
+def test_first_export_is_the_facts():
+    df_facts = facts([(1, 1, 2024, 10.0), (1, 2, 2024, -5.0)])
+    pd.testing.assert_frame_equal(fact_changes(None, df_facts, KEYS), df_facts)
+
+
+def test_changes_replay_to_the_new_facts():
+    df_exported = facts([(1, 1, 2024, 10.0), (1, 2, 2024, -5.0), (2, 1, 2024, 7.0), (2, 2, 2024, 1.0)])
+    # A correction appended earlier, so the exported rows of (2, 2, 2024) sum to 3
+    df_exported = pd.concat([df_exported, facts([(2, 2, 2024, 2.0)])], ignore_index=True).assign(batch=1)
+    df_new = facts([(1, 1, 2024, 10.0), (1, 2, 2024, -6.5), (2, 2, 2024, 3.0), (3, 1, 2024, 4.0)])
+
+    df_changes = fact_changes(df_exported, df_new, KEYS)
+    changed = {tuple(key): value for *key, value in df_changes.itertuples(index=False, name=None)}
+    # Changed, new and no longer reported keys; unchanged keys are left out
+    assert changed == {(1, 2, 2024): -1.5, (3, 1, 2024): 4.0, (2, 1, 2024): -7.0}
+
+    expected = df_new.set_index(KEYS)["Value"].sort_index()
+    pd.testing.assert_series_equal(replay(df_exported.drop(columns="batch"), df_changes).sort_index(), expected)
+
+
+def test_unchanged_facts_give_no_rows():
+    df_facts = facts([(1, 1, 2024, 1 / 3), (1, 1, 2023, 2.0)])
+    df_exported = facts([(1, 1, 2024, 1 / 3 * (1 + 1e-12)), (1, 1, 2023, 2.0)]).assign(batch=1)
+    assert fact_changes(df_exported, df_facts, KEYS).empty
+
+
+def test_other_keys_are_rejected():
+    df_exported = facts([(1, 1, 2024, 1.0)]).assign(Quarter=1, batch=1)
+    with pytest.raises(ValueError, match="--rebuild"):
+        fact_changes(df_exported, facts([(1, 1, 2024, 1.0)]), KEYS)
+
+
+def current(output_dir, fmt):
+    dims = {name: read_table(output_dir, name, fmt) for name in ["dim_company", "dim_category", "dim_metric", "dim_kpi"]}
+    dims["dim_metric"]["category_id"] = dims["dim_metric"]["category_id"].astype("Int32")
+    return dims
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_export_round_trip(frames, tmp_path, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    output_dir = str(tmp_path)
+    batch, appended = export_star(frames, output_dir, fmt)
+    assert batch == 1 and appended["fact_statement"] > 0 and appended["fact_kpi"] > 0
+    assert export_star(frames, output_dir, fmt)[0] is None
+    dim_company = read_table(output_dir, "dim_company", fmt)
+
+    changed = {statement: df_long.copy() for statement, df_long in frames.items()}
+    df_income = changed["income_statement"]
+    rows = (df_income["Company"] == "emaar") & (df_income["Metric"] == "Revenue")
+    df_income.loc[rows, "Value"] *= 1.1
+    batch, appended = export_star(changed, output_dir, fmt)
+    assert batch == 2 and appended["fact_statement"] == rows.sum()
+
+    # Ids stay the same between batches
+    pd.testing.assert_frame_equal(read_table(output_dir, "dim_company", fmt), dim_company)
+
+    # Statement rows summed per key give the current values
+    dims = current(output_dir, fmt)
+    df_statement = read_table(output_dir, "fact_statement", fmt)
+    assert set(df_statement["batch"]) == {1, 2}
+    summed = df_statement.groupby(KEYS)["Value"].sum().sort_index()
+    expected = statement_facts(changed, dims).set_index(KEYS)["Value"].sort_index()
+    np.testing.assert_allclose(summed.reindex(expected.index).to_numpy(), expected.to_numpy())
+
+    # KPIs hold one row per key with the current value, so any aggregation works
+    df_kpi = read_table(output_dir, "fact_kpi", fmt)
+    assert "batch" not in df_kpi
+    assert not df_kpi.duplicated(["company_id", "kpi_id", "Year"]).any()
+    merged = df_kpi.merge(kpi_facts(changed, dims), on=["company_id", "kpi_id", "Year"], how="outer")
+    np.testing.assert_allclose(merged["Value_x"], merged["Value_y"])
+
+
+# Companies named with digits must match their exported ids, not be added again
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_digit_company_names_export_once(frames, tmp_path, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    output_dir = str(tmp_path)
+    companies = sorted(set().union(*[df_long["Company"].unique() for df_long in frames.values()]))
+    codes = {company: str(2222 + i) for i, company in enumerate(companies)}
+    renamed = {statement: df_long.assign(Company=df_long["Company"].map(codes).astype(str)) for statement, df_long in frames.items()}
+
+    assert export_star(renamed, output_dir, fmt)[0] == 1
+    dim_company = read_table(output_dir, "dim_company", fmt)
+    rows = len(read_table(output_dir, "fact_statement", fmt))
+
+    batch, appended = export_star(renamed, output_dir, fmt)
+    assert batch is None and appended == {"fact_statement": 0, "fact_kpi": 0}
+    assert len(read_table(output_dir, "fact_statement", fmt)) == rows
+    pd.testing.assert_frame_equal(read_table(output_dir, "dim_company", fmt), dim_company)
+    assert sorted(dim_company["Company"]) == sorted(codes.values())
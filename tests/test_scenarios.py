@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Python_analysis import build_indexes
+from Python_scenarios import (METRICS, SHOCKS, ScenarioDraws, ScenarioGrid, ScenarioStats, _base_arrays, base_table,
+                              evaluate, run_scenarios)
+
+DISTRIBUTIONS = {"revenue_growth": (0.0, 0.1), "cost_of_revenue": (0.0, 0.05), "operating_expenses": (0.0, 0.05),
+                 "finance_costs": (0.0, 0.2), "capex": (0.0, 0.15)}
+BATCH_SIZE = 500
+
+
+@pytest.fixture
+def df_base(frames):
+    return base_table(build_indexes(frames))
+
+
+def test_histogram_percentiles_are_within_one_bin(df_base):
+    draws = ScenarioDraws(DISTRIBUTIONS, 20_000, seed=1)
+    base = _base_arrays(df_base)
+    batches = [evaluate(base, draws.batch(number, BATCH_SIZE)) for number in range(len(draws) // BATCH_SIZE)]
+    stats = ScenarioStats.from_sample(batches[0])
+    for values in batches:
+        stats.update(values)
+
+    for m, metric in enumerate(METRICS):
+        values = np.concatenate([batch[metric] for batch in batches], axis=1)
+        for c in range(len(df_base)):
+            defined = values[c][np.isfinite(values[c])]
+            for q in (5, 50, 95):
+                exact = np.percentile(defined, q, method="inverted_cdf")
+                assert abs(stats.percentile(q)[m, c] - exact) <= stats.width[m, c], (metric, c, q)
+
+
+def test_processes_give_the_same_stats(df_base):
+    draws = ScenarioDraws(DISTRIBUTIONS, 4_000, seed=7)
+    df_single, df_single_breaches = run_scenarios(df_base, draws, BATCH_SIZE, processes=1)
+    df_multi, df_multi_breaches = run_scenarios(df_base, draws, BATCH_SIZE, processes=3)
+    # Only the order in which the batch sums are added differs
+    pd.testing.assert_frame_equal(df_multi, df_single, check_exact=False, rtol=1e-12)
+    pd.testing.assert_frame_equal(df_multi_breaches, df_single_breaches)
+
+
+def test_same_seed_same_scenarios():
+    first, second = ScenarioDraws(DISTRIBUTIONS, 1_000, seed=3), ScenarioDraws(DISTRIBUTIONS, 1_000, seed=3)
+    np.testing.assert_array_equal(first.batch(1, BATCH_SIZE), second.batch(1, BATCH_SIZE))
+    assert not np.array_equal(first.batch(0, BATCH_SIZE), ScenarioDraws(DISTRIBUTIONS, 1_000, seed=4).batch(0, BATCH_SIZE))
+
+
+def test_grid_batches_cover_every_combination():
+    grid = ScenarioGrid({"revenue_growth": [-0.1, 0.0, 0.1], "capex": [0.0, 0.5]})
+    rows = np.concatenate([grid.batch(number, 4) for number in range(2)])
+    assert len(grid) == len(rows) == 6
+    assert len({tuple(row) for row in rows}) == 6
+    np.testing.assert_array_equal(rows[:, [SHOCKS.index("cost_of_revenue")]], 0.0)
+
+
+# With no shock every scenario is the base year, so all statistics equal the base
+def test_unshocked_scenarios_are_the_base(df_base):
+    df_scenarios, _ = run_scenarios(df_base, ScenarioDraws({}, 1_000), BATCH_SIZE)
+    defined = df_scenarios["Base"].notna()
+    for column in ["Mean", "P5", "P50", "P95", "Min", "Max"]:
+        np.testing.assert_allclose(df_scenarios.loc[defined, column], df_scenarios.loc[defined, "Base"], rtol=1e-9)
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Python_analysis import build_indexes
+from Python_kpi_engine import KPI_REGISTRY, KPIEngine, StoreKPIEngine
+from Python_store import write_store
+
+NAMES = list(KPI_REGISTRY)
+
+
+@pytest.fixture
+def store_path(frames, tmp_path):
+    path = str(tmp_path / "cleaned_v2.sqlite")
+    write_store(frames, path)
+    return path
+
+
+# Every KPI summed in SQL matches the in-memory aggregates
+def test_store_engine_matches_memory_engine(frames, store_path):
+    engine = KPIEngine(build_indexes(frames))
+    store_engine = StoreKPIEngine(store_path)
+    try:
+        assert list(store_engine.companies) == list(engine.companies)
+        assert list(store_engine.years) == list(engine.years)
+        expected = engine.compute(NAMES)
+        for name, values in store_engine.compute(NAMES).items():
+            np.testing.assert_allclose(values, expected[name], rtol=1e-9, equal_nan=True, err_msg=name)
+    finally:
+        store_engine.conn.close()
+
+
+# Only the requested companies and years are read, with the same values as the full grid
+def test_store_engine_subset(frames, store_path):
+    df_expected = KPIEngine(build_indexes(frames)).frame(NAMES).set_index(["Company", "Year"])
+    companies = list(df_expected.index.unique("Company")[1:])
+    years = [int(df_expected.index.unique("Year").max())]
+
+    store_engine = StoreKPIEngine(store_path, companies=companies, years=years)
+    try:
+        df_kpis = store_engine.frame(NAMES).set_index(["Company", "Year"])
+    finally:
+        store_engine.conn.close()
+    assert set(df_kpis.index) == {(company, years[0]) for company in companies}
+    pd.testing.assert_frame_equal(df_kpis, df_expected.loc[df_kpis.index], check_exact=False, rtol=1e-9)
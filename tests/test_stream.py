@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+import Python_cleaning_v2 as cleaning
+from Python_analysis import load_cleaned
+from Python_cleaning_v2 import STATEMENTS, main, stream_universe
+
+
+# Plain values to compare: names as text, rows in a fixed order
+def comparable(df_long):
+    df_long = df_long.astype({c: str for c in df_long.columns if c not in ("Year", "Quarter", "Value")})
+    keys = [c for c in df_long.columns if c != "Value"]
+    return df_long.sort_values(keys, kind="stable").reset_index(drop=True)
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+@pytest.mark.parametrize("io_threads", [0, 2])
+def test_stream_matches_batch(statements, frames, tmp_path, fmt, io_threads):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    # Small chunks, so every statement is cleaned in several pieces
+    written = stream_universe(statements(), str(tmp_path), fmt, chunksize=7, io_threads=io_threads)
+    streamed = load_cleaned(str(tmp_path))
+
+    for statement in STATEMENTS:
+        assert written[statement] == len(frames[statement])
+        df_batch = comparable(frames[statement])
+        pd.testing.assert_frame_equal(comparable(streamed[statement])[df_batch.columns], df_batch, check_dtype=False)
+
+
+# A write that fails after the cleaning failed must not hide the cleaning error
+def test_stream_keeps_the_cleaning_error(statements, tmp_path, monkeypatch):
+    clean_statement_chunks = cleaning.clean_statement_chunks
+
+    def clean_chunks(chunks, *args):
+        yield next(clean_statement_chunks(chunks, *args))
+        raise ValueError("bad chunk")
+
+    def write(self, df_long):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(cleaning, "clean_statement_chunks", clean_chunks)
+    monkeypatch.setattr(cleaning.ChunkWriter, "write", write)
+    with pytest.raises(ValueError, match="bad chunk"):
+        stream_universe(statements(), str(tmp_path), io_threads=1)
+
+
+@pytest.mark.parametrize("fmt", ["npy", "sqlite"])
+def test_stream_rejects_other_formats(statements, tmp_path, fmt):
+    with pytest.raises(SystemExit):
+        main([statements(), str(tmp_path), "--stream", "--format", fmt])
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Python_taxonomy import (TAXONOMY, TaxonomyMapper, TrigramIndex, get_mapper, normalise_label, same_words,
+                             trigrams)
+
+
+def dice(a, b):
+    a, b = trigrams(a), trigrams(b)
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+@pytest.mark.parametrize("label, normalised", [
+    ("  Trade &  Other Payables ", "trade and other payables"),
+    ("Property, Plant And Equipment", "property plant and equipment"),
+    ("Net Cash Flows (Used In)/From Operating Activities", "net cash flows used in from operating activities"),
+])
+def test_normalise_label(label, normalised):
+    assert normalise_label(label) == normalised
+
+
+@pytest.mark.parametrize("label, item, match", [
+    ("Bank Balances And Cash", "cash", "exact"),
+    ("cash & cash equivalents", "cash", "synonym"),
+    ("Trade Receivable", "trade_receivables", "fuzzy"),
+    ("Non Controlling Interest", "non_controlling_interests", "fuzzy"),
+])
+def test_balance_sheet_matches(label, item, match):
+    explained = get_mapper("balance_sheet").explain([label]).iloc[0]
+    assert (explained["Item"], explained["Match"]) == (item, match)
+
+
+@pytest.mark.parametrize("label", ["Widgets", "Loans To Associates", "", "   "])
+def test_unknown_labels_have_no_item(label):
+    assert get_mapper("balance_sheet").map([label]) == [None]
+
+
+def test_every_taxonomy_label_maps_to_its_item():
+    for statement, items in TAXONOMY.items():
+        mapper = TaxonomyMapper(items)
+        for item, _, labels in items:
+            assert set(mapper.map(labels)) == {item}, (statement, item)
+
+
+def test_one_word_that_differs_blocks_a_fuzzy_match():
+    mapper = TaxonomyMapper([("operating_cash_flow", None, ["Net Cash From Operating Activities"])], threshold=0.5)
+    assert dice(normalise_label("Net Cash From Financing Activities"), "net cash from operating activities") > 0.5
+    assert not same_words("net cash from financing activities", "net cash from operating activities")
+    assert mapper.map(["Net Cash From Financing Activities"]) == [None]
+    assert mapper.map(["Net Cash From Operating Activity"]) == ["operating_cash_flow"]
+
+
+def test_threshold():
+    items = [("cash", "Assets", ["Bank Balances And Cash"])]
+    assert TaxonomyMapper(items, threshold=0.99).map(["Bank Balance And Cash"]) == [None]
+    assert TaxonomyMapper(items, threshold=0.8).map(["Bank Balance And Cash"]) == ["cash"]
+
+
+def test_trigram_index_matches_brute_force_dice():
+    labels = [normalise_label(label) for items in TAXONOMY.values() for _, _, names in items for label in names]
+    labels = list(dict.fromkeys(labels))
+    queries = ["trade receivable", "net cash used in investing activity", "profit for the period", "zzz", "cash"]
+    index = TrigramIndex(labels)
+    best, scores = index.best(queries, k=3, block_size=2)
+    for query, candidates, candidate_scores in zip(queries, best, scores):
+        expected = sorted((dice(query, label) for label in labels), reverse=True)[:3]
+        assert np.allclose(candidate_scores, expected)
+        assert np.allclose([dice(query, labels[i]) for i in candidates], candidate_scores)
+
+
+def test_map_column_matches_map():
+    mapper = get_mapper("balance_sheet")
+    metrics = pd.Series(["Total Assets", "Widgets", None, "Trade Receivable", "Total Assets", "Bank Balances And Cash"])
+    column = mapper.map_column(metrics)
+    expected = [None if metric is None else mapper.map([metric])[0] for metric in metrics]
+    assert [None if pd.isna(item) else item for item in column] == expected
+    assert list(column.categories) == sorted({item for item in expected if item is not None})
+
+
+def test_categories_follow_the_item():
+    mapper = get_mapper("balance_sheet")
+    assert mapper.categories(["Bank Balances And Cash", "Total Equity", "Widgets"]) == ["Assets", "Equity", None]
@@ -0,0 +1,92 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Python_analysis import build_indexes
+from Python_kpi_engine import KPIEngine
+from Python_ttm import RollingWindow, TTMEngine, period_code, period_label
+
+NAMES = ["revenue", "net_income", "operating_cash_flow", "total_assets", "ebitda", "free_cash_flow", "net_margin", "roe"]
+
+
+@pytest.fixture
+def frames(quarterly_frames):
+    return quarterly_frames
+
+
+def until(frames, code):
+    return {statement: df_long[period_code(df_long["Year"], df_long["Quarter"]) <= code]
+            for statement, df_long in frames.items()}
+
+
+def test_period_codes():
+    assert period_label(period_code(2024, 4) + 1) == "2025Q1"
+    assert period_code(2025, 1) - period_code(2024, 1) == 4
+
+
+def test_rolling_window():
+    window = RollingWindow(window=3, companies=1)
+    sums = [window.push(np.array([value]))[0] for value in [1.0, 2.0, 3.0, 4.0]]
+    assert np.isnan(sums[:2]).all()
+    assert sums[2:] == [6.0, 9.0]
+    window.grow(2)
+    assert np.isnan(window.push(np.array([5.0, 1.0]))[1])
+
+
+def test_append_in_steps_matches_rebuild(frames):
+    rebuilt = TTMEngine()
+    rebuilt.append(frames)
+
+    incremental = TTMEngine()
+    codes = sorted(set(period_code(frames["income_statement"]["Year"], frames["income_statement"]["Quarter"])))
+    for code in codes[3::3] + [codes[-1]]:
+        incremental.append(until(frames, code))
+        # A pickled engine carries on where it stopped, as with --state
+        incremental = pickle.loads(pickle.dumps(incremental))
+
+    assert incremental.periods == rebuilt.periods
+    pd.testing.assert_frame_equal(incremental.frame(NAMES), rebuilt.frame(NAMES))
+
+
+def test_appending_the_same_quarters_again_adds_nothing(frames):
+    engine = TTMEngine()
+    assert len(engine.append(frames)) == 12
+    assert engine.append(frames) == []
+
+
+def test_fourth_quarter_matches_the_annual_kpis(frames):
+    engine = TTMEngine()
+    engine.append(frames)
+    df_ttm = engine.frame(NAMES)
+    df_ttm = df_ttm[df_ttm["Period"].str.endswith("Q4")]
+    df_ttm = df_ttm.assign(Year=df_ttm["Period"].str[:4].astype(int)).set_index(["Company", "Year"])[NAMES]
+
+    df_annual = KPIEngine(build_indexes(frames)).frame(NAMES).set_index(["Company", "Year"])[NAMES]
+    df_ttm, df_annual = df_ttm.sort_index(), df_annual.sort_index()
+    assert df_ttm.index.equals(df_annual.index)
+    np.testing.assert_allclose(df_ttm.to_numpy(), df_annual.to_numpy(), rtol=1e-9)
+
+
+def test_missing_quarter_leaves_its_windows_empty(frames):
+    frames = dict(frames)
+    df_long = frames["income_statement"]
+    gap = (df_long["Company"] == "emaar") & (df_long["Year"] == 2023) & (df_long["Quarter"] == 2)
+    frames["income_statement"] = df_long[~gap]
+
+    engine = TTMEngine()
+    engine.append(frames)
+    df_ttm = engine.frame(["revenue"]).set_index(["Company", "Period"])["revenue"]
+    for period in ["2023Q2", "2023Q3", "2023Q4", "2024Q1"]:
+        assert np.isnan(df_ttm.get(("emaar", period), np.nan))
+    assert not np.isnan(df_ttm[("emaar", "2024Q2")])
+    assert not np.isnan(df_ttm[("company00001", "2023Q3")])
+
+
+def test_latest(frames):
+    engine = TTMEngine()
+    engine.append(frames)
+    df_latest = engine.latest(["revenue"])
+    assert set(df_latest["Period"]) == {"2024Q4"}
+    assert len(df_latest) == 3
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Python_validation import validate
+
+
+def copy(frames):
+    return {statement: df_long.copy() for statement, df_long in frames.items()}
+
+
+def shift(frames, statement, metric, company, year, amount):
+    df_long = frames[statement]
+    rows = (df_long["Metric"] == metric) & (df_long["Company"] == company) & (df_long["Year"] == year)
+    assert rows.sum() == 1
+    df_long.loc[rows, "Value"] += amount
+
+
+def failed_checks(summary):
+    return set(summary.loc[summary["Violations"] > 0, "Check"])
+
+
+def test_generated_statements_pass(frames):
+    summary, violations = validate(frames)
+    assert not failed_checks(summary)
+    assert not len(violations)
+    assert (summary["Checked"] > 0).all()
+
+
+def test_total_assets_break_the_balance_sheet_identities(frames):
+    frames = copy(frames)
+    shift(frames, "balance_sheet", "Total Assets", "company00001", 2023, 1000.0)
+    summary, violations = validate(frames, rtol=0.0)
+
+    assert failed_checks(summary) == {"assets = liabilities + equity", "total liabilities and equity",
+                                      "total assets subtotal"}
+    assert (violations["Company"] == "company00001").all()
+    assert (violations["Year"] == 2023).all()
+    difference = violations.set_index("Check")["Difference"]
+    assert difference["assets = liabilities + equity"] == pytest.approx(1000.0, abs=10.0)
+    assert difference["total liabilities and equity"] == pytest.approx(-1000.0, abs=10.0)
+
+
+def test_rounding_within_tolerance_passes(frames):
+    frames = copy(frames)
+    shift(frames, "balance_sheet", "Total Assets", "emaar", 2024, 5.0)
+    summary, _ = validate(frames, atol=10.0, rtol=0.0)
+    assert not failed_checks(summary)
+    summary, _ = validate(frames, atol=1.0, rtol=0.0)
+    assert "assets = liabilities + equity" in failed_checks(summary)
+
+
+def test_profit_before_tax_is_compared_across_statements(frames):
+    frames = copy(frames)
+    shift(frames, "cash_flow", "Profit Before Tax", "emaar", 2022, -500.0)
+    summary, violations = validate(frames, rtol=0.0)
+    assert failed_checks(summary) == {"profit before tax matches income statement"}
+    assert violations["Reported"].iloc[0] - violations["Expected"].iloc[0] == pytest.approx(-500.0, abs=10.0)
+
+
+def test_missing_items_are_unchecked_not_violations(frames):
+    frames = copy(frames)
+    df_long = frames["cash_flow"]
+    frames["cash_flow"] = df_long[~((df_long["Company"] == "emaar") & (df_long["Metric"].str.contains("Net Increase|Net Decrease|Net Change", case=False)))]
+    summary, _ = validate(frames)
+    sections = summary.set_index("Check").loc["cash flow sections"]
+    assert sections["Violations"] == 0
+    assert sections["Unchecked"] == 3
+
+
+def test_duplicate_rows_are_reported(frames):
+    frames = copy(frames)
+    df_long = frames["income_statement"]
+    frames["income_statement"] = pd.concat([df_long, df_long.iloc[[0]]], ignore_index=True)
+    summary, violations = validate(frames)
+    duplicates = violations[violations["Check"] == "duplicate rows"]
+    assert len(duplicates) == 1
+    assert duplicates["Rows"].iloc[0] == 2
+
+
+def test_rows_without_a_category_are_reported(frames):
+    frames = copy(frames)
+    df_long = frames["balance_sheet"]
+    rows = (df_long["Metric"] == "Bank Balances And Cash") & (df_long["Company"] == "emaar")
+    df_long["Category"] = df_long["Category"].astype(object).where(~rows, np.nan)
+    summary, violations = validate(frames)
+    coverage = violations[violations["Check"] == "category coverage"]
+    assert coverage[["Company", "Metric"]].values.tolist() == [["emaar", "Bank Balances And Cash"]]
+    assert coverage["Rows"].iloc[0] == rows.sum()